@@ -0,0 +1,239 @@
+"""基准测试: 生成仿真工作簿，测量拆分 / 合并 / 扫描 / 预览 / 分析在各读写后端下的耗时。
+
+    python bench_excel.py                          # 默认 1 万、10 万行
+    python bench_excel.py --rows 10000 1000000 --files 50 --out bench_results.json
+    python bench_excel.py --compare 上次结果.json    # 与上次结果逐项对比
+    python bench_excel.py --cases split merge merge_csv --formats xlsx csv parquet   # 比较各输出格式
+
+每个用例在独立子进程中运行，记录墙钟时间、用例期间常驻内存 (RSS) 的峰值增量和每秒行数，结果写入 JSON 便于跨版本比较。
+"""
+import argparse
+import csv
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, PatternFill
+import excel_core as core
+
+HEADER_ROWS = 8              # 与模板一致: 数据从第 9 行开始
+START_ROW = HEADER_ROWS + 1
+KEY_COL = 3                  # 区县列
+DISTRICTS = ["东城区", "西城区", "朝阳区", "丰台区", "石景山区", "海淀区", "门头沟区", "房山区",
+             "通州区", "顺义区", "昌平区", "大兴区", "怀柔区", "平谷区", "密云区", "延庆区"]
+EMPTY_RATE = 0.01            # 稀疏空行比例
+STYLED_MAX_ROWS = 200000     # 单遍完美拆分整表读入，超过此行数跳过
+PERFECT_MAX_ROWS = 20000     # 模拟引擎按目标整表读写，超过此行数跳过
+PREVIEW_ROWS = 50
+
+
+# ================= 仿真数据 =================
+def make_workbook(path, rows, seed=0):
+    """生成带 8 行表头 (合并标题、加粗表头、列宽) 的区县明细表，约 1% 为空行。"""
+    rnd = random.Random(seed)
+    wb = openpyxl.Workbook(write_only=True); ws = wb.create_sheet("明细")
+    for col, w in zip("ABCDEFGH", (8, 12, 12, 10, 12, 12, 24, 16)): ws.column_dimensions[col].width = w
+    ws.merged_cells.add("A1:H1")
+    title = WriteOnlyCell(ws, value="各区数据汇总表 (基准测试)")
+    title.font = Font(bold=True, size=14); title.alignment = Alignment(horizontal="center")
+    ws.append([title])
+    for i in range(2, HEADER_ROWS): ws.append([f"填报说明 {i}"])
+    head = []
+    for v in ("序号", "姓名", "区县", "类别", "金额", "日期", "备注", "编号"):
+        c = WriteOnlyCell(ws, value=v); c.font = Font(bold=True); c.fill = PatternFill("solid", fgColor="D9D9D9"); head.append(c)
+    ws.append(head)
+    base = datetime.date(2024, 1, 1)
+    for i in range(rows):
+        if rnd.random() < EMPTY_RATE: ws.append([]); continue
+        ws.append([i + 1, f"姓名{i}", rnd.choice(DISTRICTS), rnd.choice("ABCDE"), round(rnd.random() * 10000, 2),
+                   base + datetime.timedelta(days=rnd.randrange(365)), "备注" * rnd.randrange(4), f"NO{i:08d}"])
+    wb.save(path)
+
+
+def prepare_data(workdir, rows, files):
+    """按行数生成 (总表, 回收文件夹)，已存在则复用。另在 <回收文件夹>_csv 放一份同样内容的 CSV。"""
+    master = os.path.join(workdir, f"master_{rows}.xlsx")
+    if not os.path.exists(master): make_workbook(master, rows)
+    folder = os.path.join(workdir, f"collect_{rows}_{files}")
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+        for i in range(files): make_workbook(os.path.join(folder, f"区{i:03d}.xlsx"), max(1, rows // files), seed=i + 1)
+    if not os.path.isdir(folder + "_csv"):
+        os.makedirs(folder + "_csv")
+        for f in core.list_merge_files(folder):
+            with core.open_reader(f) as rd, open(os.path.join(folder + "_csv", os.path.basename(f)[:-5] + ".csv"), "w",
+                                                 encoding=core.CSV_ENCODING, newline="") as fp:
+                csv.writer(fp).writerows(rd.iter_rows())
+    return master, folder
+
+
+# ================= 用例 =================
+def case_split(master, folder, out, reader, workers, fmt):
+    core.stream_split(master, START_ROW, KEY_COL, out, "bench", reader=reader, fmt=fmt)
+
+def case_split_multi(master, folder, out, reader, workers, fmt):
+    # 三种拆分 (区县、类别、区县+类别) 共用一遍读取，对照 split 看多出的只有写入
+    core.stream_split(master, START_ROW, f"{KEY_COL};{KEY_COL + 1};{KEY_COL}+{KEY_COL + 1}", out, "bench", reader=reader, fmt=fmt)
+
+def case_split_styled(master, folder, out, reader, workers, fmt):
+    core.styled_split(master, START_ROW, KEY_COL, out)
+
+def case_split_perfect(master, folder, out, reader, workers, fmt):
+    # 模拟引擎: 衡量引擎池复用与逐目标删行的调度开销
+    core.perfect_split(master, START_ROW, KEY_COL, out, core.FAKE_PROG_ID, workers=workers)
+
+def case_clean(master, folder, out, reader, workers, fmt):
+    src = os.path.join(out, os.path.basename(master)); shutil.copy(master, src)
+    core.compact_clean(src)
+
+def case_clean_com(master, folder, out, reader, workers, fmt):
+    # 模拟引擎走 COM 路径 (逐行 CountA + Delete)，对照 clean
+    src = os.path.join(out, os.path.basename(master)); shutil.copy(master, src)
+    core.native_clean(src, core.FAKE_PROG_ID)
+
+def case_merge(master, folder, out, reader, workers, fmt):
+    files = sorted(core.list_merge_files(folder))
+    # 与界面/命令行同一条路径 (完整合并，清单写在输出目录，不碰回收文件夹)
+    core.incremental_merge(out, files, files[0], os.path.join(out, core.output_name("合并汇总表", fmt)), START_ROW, workers,
+                           reader=reader, reuse=False, fmt=fmt)
+
+def case_merge_csv(master, folder, out, reader, workers, fmt):
+    # 同样内容的 CSV 回收文件夹，对照 merge 看 CSV 输入省下的解析时间
+    case_merge(master, folder + "_csv", out, reader, workers, fmt)
+
+def case_merge_dedup(master, folder, out, reader, workers, fmt):
+    files = sorted(core.list_merge_files(folder))
+    core.incremental_merge(out, files, files[0], os.path.join(out, core.output_name("合并汇总表", fmt)), START_ROW, workers,
+                           reader=reader, reuse=False, dedup=core.RowDeduper(), fmt=fmt)
+
+def case_scan(master, folder, out, reader, workers, fmt):
+    files = sorted(core.list_merge_files(folder))
+    core.scan_files(files, core.ScanIndex(out), workers, reader=reader)   # 索引放在输出目录，保证每次都冷扫描
+
+def case_preview(master, folder, out, reader, workers, fmt):
+    # 首屏: 第一页就绪即可渲染
+    p = core.SheetPager(master, reader)
+    while not p.offsets and not p.done.is_set(): time.sleep(0.005)
+    p.get_rows(1, PREVIEW_ROWS); p.close()
+
+def case_preview_seek(master, folder, out, reader, workers, fmt):
+    # 建完行偏移索引后在表中来回跳转
+    p = core.SheetPager(master, reader); p.done.wait()
+    rnd = random.Random(0)
+    for _ in range(100): p.get_rows(rnd.randrange(1, p.rows + 1), PREVIEW_ROWS)
+    p.close()
+
+def case_analysis(master, folder, out, reader, workers, fmt):
+    core.analysis_report(master, START_ROW, KEY_COL, reader)
+
+FORMAT_CASES = ("split", "split_multi", "merge", "merge_csv", "merge_dedup")   # 按 --formats 逐个输出格式测量
+CASES = {"split": case_split, "split_multi": case_split_multi, "split_styled": case_split_styled, "split_perfect": case_split_perfect,
+         "clean": case_clean, "clean_com": case_clean_com, "merge": case_merge, "merge_csv": case_merge_csv,
+         "merge_dedup": case_merge_dedup, "scan": case_scan, "preview": case_preview, "preview_seek": case_preview_seek, "analysis": case_analysis}
+
+
+def _run_case(q, name, master, folder, out, reader, workers, fmt):
+    # 内存按本用例计: 开始时的常驻内存为基线，用例进行中采样 (见 RunProfile)。
+    # 不用 ru_maxrss: Linux 上子进程会继承父进程 (生成数据时) 的峰值
+    prof = core.RunProfile(name); t0 = time.perf_counter()
+    CASES[name](master, folder, out, reader, workers, fmt)
+    wall = time.perf_counter() - t0; r = prof.finish()
+    mem = round(r["peak_rss_mb"] - r["rss_start_mb"], 1) if r["peak_rss_mb"] is not None else None
+    q.put((wall, mem, r["peak_rss_mb"], sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(out) for f in fs)))
+
+
+def run_case(name, master, folder, reader, workers, rows, fmt="xlsx"):
+    """在独立子进程中跑一个用例，返回结果记录 (含输出的总字节数)。"""
+    out = tempfile.mkdtemp(prefix=f"bench_{name}_")
+    ctx = multiprocessing.get_context("spawn"); q = ctx.Queue()
+    p = ctx.Process(target=_run_case, args=(q, name, master, folder, out, reader, workers, fmt)); p.start()
+    try: wall, mem, rss, size = q.get()
+    except KeyboardInterrupt: p.terminate(); raise
+    finally: p.join(); shutil.rmtree(out, ignore_errors=True)
+    data_rows = PREVIEW_ROWS if name == "preview" else rows
+    return {"case": name, "reader": reader, "workers": workers, "rows": rows, "format": fmt, "wall_s": round(wall, 3),
+            "rows_per_s": round(data_rows / wall) if wall else None, "out_mb": round(size / (1 << 20), 2),
+            "mem_mb": mem, "peak_rss_mb": rss}
+
+
+# ================= 结果 =================
+def _key(r): return (r["case"], r["reader"], r["workers"], r["rows"], r.get("format", "xlsx"))
+
+def compare(prev, results):
+    old = {_key(r): r for r in prev.get("results", [])}
+    print(f"\n{'用例':<14} {'后端':<9} {'格式':<8} {'进程':>4} {'行数':>9} {'上次(s)':>9} {'本次(s)':>9} {'变化':>8}")
+    for r in results:
+        o = old.get(_key(r))
+        if not o: continue
+        d = (r["wall_s"] - o["wall_s"]) / o["wall_s"] * 100 if o["wall_s"] else 0
+        print(f"{r['case']:<14} {r['reader']:<9} {r['format']:<8} {r['workers']:>4} {r['rows']:>9} {o['wall_s']:>9} {r['wall_s']:>9} {d:>+7.1f}%")
+
+
+def format_table(results):
+    """各输出格式的吞吐对照: 同一用例下按每秒行数排列，便于为每类任务挑最省的格式。"""
+    by = {}
+    for r in results:
+        if r["case"] in FORMAT_CASES: by.setdefault((r["case"], r["reader"], r["workers"], r["rows"]), []).append(r)
+    groups = [g for g in by.values() if len(g) > 1]
+    if not groups: return
+    print(f"\n{'用例':<14} {'后端':<9} {'进程':>4} {'行数':>9}  各格式 (行/秒, 输出 MB)")
+    for g in groups:
+        r = g[0]; g = sorted(g, key=lambda x: -(x["rows_per_s"] or 0))
+        print(f"{r['case']:<14} {r['reader']:<9} {r['workers']:>4} {r['rows']:>9}  "
+              + " | ".join(f"{x['format']} {x['rows_per_s']} ({x['out_mb']})" for x in g))
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--rows", type=int, nargs="+", default=[10000, 100000], help="总表数据行数 (可多个)")
+    p.add_argument("--files", type=int, default=20, help="回收文件夹中的文件数")
+    p.add_argument("--cases", nargs="+", choices=sorted(CASES), default=list(CASES))
+    p.add_argument("--readers", nargs="+", choices=sorted(core.READERS), default=sorted(core.READERS))
+    p.add_argument("--workers", type=int, nargs="+", default=[1, core.SCAN_WORKERS], help="合并/扫描/完美拆分的进程数")
+    p.add_argument("--formats", nargs="+", choices=core.OUTPUT_FORMATS, default=["xlsx"],
+                   help=f"拆分/合并用例的输出格式 (可多个，用于 {', '.join(FORMAT_CASES)})")
+    p.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "excel_tool_bench"), help="仿真数据缓存目录")
+    p.add_argument("--out", default="bench_results.json")
+    p.add_argument("--compare", help="上次的结果 JSON")
+    a = p.parse_args(argv)
+    os.makedirs(a.workdir, exist_ok=True)
+    formats = []
+    for fmt in a.formats:
+        try: core.check_output_format(fmt); formats.append(fmt)
+        except ValueError as e: print(f"跳过格式 {fmt}: {e}")
+    results = []
+    for rows in a.rows:
+        print(f"== 准备 {rows} 行仿真数据 ...", flush=True)
+        master, folder = prepare_data(a.workdir, rows, a.files)
+        for name in a.cases:
+            if name == "split_styled" and rows > STYLED_MAX_ROWS: continue
+            if name in ("split_perfect", "clean_com") and rows > PERFECT_MAX_ROWS: continue
+            readers = ["openpyxl"] if name in ("split_styled", "split_perfect", "clean", "clean_com") else a.readers
+            workers = sorted(set(a.workers)) if name in ("merge", "merge_csv", "merge_dedup", "scan", "split_perfect") else [1]
+            if name == "merge_csv": readers = readers[:1]   # CSV 不经读取后端
+            for reader in readers:
+                for w in workers:
+                    for fmt in formats if name in FORMAT_CASES else ["xlsx"]:
+                        r = run_case(name, master, folder, reader, w, rows, fmt); results.append(r)
+                        print(f"{name:<14} {reader:<9} {fmt:<8} w={w:<2} {rows:>9} 行  {r['wall_s']:>8.2f} s  "
+                              f"{r['rows_per_s'] or 0:>9} 行/秒  {r['out_mb']:>7} MB 输出  +{r['mem_mb']} MB 内存", flush=True)
+    meta = {"time": datetime.datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+            "openpyxl": openpyxl.__version__, "platform": platform.platform(), "cpus": os.cpu_count(), "files": a.files}
+    with open(a.out, "w", encoding="utf-8") as fp: json.dump({"meta": meta, "results": results}, fp, ensure_ascii=False, indent=1)
+    format_table(results)
+    print(f"结果已写入 {a.out}")
+    if a.compare:
+        with open(a.compare, encoding="utf-8") as fp: compare(json.load(fp), results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
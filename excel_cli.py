@@ -0,0 +1,187 @@
+"""各区表格协同工具 命令行入口 (无界面)。
+
+    python excel_cli.py split  总表.xlsx -s 9 -c 3 [-m fast|styled|perfect] [-o 输出目录] [-w 4] [--sheets "*"] [--format csv]
+    python excel_cli.py merge  回收文件夹 -s 9 [-t 模板.xlsx] [-w 4] [--incremental] [--align] [--dedup [2,3]] [--sheets "1月,2月"]
+                               [--format xlsx|csv|tsv|parquet|arrow] [--encoding gb18030]
+    python excel_cli.py scan   回收文件夹 [-w 4] [--json]
+    python excel_cli.py clean  总表.xlsx [--engine native|auto|excel|wps|fake]
+    python excel_cli.py report 总表.xlsx -s 9 -c 3     (拆分列分类预览)
+    python excel_cli.py report 回收文件夹 -s 9          (合并预估报告)
+
+--sheets 选择工作表: 缺省为活动表，* 为全部，也可逗号分隔表名或通配 (如 "2024*")。
+-c 拆分列: 单列 3、组合列 3+5 (取值以 _ 连接)、按对照表归组 3:区县分组.csv (CSV/xlsx 前两列: 取值,组名)；
+多种拆分以 ; 分隔 (如 "3;5;3+5")，一次读完，各自输出到子文件夹。
+回收文件夹里的 .csv/.tsv 与 .xlsx 一样参与扫描与合并。--format 为 xlsx 以外时只写取值 (首行为表头标签)，
+比 xlsx 快得多，适合给下游程序读取；parquet/arrow 需安装 pyarrow，拆分时仅极速模式可用。
+按 Ctrl+C 时做完当前一批后停下 (再按一次强制退出)：拆分加 --resume 续做同一输出目录，跳过已写出的文件；
+合并加 --incremental 时只重读新增或改动的文件 (回收文件夹里记 _merge_manifest.json)，中断时已完成的部分
+另存为 *_未完成.xlsx，再次加 --incremental 合并时从中断处续做。
+
+每次运行结束时把分阶段耗时摘要写进日志，并另存 JSON 报告 (默认在 ~/.excel_tool/profiles，可用 --profile-out 指定)；
+加 --profile 时另记 cProfile 热点函数与 tracemalloc 内存峰值。
+"""
+import argparse
+import datetime
+import json
+import os
+import signal
+import sys
+import threading
+import time
+import excel_core as core
+
+
+OP_LOG = None                # --log-file 指定时的 JSON Lines 日志
+CANCEL = threading.Event()   # Ctrl+C 置位，任务在两批之间停下
+
+
+def _log(msg, level="INFO"):
+    ts = datetime.datetime.now().strftime("%H:%M:%S")
+    print(f"[{ts}] [{level}] {msg}", file=sys.stderr, flush=True)
+    if OP_LOG: OP_LOG.log(msg, level)
+
+
+def _on_sigint(signum, frame):
+    if CANCEL.is_set(): raise KeyboardInterrupt
+    CANCEL.set(); _log("正在停止: 做完当前一批后退出，已完成的部分可续做 (再按一次 Ctrl+C 强制退出)", "WARN")
+
+
+def _scan(folder, workers, reader, prof=None):
+    files = core.list_merge_files(folder)
+    if not files: raise SystemExit(f"未找到 .xlsx / .csv 文件: {folder}")
+    index = core.ScanIndex(folder); results = {}
+    def emit(idx, f, st):
+        if isinstance(st, Exception): _log(f"扫描失败: {os.path.basename(f)} ({st})", "ERROR")
+        else: results[idx] = (f, st)
+    core.scan_files(files, index, workers, emit, CANCEL, reader, prof)
+    index.save(files)
+    _log(f"索引命中 {index.hits} 个，重新解析 {index.misses} 个", "STATS")
+    return [results[i] for i in sorted(results)]
+
+
+def cmd_split(a):
+    prog_id = None
+    if a.mode == "perfect": prog_id = core.app_name_for(a.engine, *core.detect_engines())
+    out_dir, cnt = core.run_split(a.file, a.start_row, a.col, a.mode, a.out, a.reader, prog_id, log=_log, workers=a.workers,
+                                  prof=a.prof, sheets=a.sheets, resume=a.resume, cancel=CANCEL, fmt=a.format, encoding=a.encoding)
+    _log(f"拆分完成！生成 {cnt} 个文件: {out_dir}", "SUCCESS")
+
+
+def cmd_merge(a):
+    t0 = time.perf_counter()
+    save_path, cnt = core.run_merge(a.folder, a.start_row, template=a.template, workers=a.workers, reader=a.reader, log=_log,
+                                    incremental=a.incremental, align=a.align, dedup=a.dedup is not None,
+                                    key_cols=core.parse_key_cols(a.dedup), prof=a.prof, sheets=a.sheets, cancel=CANCEL,
+                                    fmt=a.format, encoding=a.encoding)
+    dt = time.perf_counter() - t0
+    _log(f"合并耗时 {dt:.1f} 秒 ({a.workers} 进程, {cnt / dt if dt else 0:.0f} 行/秒)", "STATS")
+    _log(f"合并完成！共 {cnt} 行: {save_path}", "SUCCESS")
+
+
+def cmd_clean(a):
+    prog_id = None if a.engine == "native" else core.app_name_for(a.engine, *core.detect_engines())
+    t0 = time.perf_counter()
+    out = core.run_clean(a.file, prog_id, log=_log, prof=a.prof)
+    _log(f"清洗完成 ({time.perf_counter() - t0:.1f} 秒): {out}", "SUCCESS")
+
+
+def cmd_scan(a):
+    rows = _scan(a.folder, a.workers, a.reader, a.prof)
+    if a.json:
+        keys = ("total", "valid", "empty", "cols")
+        def one(f, st):
+            d = dict(file=os.path.basename(f), sheet=st.get("sheet"), **{k: st[k] for k in keys})
+            if st.get("sheets"): d["sheets"] = {n: {k: s[k] for k in keys} for n, s in st["sheets"].items()}
+            return d
+        print(json.dumps([one(f, st) for f, st in rows], ensure_ascii=False, indent=1))
+        return
+    print(f"{'序号':<4} {'文件名':<30} {'总行数':>8} {'有效行':>8} {'空行':>6} {'列数':>4}")
+    for i, (f, st) in enumerate(rows, 1):
+        print(f"{i:<4} {os.path.basename(f):<30} {st['total']:>8} {st['valid']:>8} {st['empty']:>6} {st['cols']:>4}")
+        if not st.get("sheets"): continue
+        for name in st.get("sheet_names", []):   # 多工作表: 逐表列出
+            s = core.sheet_stats(st, name)
+            print(f"{'':<4} {'  └ ' + name:<30} {s['total']:>8} {s['valid']:>8} {s['empty']:>6} {s['cols']:>4}")
+
+
+def cmd_report(a):
+    if os.path.isdir(a.path):
+        rows = _scan(a.path, a.workers, a.reader, a.prof)
+        sheets = core.resolve_sheets(rows[0][0], a.sheets) if rows else None
+        print("\n".join(core.merge_report(dict(rows), a.start_row, sheets)))
+    else:
+        keys = core.parse_split_keys(a.col); st = core.cached_stats(a.path, a.reader, core.histogram_cols(keys))
+        for i, s in enumerate(core.resolve_sheets(a.path, a.sheets) or [None]):
+            if i: print()
+            print("\n".join(core.analysis_report(a.path, a.start_row, keys, a.reader, st, s)))
+
+
+def build_parser():
+    p = argparse.ArgumentParser(prog="excel_cli", description="各区表格拆分 / 合并 / 扫描 / 报告 (无界面)")
+    p.add_argument("--log-file", help="同时把日志和操作耗时以 JSON Lines 追加到该文件")
+    p.add_argument("--profile", action="store_true", help="深度剖析: 另记 cProfile 热点函数与 tracemalloc 内存峰值")
+    p.add_argument("--profile-out", help="性能报告 JSON 的路径 (默认 ~/.excel_tool/profiles 下按时间命名)")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    def common(sp):
+        sp.add_argument("-s", "--start-row", type=int, default=9, help="数据开始行 (默认 9)")
+        sp.add_argument("--reader", choices=sorted(core.READERS), default=core.READER_BACKEND, help="读取后端")
+        sp.add_argument("--sheets", metavar="表名", help="工作表: 缺省为活动表，* 为全部，或逗号分隔表名/通配")
+    def output(sp):
+        sp.add_argument("--format", choices=core.OUTPUT_FORMATS, default="xlsx", help="输出格式 (默认 xlsx；其余只写取值)")
+        sp.add_argument("--encoding", default=core.CSV_ENCODING, help=f"csv/tsv 的编码 (默认 {core.CSV_ENCODING}，也可 gb18030)")
+    sp = sub.add_parser("split", help="按列拆分总表"); common(sp); output(sp)
+    sp.add_argument("file"); sp.add_argument("-c", "--col", default="3", help="拆分列 (默认 3)；可组合 3+5、归组 3:对照表.csv，多种以 ; 分隔")
+    sp.add_argument("-m", "--mode", choices=core.SPLIT_MODES, default="fast")
+    sp.add_argument("-o", "--out", help="输出目录 (默认总表旁的 拆分结果_<时间戳>)")
+    sp.add_argument("--engine", choices=("auto", "excel", "wps", "fake"), default="auto",
+                    help="perfect 模式使用的引擎 (fake 为模拟引擎，无需 Office)")
+    sp.add_argument("-w", "--workers", type=int, default=core.PERFECT_WORKERS, help="perfect 模式的引擎进程数")
+    sp.add_argument("--resume", action="store_true", help="续做上次中断的拆分 (-o 指定的目录，缺省为设定相同的最近一次)")
+    sp.set_defaults(func=cmd_split)
+    sp = sub.add_parser("merge", help="合并回收文件夹"); common(sp); output(sp)
+    sp.add_argument("folder"); sp.add_argument("-t", "--template", help="表头模板 (默认首个文件)")
+    sp.add_argument("-w", "--workers", type=int, default=core.MERGE_WORKERS, help="并行读取进程数")
+    sp.add_argument("--incremental", action="store_true",
+                    help="增量合并: 复用上次汇总表中未改动文件的行块，可续做中断的合并 (在文件夹里记清单)")
+    sp.add_argument("--align", action="store_true", help="按表头把各文件的列对齐到模板")
+    sp.add_argument("--dedup", nargs="?", const="", metavar="列号", help="跳过重复行；可给关键列如 2,3，缺省比较整行")
+    sp.set_defaults(func=cmd_merge)
+    sp = sub.add_parser("scan", help="扫描回收文件夹"); common(sp)
+    sp.add_argument("folder"); sp.add_argument("-w", "--workers", type=int, default=core.SCAN_WORKERS)
+    sp.add_argument("--json", action="store_true", help="输出 JSON")
+    sp.set_defaults(func=cmd_scan)
+    sp = sub.add_parser("clean", help="删除空行/空列另存")
+    sp.add_argument("file")
+    sp.add_argument("--engine", choices=("native", "auto", "excel", "wps", "fake"), default="native",
+                    help="native 为单遍压缩 (无需 Office)，其余经 Excel/WPS")
+    sp.set_defaults(func=cmd_clean)
+    sp = sub.add_parser("report", help="拆分分类报告 (文件) 或合并预估报告 (文件夹)"); common(sp)
+    sp.add_argument("path"); sp.add_argument("-c", "--col", default="3", help="拆分列，写法同 split")
+    sp.add_argument("-w", "--workers", type=int, default=core.SCAN_WORKERS)
+    sp.set_defaults(func=cmd_report)
+    return p
+
+
+def main(argv=None):
+    global OP_LOG
+    a = build_parser().parse_args(argv)
+    if a.log_file: OP_LOG = core.JsonLineLog(a.log_file)
+    args = " ".join(sys.argv[1:] if argv is None else argv)
+    meta = {"format": a.format} if getattr(a, "format", None) else {}
+    a.prof = core.RunProfile(a.cmd, _log, a.profile, args=args, **meta); status = "ok"
+    signal.signal(signal.SIGINT, _on_sigint)
+    try:
+        if OP_LOG:
+            with OP_LOG.op(a.cmd, args=args): a.func(a)
+        else: a.func(a)
+    except core.JobCancelled as e: status = "cancelled"; _log(str(e), "WARN"); return 130
+    except (OSError, ValueError) as e: status = f"error: {e}"; _log(str(e), "ERROR"); return 1
+    finally:
+        a.prof.report(path=a.profile_out, status=status)
+        if OP_LOG: OP_LOG.close()
+    return 0
+
+
+if __name__ == "__main__":
+    import multiprocessing; multiprocessing.freeze_support()
+    sys.exit(main())
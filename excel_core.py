@@ -0,0 +1,2525 @@
+"""各区表格协同工具的核心引擎: 拆分、合并、扫描、清洗与报告。
+
+不依赖任何界面，进度和日志通过 log(msg, level) 回调输出，可直接用于批处理、定时任务或命令行 (见 excel_cli.py)。
+"""
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.worksheet.cell_range import CellRange
+from openpyxl.styles.stylesheet import Stylesheet
+from openpyxl.utils import column_index_from_string, get_column_letter, range_boundaries
+from openpyxl.utils.datetime import from_excel, from_ISO8601, CALENDAR_WINDOWS_1900, CALENDAR_MAC_1904
+import os
+import sys
+import signal
+import atexit
+import random
+import shutil
+import datetime
+import threading
+import glob
+import fnmatch
+import csv
+import re
+import tempfile
+import pickle
+import itertools
+import multiprocessing
+import json
+import queue
+import time
+import hashlib
+from array import array
+import zipfile
+import posixpath
+import xml.etree.ElementTree as ET
+from bisect import bisect_left, bisect_right
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from copy import copy
+from operator import itemgetter
+from contextlib import contextmanager, nullcontext
+
+# 尝试导入 win32com
+try:
+    import pythoncom
+    import pywintypes
+    import win32com.client as win32
+    HAS_WIN32 = True
+except ImportError:
+    HAS_WIN32 = False
+
+# ================= 读取后端 (openpyxl / 快速 XML) =================
+READER_BACKEND = "openpyxl"  # 默认读取后端
+
+class OpenpyxlReader:
+    """openpyxl 只读模式读取工作表，默认活动工作表；iter_rows(sheet=表名) 可读同一工作簿的其他表。"""
+    name = "openpyxl"
+    def __init__(self, path, sheet=None):
+        self.wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        self.ws = self.wb[sheet] if sheet else self.wb.active
+        self.title = self.ws.title; self.sheet_names = self.wb.sheetnames
+    def iter_rows(self, min_row=1, max_row=None, max_col=None, sheet=None):
+        ws = self.wb[sheet] if sheet else self.ws
+        return ws.iter_rows(min_row=min_row, max_row=max_row, max_col=max_col, values_only=True)
+    def close(self): self.wb.close()
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.close()
+
+_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+_COLS = {}
+
+def _ref_col(ref):
+    letters = ref.rstrip("0123456789"); n = _COLS.get(letters)
+    if n is None: n = _COLS[letters] = column_index_from_string(letters)
+    return n
+
+def _rich_text(el):
+    # <t> 与 <r><t> 拼接，忽略注音 <rPh>，与 openpyxl 的 Text.content 一致
+    parts = []
+    for ch in el:
+        if ch.tag == _NS + "t": parts.append(ch.text or "")
+        elif ch.tag == _NS + "r":
+            t = ch.find(_NS + "t")
+            if t is not None and t.text: parts.append(t.text)
+    return "".join(parts)
+
+def _book_sheets(book):
+    """workbook.xml 里的 ([(表名, 关系 Id)...], 活动表序号)。"""
+    view = book.find(f"{_NS}bookViews/{_NS}workbookView")
+    active = int(view.get("activeTab", 0)) if view is not None else 0
+    sheets = [(el.get("name"), el.get(_REL_ID)) for el in book.findall(f"{_NS}sheets/{_NS}sheet")]
+    return sheets, active if active < len(sheets) else 0
+
+def _sheet_parts(zf, sheets):
+    """各工作表在压缩包里的部件路径 {表名: xl/worksheets/sheetN.xml}。"""
+    rels = {r.get("Id"): r.get("Target") for r in ET.fromstring(zf.read("xl/_rels/workbook.xml.rels"))}
+    return {name: (rels[rid].lstrip("/") if rels[rid].startswith("/") else posixpath.normpath("xl/" + rels[rid]))
+            for name, rid in sheets}
+
+class FastXmlReader:
+    """直接 iterparse 压缩包里的 sheetN.xml 和 sharedStrings.xml，不创建 openpyxl 单元格对象。
+    只取缓存值 (等同 data_only=True)，产出的行元组与 openpyxl 只读模式逐行一致。
+    共享字符串和样式只解析一次，iter_rows(sheet=表名) 读同一压缩包里的其他表。"""
+    name = "xml"
+    def __init__(self, path, sheet=None):
+        self.zf = zipfile.ZipFile(path)
+        try: self._load_meta(sheet)
+        except: self.zf.close(); raise
+
+    def _load_meta(self, sheet=None):
+        names = set(self.zf.namelist())
+        book = ET.fromstring(self.zf.read("xl/workbook.xml"))
+        pr = book.find(_NS + "workbookPr")
+        self.epoch = CALENDAR_MAC_1904 if pr is not None and pr.get("date1904") in ("1", "true") else CALENDAR_WINDOWS_1900
+        sheets, active = _book_sheets(book); self.sheet_paths = _sheet_parts(self.zf, sheets)
+        self.sheet_names = [name for name, _ in sheets]
+        self.title = sheet or sheets[active][0]
+        if self.title not in self.sheet_paths: raise KeyError(f"Worksheet {self.title} does not exist.")
+        self.sheet_path = self.sheet_paths[self.title]
+        self.strings = []
+        if "xl/sharedStrings.xml" in names:
+            with self.zf.open("xl/sharedStrings.xml") as src:
+                for _, el in ET.iterparse(src):
+                    if el.tag == _NS + "si": self.strings.append(_rich_text(el).replace('x005F_', '')); el.clear()
+        self.date_styles = self.td_styles = frozenset()
+        if "xl/styles.xml" in names:
+            ss = Stylesheet.from_tree(ET.fromstring(self.zf.read("xl/styles.xml")))
+            self.date_styles = ss.date_formats; self.td_styles = ss.timedelta_formats
+
+    def _parse_row(self, el):
+        cells = []; col = 0
+        for c in el:
+            if c.tag != _NS + "c": continue
+            ref = c.get("r"); col = _ref_col(ref) if ref else col + 1
+            t = c.get("t", "n")
+            if t == "inlineStr":
+                child = c.find(_NS + "is"); v = _rich_text(child) if child is not None else None
+            else:
+                v = c.findtext(_NS + "v") or None
+                if v is not None:
+                    if t == "n":
+                        v = float(v) if ("." in v or "E" in v or "e" in v) else int(v)
+                        st = int(c.get("s", 0))
+                        if st in self.date_styles:
+                            try: v = from_excel(v, self.epoch, timedelta=st in self.td_styles)
+                            except (OverflowError, ValueError): v = "#VALUE!"
+                    elif t == "s": v = self.strings[int(v)]
+                    elif t == "b": v = bool(int(v))
+                    elif t == "d": v = from_ISO8601(v)
+            cells.append((col, v))
+        return cells
+
+    def iter_rows(self, min_row=1, max_row=None, max_col=None, sheet=None):
+        # 补行/补列规则照搬 openpyxl ReadOnlyWorksheet._cells_by_row，保证两种后端结果一致
+        if sheet and sheet not in self.sheet_paths: raise KeyError(f"Worksheet {sheet} does not exist.")
+        return self._iter_rows(self.sheet_paths[sheet] if sheet else self.sheet_path, min_row, max_row, max_col)
+
+    def _iter_rows(self, sheet_path, min_row, max_row, max_col):
+        with self.zf.open(sheet_path) as src:
+            counter = min_row; idx = 1; row_no = 0; data = None; empty = None
+            for ev, el in ET.iterparse(src, events=("start", "end")):
+                if ev == "start":
+                    if el.tag == _NS + "sheetData": data = el
+                    continue
+                if el.tag == _NS + "dimension":
+                    _, _, dc, dr = range_boundaries(el.get("ref"))
+                    max_col = max_col or dc; max_row = max_row or dr
+                elif el.tag == _NS + "row":
+                    if empty is None: empty = (None,) * max_col if max_col else []
+                    r = el.get("r"); row_no = idx = int(r) if r else row_no + 1
+                    cells = self._parse_row(el); data.remove(el)
+                    if max_row is not None and idx > max_row: break
+                    while counter < idx: counter += 1; yield empty
+                    if counter <= idx:
+                        counter += 1
+                        if not cells and not max_col: yield (); continue
+                        row = [None] * (max_col or cells[-1][0])
+                        for c, v in cells:
+                            if c <= len(row): row[c-1] = v
+                        yield tuple(row)
+            if empty is None: empty = (None,) * max_col if max_col else []
+            if max_row is not None and max_row < idx:
+                for _ in range(counter, max_row + 1): yield empty
+
+    def close(self): self.zf.close()
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.close()
+
+CSV_EXTS = (".csv", ".tsv")    # 按文本表读取的扩展名 (不论选哪种读取后端)
+_CSV_NUM = re.compile(r"-?(0|[1-9]\d{0,14})(\.\d+)?$")
+
+def is_csv(path): return path.lower().endswith(CSV_EXTS)
+
+def _sniff_encoding(path, size=1 << 20):
+    """取文件开头一段试解 UTF-8，不是时按 GB18030 (兼容 GBK)。"""
+    with open(path, "rb") as fp: b = fp.read(size)
+    try: b.decode("utf-8")
+    except UnicodeDecodeError as e:
+        if e.start < len(b) - 3 or len(b) < size: return "gb18030"   # 截在多字节字符中间的不算
+    return "utf-8-sig"
+
+def _csv_value(v):
+    if not v: return None
+    if _CSV_NUM.match(v): return float(v) if "." in v else int(v)
+    return v
+
+class CsvReader:
+    """CSV / TSV 当作只有一个工作表 (表名为文件名) 的工作簿读取，接口同 OpenpyxlReader。
+    编码自动识别 (UTF-8 或 GB18030)，分隔符按扩展名 (.tsv 为制表符)；空格子为 None，
+    整数/小数文本转成数字，以 0 开头的编号和超过 15 位的数字串 (如身份证号) 保持文本。"""
+    name = "csv"
+    def __init__(self, path, sheet=None):
+        self.path = path; self.title = os.path.splitext(os.path.basename(path))[0]; self.sheet_names = [self.title]
+        if sheet and sheet != self.title: raise KeyError(f"Worksheet {sheet} does not exist.")
+        self.encoding = _sniff_encoding(path); self.delimiter = "\t" if path.lower().endswith(".tsv") else ","
+    def iter_rows(self, min_row=1, max_row=None, max_col=None, sheet=None):
+        if sheet and sheet != self.title: raise KeyError(f"Worksheet {sheet} does not exist.")
+        return self._iter_rows(min_row, max_row, max_col)
+    def _iter_rows(self, min_row, max_row, max_col):
+        with open(self.path, encoding=self.encoding, newline="") as fp:
+            for i, r in enumerate(csv.reader(fp, delimiter=self.delimiter), 1):
+                if max_row is not None and i > max_row: return
+                if i < min_row: continue
+                r = [_csv_value(v) for v in (r[:max_col] if max_col else r)]
+                if max_col and len(r) < max_col: r += [None] * (max_col - len(r))
+                yield tuple(r)
+    def close(self): pass
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.close()
+
+READERS = {"openpyxl": OpenpyxlReader, "xml": FastXmlReader}
+
+def open_reader(path, backend=None, sheet=None):
+    if is_csv(path): return CsvReader(path, sheet)
+    return READERS[backend or READER_BACKEND](SHADOWS.resolve(path), sheet)
+
+def list_sheets(path):
+    """工作簿的 (工作表名列表, 活动工作表名)，只读 workbook.xml；CSV 只有一个以文件名为名的表。"""
+    if is_csv(path): t = os.path.splitext(os.path.basename(path))[0]; return [t], t
+    with zipfile.ZipFile(SHADOWS.resolve(path)) as zf: sheets, active = _book_sheets(ET.fromstring(zf.read("xl/workbook.xml")))
+    return [name for name, _ in sheets], sheets[active][0]
+
+def select_sheets(names, active, spec=None):
+    """按选择串挑出工作表 (保持工作簿里的顺序): 空为活动工作表，"*" 为全部，
+    否则为逗号分隔的表名或通配模式 (如 "1月,2024-*")。一个都没选中时抛 ValueError。"""
+    spec = (spec or "").strip()
+    if not spec: return [active]
+    pats = [p.strip() for p in spec.replace("，", ",").split(",") if p.strip()]
+    out = [n for n in names if any(n == p or fnmatch.fnmatchcase(n, p) for p in pats)]
+    if not out: raise ValueError(f"没有与 “{spec}” 匹配的工作表 (现有: {', '.join(names)})")
+    return out
+
+def resolve_sheets(path, spec=None):
+    """选择串对应的工作表名列表；选择串为空时返回 None (即活动工作表，各文件可以不同名)。"""
+    return select_sheets(*list_sheets(path), spec) if (spec or "").strip() else None
+
+def check_reader_parity(path, backends=("openpyxl", "xml"), sheet=None):
+    """逐行比对两种后端读取工作表 (None 为活动工作表) 的结果，一致返回 None，否则返回首个不一致的 (行号, 行A, 行B)。"""
+    a, b = open_reader(path, backends[0], sheet), open_reader(path, backends[1], sheet)
+    try:
+        n = 0
+        for n, (x, y) in enumerate(itertools.zip_longest(a.iter_rows(), b.iter_rows()), 1):
+            if x is None or y is None or tuple(x) != tuple(y): return n, x, y
+        return None
+    finally: a.close(); b.close()
+
+# ================= 影子文件缓存 =================
+SHADOW_DIR = os.path.join(os.path.expanduser("~"), ".excel_tool", "shadows")
+SHADOW_CACHE_MB = 1024       # 缓存总大小上限，超出时按最近使用时间淘汰
+SHADOW_READS = True          # 读取文件时若已有影子就读影子 (拆分/合并/预览/扫描共用)
+
+class ShadowCache:
+    """经 Excel/WPS 另存修复过的影子文件的持久缓存，按 (源文件内容哈希, 引擎) 命名。
+    命中时更新影子的修改时间作为最近使用时间，总大小超过上限时从最久未用的开始删除。
+    sources.json 记录 源路径 -> (大小, 修改时间, 哈希)，读取时据此直接找到影子而不必重新计算哈希。"""
+    def __init__(self, root=SHADOW_DIR, max_bytes=SHADOW_CACHE_MB << 20):
+        self.root = root; self.max_bytes = max_bytes; self.lock = threading.Lock()
+        self.src_path = os.path.join(root, "sources.json"); self._sources = None
+
+    def _engine(self, prog_id): return prog_id.split(".")[0].lower()
+
+    def _load(self):
+        if self._sources is None:
+            try:
+                with open(self.src_path, encoding="utf-8") as fp: self._sources = json.load(fp)
+            except (OSError, ValueError): self._sources = {}
+        return self._sources
+
+    def _save(self):
+        tmp = self.src_path + f".{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as fp: json.dump(self._sources, fp, ensure_ascii=False)
+            os.replace(tmp, self.src_path)
+        except OSError: pass
+
+    def _digest(self, f):
+        """源文件哈希，路径/大小/修改时间都没变时直接用记录的值。"""
+        st = os.stat(f); key = os.path.abspath(f)
+        with self.lock:
+            e = self._load().get(key)
+            if e and e[0] == st.st_size and e[1] == st.st_mtime_ns: return e[2]
+        h = file_digest(f)
+        with self.lock: self._sources[key] = [st.st_size, st.st_mtime_ns, h]
+        return h
+
+    def _touch(self, path):
+        try: os.utime(path); return True
+        except OSError: return False
+
+    def get(self, f, prog_id):
+        """返回可用的影子路径 (同时记为最近使用)，没有则返回 None。"""
+        path = os.path.join(self.root, f"{self._digest(f)}_{self._engine(prog_id)}.xlsx")
+        return path if self._touch(path) else None
+
+    def put(self, f, prog_id, produce):
+        """produce(临时路径) 写出影子后移入缓存，返回影子路径。"""
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, f"{self._digest(f)}_{self._engine(prog_id)}.xlsx")
+        tmp = os.path.join(self.root, f"~{os.getpid()}_{threading.get_ident()}.xlsx")
+        try:
+            produce(tmp); os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp): os.remove(tmp)
+        with self.lock: self._save()
+        self.evict()
+        return path
+
+    def resolve(self, f):
+        """已有该文件 (内容未变) 的任一引擎影子时返回影子路径，否则原样返回。不计算哈希。"""
+        if not SHADOW_READS: return f
+        try:
+            st = os.stat(f)
+            with self.lock: e = self._load().get(os.path.abspath(f))
+            if not e or e[0] != st.st_size or e[1] != st.st_mtime_ns: return f
+            for name in os.listdir(self.root):
+                if name.startswith(e[2] + "_") and self._touch(os.path.join(self.root, name)): return os.path.join(self.root, name)
+        except OSError: pass
+        return f
+
+    def evict(self):
+        """总大小超过上限时按最近使用时间从旧到新删除影子。"""
+        try: names = [n for n in os.listdir(self.root) if n.endswith(".xlsx") and not n.startswith("~")]
+        except OSError: return
+        files = []
+        for n in names:
+            try: st = os.stat(os.path.join(self.root, n)); files.append((st.st_mtime, st.st_size, n))
+            except OSError: pass
+        total = sum(sz for _, sz, _ in files)
+        gone = set()
+        for _, sz, n in sorted(files):
+            if total <= self.max_bytes: break
+            try: os.remove(os.path.join(self.root, n)); total -= sz; gone.add(n.split("_")[0])
+            except OSError: pass
+        if gone:
+            live = {n.split("_")[0] for _, _, n in files} - gone
+            with self.lock:
+                self._sources = {k: e for k, e in self._load().items() if e[2] in live}; self._save()
+
+SHADOWS = ShadowCache()
+
+# ================= 结构化日志 (JSON Lines) =================
+LOG_DIR = os.path.join(os.path.expanduser("~"), ".excel_tool", "logs")
+
+class JsonLineLog:
+    """线程安全的 JSON Lines 日志文件: 每条日志一行，每个操作结束时再记一行耗时。
+    文件打不开时静默降级为不记录。"""
+    def __init__(self, path=None):
+        self.path = path or os.path.join(LOG_DIR, f"excel_tool_{datetime.date.today():%Y%m%d}.jsonl")
+        self.lock = threading.Lock(); self.fp = None
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self.fp = open(self.path, "a", encoding="utf-8")
+        except OSError: pass
+
+    def write(self, **rec):
+        if not self.fp: return
+        rec = {"ts": datetime.datetime.now().isoformat(timespec="milliseconds"), **rec}
+        line = json.dumps(rec, ensure_ascii=False, default=str) + "\n"
+        with self.lock: self.fp.write(line)
+
+    def log(self, msg, level="INFO"):
+        self.write(level=level, msg=msg, thread=threading.current_thread().name)
+
+    @contextmanager
+    def op(self, name, **fields):
+        """记录一个操作的耗时和结果；with 块内可往返回的 dict 里补充字段 (如行数)。"""
+        t0 = time.perf_counter(); status = "ok"
+        try: yield fields
+        except JobCancelled: status = "cancelled"; raise
+        except BaseException as e: status = f"error: {e}"; raise
+        finally: self.write(op=name, seconds=round(time.perf_counter() - t0, 3), status=status, **fields)
+
+    def flush(self):
+        if self.fp:
+            with self.lock: self.fp.flush()
+
+    def close(self):
+        if self.fp:
+            with self.lock: self.fp.close(); self.fp = None
+
+# ================= 分阶段计时与性能剖析 =================
+PROFILE_DIR = os.path.join(os.path.expanduser("~"), ".excel_tool", "profiles")
+PROFILE_TOP = 30             # 深度剖析报告里保留的热点函数数
+PROFILE_LOG_TOP = 5          # 其中写进日志的条数
+
+RSS_SAMPLE_S = 0.05          # 任务进行中采样常驻内存的间隔 (秒)
+
+def _win_memory():
+    """Windows: 本进程当前的工作集字节数，经 psapi.GetProcessMemoryInfo，不依赖 psutil。"""
+    import ctypes
+    from ctypes import wintypes
+    class Counters(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + \
+                   [(n, ctypes.c_size_t) for n in ("PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage",
+                                                   "QuotaPagedPoolUsage", "QuotaPeakNonPagedPoolUsage",
+                                                   "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+    c = Counters(); c.cb = ctypes.sizeof(c)
+    proc = ctypes.windll.kernel32.GetCurrentProcess; proc.restype = wintypes.HANDLE
+    get = ctypes.windll.psapi.GetProcessMemoryInfo
+    get.argtypes = [wintypes.HANDLE, ctypes.POINTER(Counters), wintypes.DWORD]
+    if not get(proc(), ctypes.byref(c), c.cb): raise OSError("GetProcessMemoryInfo 失败")
+    return c.WorkingSetSize
+
+def rss_mb():
+    """本进程当前的常驻内存 (MB)：Linux 读 /proc/self/statm，Windows 取工作集；其他平台取不到时返回 None。"""
+    try:
+        if sys.platform == "win32": return round(_win_memory() / (1 << 20), 1)
+        with open("/proc/self/statm") as fp: pages = int(fp.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / (1 << 20), 1)
+    except Exception: return None
+
+class RunProfile:
+    """一次任务的分阶段计时: 各阶段耗时与次数、行数、读写字节数、本次任务的内存峰值。
+    内存峰值由后台线程每 RSS_SAMPLE_S 秒采样本进程常驻内存得出 (连同开始时的基线一起报告)，
+    不含子进程，极短的尖峰可能漏采；平台取不到常驻内存时报告里为 None 并注明。
+    阶段可嵌套，记的是扣除内层阶段后的自身耗时，各阶段加“其他”即总耗时；
+    引擎/解析子进程带回的阶段按进程累加，可能超过总耗时。
+    deep=True 时另用 cProfile 记热点函数、tracemalloc 记 Python 内存分配峰值，
+    两者只跟踪创建它的线程，finish/report 也须在该线程调用。
+    用作 with 块时，退出时自动 report 到 log。"""
+    def __init__(self, op, log=None, deep=False, **meta):
+        self.op = op; self.log = log; self.deep = deep; self.meta = meta
+        self.phases = {}; self.counters = Counter(); self.lock = threading.Lock(); self.local = threading.local()
+        self.started = datetime.datetime.now(); self.t0 = time.perf_counter(); self.result = None
+        self.cprof = None; self.tracing = False
+        self.rss_start = self.rss_peak = rss_mb(); self.sampling = threading.Event()
+        if self.rss_start is not None: threading.Thread(target=self._sample_rss, daemon=True).start()
+        if deep:
+            import cProfile, tracemalloc
+            if tracemalloc.is_tracing(): tracemalloc.reset_peak()
+            else: tracemalloc.start(); self.tracing = True
+            try: self.cprof = cProfile.Profile(); self.cprof.enable()
+            except ValueError: self.cprof = None    # 3.12 起同一时间只允许一个 profiler
+
+    def _sample_rss(self):
+        while not self.sampling.wait(RSS_SAMPLE_S):
+            m = rss_mb()
+            if m is not None and m > self.rss_peak: self.rss_peak = m
+
+    def _stack(self):
+        s = getattr(self.local, "stack", None)
+        if s is None: s = self.local.stack = []
+        return s
+
+    def add(self, phase, seconds, calls=1):
+        """累计一段耗时，同时从当前线程外层阶段的自身耗时里扣除。"""
+        with self.lock:
+            p = self.phases.get(phase)
+            if p is None: p = self.phases[phase] = [0.0, 0]
+            p[0] += seconds; p[1] += calls
+        s = self._stack()
+        if s: s[-1] += seconds
+
+    @contextmanager
+    def phase(self, name):
+        s = self._stack(); s.append(0.0); t = time.perf_counter()
+        try: yield
+        finally:
+            el = time.perf_counter() - t; child = s.pop()
+            self.add(name, el - child)
+            if s: s[-1] += child
+
+    def timed(self, it, phase):
+        """包装迭代器，每取一项 (读取+解析) 的耗时累计到 phase。"""
+        pc = time.perf_counter; it = iter(it)
+        try:
+            while True:
+                t = pc()
+                try: x = next(it)
+                except StopIteration: return
+                self.add(phase, pc() - t); yield x
+        finally:
+            if hasattr(it, "close"): it.close()   # 中途停下时让内层生成器 (如进程池) 及时收尾
+
+    def wrap(self, fn, phase):
+        """包装函数，每次调用的耗时累计到 phase。"""
+        pc = time.perf_counter
+        def call(*a, **kw):
+            t = pc()
+            try: return fn(*a, **kw)
+            finally: self.add(phase, pc() - t)
+        return call
+
+    def count(self, **kw):
+        with self.lock: self.counters.update(kw)
+
+    def _bytes(self, key, paths):
+        n = 0
+        for p in paths:
+            try: n += sum(os.path.getsize(os.path.join(d, x)) for d, _, fs in os.walk(p) for x in fs) if os.path.isdir(p) else os.path.getsize(p)
+            except OSError: pass
+        self.count(**{key: n})
+
+    def file_in(self, *paths): self._bytes("bytes_in", paths)
+    def file_out(self, *paths): self._bytes("bytes_out", paths)
+
+    def finish(self, status="ok"):
+        """停止计时与剖析，返回报告 dict；重复调用返回同一份。"""
+        if self.result: return self.result
+        total = time.perf_counter() - self.t0; self.sampling.set()
+        if self.rss_start is not None: self.rss_peak = max(self.rss_peak, rss_mb() or 0)
+        c = dict(self.counters); rows = c.pop("rows", 0)
+        phases = sorted(self.phases.items(), key=lambda kv: -kv[1][0])
+        r = self.result = {"op": self.op, "status": status, "started": self.started.isoformat(timespec="seconds"),
+                           "seconds": round(total, 3), "meta": self.meta, "rows": rows,
+                           "rows_per_s": round(rows / total) if total else None,
+                           "bytes_in": c.pop("bytes_in", 0), "bytes_out": c.pop("bytes_out", 0), "counters": c,
+                           "rss_start_mb": self.rss_start, "peak_rss_mb": self.rss_peak,
+                           "phases": [{"name": k, "seconds": round(t, 3), "calls": n, "share": round(t / total, 3) if total else 0}
+                                      for k, (t, n) in phases],
+                           "other_s": round(max(0.0, total - sum(t for t, _ in self.phases.values())), 3)}
+        if self.cprof:
+            self.cprof.disable()
+            import pstats
+            st = pstats.Stats(self.cprof).stats
+            top = sorted(st.items(), key=lambda kv: kv[1][2], reverse=True)[:PROFILE_TOP]
+            r["hotspots"] = [{"func": f"{os.path.basename(fn)}:{line}({func})", "calls": nc,
+                              "tottime": round(tt, 4), "cumtime": round(ct, 4)}
+                             for (fn, line, func), (_, nc, tt, ct, _) in top]
+        if self.deep:
+            import tracemalloc
+            if tracemalloc.is_tracing():
+                r["py_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / (1 << 20), 1)
+                if self.tracing: tracemalloc.stop()
+        return r
+
+    def summary(self):
+        """报告摘要，每项一行。"""
+        r = self.finish(); mb = lambda n: f"{n / (1 << 20):.1f} MB"
+        head = f"[{r['op']}{' → ' + r['meta']['format'] if r['meta'].get('format') else ''}] 用时 {r['seconds']:.2f} 秒"
+        if r["rows"]: head += f"，{r['rows']} 行 ({r['rows_per_s']} 行/秒)"
+        if r["bytes_in"] or r["bytes_out"]: head += f"，读 {mb(r['bytes_in'])} / 写 {mb(r['bytes_out'])}"
+        if r["peak_rss_mb"] is not None: head += f"，本次内存峰值 {r['peak_rss_mb']} MB (开始时 {r['rss_start_mb']} MB)"
+        else: head += "，内存峰值取不到 (本平台不支持)"
+        if r.get("py_peak_mb") is not None: head += f" (Python 分配峰值 {r['py_peak_mb']} MB)"
+        lines = [head]
+        parts = [f"{p['name']} {p['seconds']:.2f}s ({p['share']:.0%})" for p in r["phases"]]
+        if r["other_s"] >= 0.01: parts.append(f"其他 {r['other_s']:.2f}s")
+        if parts: lines.append("阶段: " + " | ".join(parts))
+        if r["counters"]: lines.append("计数: " + ", ".join(f"{k}={v}" for k, v in r["counters"].items()))
+        for h in r.get("hotspots", [])[:PROFILE_LOG_TOP]:
+            lines.append(f"热点: {h['func']} 自身 {h['tottime']:.3f}s / 累计 {h['cumtime']:.3f}s ({h['calls']} 次)")
+        return lines
+
+    def save(self, path=None):
+        """写出 JSON 报告 (默认在 PROFILE_DIR)，返回路径；写不了返回 None。"""
+        r = self.finish()
+        path = path or os.path.join(PROFILE_DIR, f"{self.op}_{self.started:%Y%m%d_%H%M%S_%f}.json")
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as fp: json.dump(r, fp, ensure_ascii=False, indent=1, default=str)
+            return path
+        except OSError: return None
+
+    def report(self, log=None, path=None, status="ok"):
+        """结束计时，摘要以 STATS 级别写进日志，并另存 JSON 报告。返回报告路径。"""
+        log = log or self.log or _nolog
+        self.finish(status)
+        for line in self.summary(): log(line, "STATS")
+        out = self.save(path)
+        if out: log(f"性能报告: {out}", "STATS")
+        return out
+
+    def __enter__(self): return self
+    def __exit__(self, et, e, tb):
+        self.report(status="ok" if et is None else "cancelled" if issubclass(et, JobCancelled) else f"error: {e}")
+
+class _NullProfile:
+    """不计时时的占位，接口同 RunProfile，包装原样返回。"""
+    def phase(self, name): return nullcontext()
+    def timed(self, it, phase): return it
+    def wrap(self, fn, phase): return fn
+    def add(self, *a, **kw): pass
+    count = file_in = file_out = finish = report = add
+
+_noprof = _NullProfile()
+
+# ================= 检查点与取消 (中断后续做) =================
+JOB_JOURNAL_NAME = "_job_journal.jsonl"  # 输出目录里的检查点日志
+JOB_CHECK_ROWS = 5000        # 逐行处理时每隔多少行检查一次取消
+
+class JobCancelled(Exception):
+    """任务在两批之间被取消；已完成的部分已记入检查点，续做时跳过。"""
+
+def _ignore_sigint():
+    # 子进程忽略 Ctrl+C，由主进程置位 cancel 后按批停下
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def check_cancel(cancel):
+    if cancel is not None and cancel.is_set(): raise JobCancelled("任务已取消，已完成的部分可续做")
+
+def read_journal(out_dir):
+    """读出输出目录里的检查点日志: (首行, {已完成的输出文件名: 记录}, 是否已全部完成)；没有时返回 None。
+    中途崩溃时最后一行可能残缺，读不出的行忽略。"""
+    try:
+        with open(os.path.join(out_dir, JOB_JOURNAL_NAME), encoding="utf-8") as fp: lines = fp.read().splitlines()
+    except OSError: return None
+    head = None; done = {}; finished = False
+    for line in lines:
+        try: rec = json.loads(line)
+        except ValueError: continue
+        if head is None: head = rec
+        elif "file" in rec: done[rec["file"]] = rec
+        elif rec.get("status") == "done": finished = True
+    return (head, done, finished) if head else None
+
+def find_resumable(parent, prefix, op, params):
+    """parent 下以 prefix 开头、参数相同且未完成的输出目录 (最近的一个)；没有时返回 None。"""
+    dirs = sorted(glob.glob(os.path.join(parent, glob.escape(prefix) + "*")), key=os.path.getmtime, reverse=True)
+    for d in dirs:
+        j = read_journal(d)
+        if j and not j[2] and j[0].get("op") == op and j[0].get("params") == params: return d
+    return None
+
+class JobJournal:
+    """输出目录里的检查点日志 (JSON Lines): 首行记任务参数，之后每完成一个输出文件追加一行并立即落盘，
+    全部完成后追加 {"status": "done"}。resume 时若目录里有参数相同且未完成的日志就接着写，
+    skip() 对已完成且文件仍在的输出返回 True；否则从头开始。cancel (threading.Event) 由 check() 检查。
+    failed 为本次失败的输出数，有失败时不应 finish，留待续做重试。"""
+    def __init__(self, out_dir, op, params, resume=False, cancel=None, log=None, meta=None):
+        self.dir = out_dir; self.path = os.path.join(out_dir, JOB_JOURNAL_NAME); self.cancel = cancel; self.failed = 0
+        prev = read_journal(out_dir) if resume else None
+        self.resumed = bool(prev and not prev[2] and prev[0].get("op") == op and prev[0].get("params") == params)
+        if prev and not self.resumed and log: log("输出目录里的检查点与本次参数不同或已完成，从头开始", "WARN")
+        self.meta = prev[0].get("meta", {}) if self.resumed else dict(meta or {})
+        self.done = prev[1] if self.resumed else {}
+        self.fp = open(self.path, "a" if self.resumed else "w", encoding="utf-8")
+        if not self.resumed:
+            self._write({"op": op, "params": params, "meta": self.meta, "time": datetime.datetime.now().isoformat(timespec="seconds")})
+
+    def _write(self, rec):
+        self.fp.write(json.dumps(rec, ensure_ascii=False) + "\n"); self.fp.flush(); os.fsync(self.fp.fileno())
+
+    @property
+    def cancelled(self): return self.cancel is not None and self.cancel.is_set()
+
+    def check(self): check_cancel(self.cancel)
+
+    def skip(self, name): return name in self.done and os.path.exists(os.path.join(self.dir, name))
+
+    def mark(self, name, **info):
+        rec = dict(info, file=name); self.done[name] = rec; self._write(rec)
+
+    def fail(self): self.failed += 1
+
+    def finish(self): self._write({"status": "done"}); self.close()
+
+    def close(self):
+        if not self.fp.closed: self.fp.close()
+
+class _NullJob:
+    """不记检查点时的占位，接口同 JobJournal。"""
+    cancel = None; cancelled = False; failed = 0
+    def check(self): pass
+    def skip(self, name): return False
+    def mark(self, name, **info): pass
+    def fail(self): pass
+
+_nojob = _NullJob()
+
+# ================= 输出格式: xlsx / 只有取值的平面格式 (CSV / TSV / Parquet / Arrow) =================
+FLAT_FORMATS = {"csv": ".csv", "tsv": ".tsv", "parquet": ".parquet", "arrow": ".arrow"}
+OUTPUT_FORMATS = ("xlsx", *FLAT_FORMATS)
+CSV_ENCODING = "utf-8-sig"   # 带 BOM，Excel 双击打开中文不乱码；给只认 GBK 的系统用 gb18030
+FLAT_BATCH_ROWS = 10000      # Parquet / Arrow 每批 (行组) 的行数
+
+def _arrow():
+    try:
+        import pyarrow, pyarrow.parquet, pyarrow.ipc
+        return pyarrow
+    except ImportError: raise ValueError("Parquet / Arrow 输出需要安装 pyarrow (pip install pyarrow)")
+
+def check_output_format(fmt, encoding=CSV_ENCODING):
+    """任务开始前检查输出格式 (及 CSV 编码) 可用，不可用时抛 ValueError。"""
+    if fmt not in OUTPUT_FORMATS: raise ValueError(f"不支持的输出格式: {fmt} (可选 {', '.join(OUTPUT_FORMATS)})")
+    if fmt in ("parquet", "arrow"): _arrow()
+    if fmt in ("csv", "tsv"):
+        try: "".encode(encoding)
+        except LookupError: raise ValueError(f"未知编码: {encoding}")
+
+def output_name(stem, fmt, n_sheets=1):
+    """输出文件名: xlsx 及单个表的平面格式为 <stem>.<扩展名>；平面格式有多个表时为文件夹 <stem>，各表一个文件。"""
+    if fmt == "xlsx": return stem + ".xlsx"
+    return stem + FLAT_FORMATS[fmt] if n_sheets <= 1 else stem
+
+def _column_names(labels, width):
+    names = []; seen = Counter()
+    for i in range(width):
+        n = (labels[i] if i < len(labels) else "") or f"列{i+1}"; seen[n] += 1
+        names.append(n if seen[n] == 1 else f"{n}_{seen[n]}")
+    return names
+
+_FLAT_KINDS = {bool: "b", int: "i", float: "f", datetime.datetime: "dt", datetime.date: "d", datetime.time: "t",
+               datetime.timedelta: "td"}
+_FLAT_FITS = {"f": {"i", "f"}}         # 小数列也收整数
+
+def _flat_kind(vals):
+    """一列取值的类别: 全是同一类 (整数、小数、布尔、日期时间) 时为该类，整数混小数为小数，混有文字时为 s (字符串)，全空为 None。"""
+    ks = {_FLAT_KINDS.get(type(v), "s") for v in vals if v is not None}
+    if "i" in ks and any(type(v) is int and not -2**63 <= v < 2**63 for v in vals): return "s"
+    return "f" if ks == {"i", "f"} else ks.pop() if len(ks) == 1 else "s" if ks else None
+
+def _flat_str(v):
+    """存进字符串列的写法: 整数值的小数写成整数 (2.0 → 2，同 Excel 显示)。"""
+    return None if v is None else str(int(v)) if type(v) is float and v.is_integer() else str(v)
+
+def _flat_types(pa):
+    return {"b": pa.bool_(), "i": pa.int64(), "f": pa.float64(), "dt": pa.timestamp("us"), "d": pa.date32(),
+            "t": pa.time64("us"), "td": pa.duration("us"), "s": pa.string()}
+
+class FlatWriter:
+    """逐行写出一个表的取值 (不带样式)，首行为列名 (表头标签，见 header_labels)。
+    csv/tsv 经标准库 csv 直接写出；parquet/arrow 每 FLAT_BATCH_ROWS 行一批经 pyarrow 写出，
+    各列类型由首批取值推断 (整数、小数、布尔、日期时间，混有文字的列为字符串)，空格子为 null。
+    列数取列名、width (源表的最大列数) 和首批数据中最宽者。之后出现更宽的行或与列类型不符的取值时，
+    把已写出的部分按加宽 (新列为 null) / 改成字符串的列重写一遍再继续，不截断也不丢值。"""
+    def __init__(self, path, fmt, labels, encoding=CSV_ENCODING, width=0, log=None):
+        self.path = path; self.fmt = fmt; self.labels = list(labels); self.width = width
+        self.log = log or _nolog; self.w = None; self.batch = []; self.rows = 0
+        if fmt in ("csv", "tsv"):
+            self.fp = open(path, "w", encoding=encoding, newline="")
+            w = csv.writer(self.fp, delimiter="\t" if fmt == "tsv" else ",")
+            if self.labels: w.writerow(self.labels)
+            self.append = w.writerow
+        else: self.fp = None; self.pa = _arrow()
+
+    def append(self, r):
+        self.batch.append(r)
+        if len(self.batch) >= FLAT_BATCH_ROWS: self._flush()
+
+    def _open(self, kinds):
+        pa = self.pa; self.kinds = kinds
+        self.schema = pa.schema([(n, _flat_types(pa)[k]) for n, k in zip(_column_names(self.labels, len(kinds)), kinds)])
+        self.w = pa.parquet.ParquetWriter(self.path, self.schema) if self.fmt == "parquet" else pa.ipc.new_file(self.path, self.schema)
+
+    def _reopen(self, kinds):
+        """按新的列类型 (可能更多列) 重写已写出的部分。"""
+        pa = self.pa; self.w.close()
+        if self.fmt == "parquet": old = pa.parquet.read_table(self.path)
+        else:
+            with pa.OSFile(self.path) as src: old = pa.ipc.open_file(src).read_all()
+        cols = []
+        for i, k in enumerate(kinds):
+            if i >= len(self.kinds): cols.append(pa.nulls(old.num_rows, _flat_types(pa)[k]))
+            elif k == self.kinds[i]: cols.append(old.column(i))
+            elif k == "s": cols.append(pa.array([_flat_str(v) for v in old.column(i).to_pylist()], pa.string()))
+            else: cols.append(old.column(i).cast(_flat_types(pa)[k]))
+        self.log(f"{os.path.basename(self.path)}: 第 {self.rows + 1} 行起列数或取值类型有变，已重写前 {self.rows} 行", "WARN")
+        self._open(kinds); self.w.write_table(pa.Table.from_arrays(cols, schema=self.schema))
+
+    def _flush(self):
+        pa = self.pa; rows = self.batch; self.batch = []
+        n = max(self.width, len(self.labels), len(self.kinds) if self.w else 0)
+        for r in rows:      # 比现有列宽的行只算到最后一个非空格子
+            if len(r) > n: n = max(n, next((i for i in range(len(r), n, -1) if r[i - 1] is not None), n))
+        pad = (None,) * n
+        cols = list(zip(*[tuple(r[:n]) + pad[len(r):] for r in rows])) if rows else [()] * n
+        found = [_flat_kind(c) for c in cols]
+        if self.w is None: self._open([k or "s" for k in found])
+        else:
+            kinds = self.kinds + [k or "s" for k in found[len(self.kinds):]]
+            for i, (k, old) in enumerate(zip(found, self.kinds)):
+                if k and k != old and k not in _FLAT_FITS.get(old, ()): kinds[i] = "f" if {k, old} <= {"i", "f"} else "s"
+            if kinds != self.kinds: self._reopen(kinds)
+        types = _flat_types(pa)
+        self.w.write_table(pa.Table.from_arrays(
+            [pa.array([_flat_str(v) for v in c] if k == "s" else c, types[k]) for c, k in zip(cols, self.kinds)],
+            schema=self.schema))
+        self.rows += len(rows)
+
+    def close(self):
+        if self.fp: self.fp.close(); return
+        if self.batch or self.w is None: self._flush()
+        self.w.close()
+
+    def discard(self):
+        try:
+            if self.fp: self.fp.close()
+            elif self.w is not None: self.w.close()
+        except Exception: pass
+        try: os.remove(self.path)
+        except OSError: pass
+
+class FlatBook:
+    """平面格式的输出 (接口同 write_only 工作簿): 每个表一个 FlatWriter，表头取自 heads[j] (start_row 以上各行)。
+    只有一个表时输出即 path 文件；有多个表时 path 为文件夹，各表存为其中的 <表名>.<扩展名> (见 output_name)。
+    widths[j] 为第 j 个表已知的列数 (如扫描统计的最大列数)，用来一开始就定好 Parquet / Arrow 的列。
+    先写到 <path>.part，save 时改成正式名，中途放弃的由 discard 删掉。"""
+    def __init__(self, path, titles, heads, fmt, encoding=CSV_ENCODING, widths=None, log=None):
+        self.path = path; self.titles = titles; self.heads = heads; self.fmt = fmt; self.encoding = encoding
+        self.widths = widths or [0] * len(titles); self.log = log
+        self.tmp = path + ".part"; self.sheets = []
+        if len(titles) > 1: os.makedirs(self.tmp, exist_ok=True)
+
+    def sheet(self, j):
+        while len(self.sheets) <= j:
+            k = len(self.sheets)
+            p = os.path.join(self.tmp, safe_file_name(self.titles[k]) + FLAT_FORMATS[self.fmt]) if len(self.titles) > 1 else self.tmp
+            self.sheets.append(FlatWriter(p, self.fmt, header_labels(self.heads[k]), self.encoding, self.widths[k], self.log))
+        return self.sheets[j]
+
+    def save(self, path=None):
+        self.sheet(len(self.titles) - 1)
+        for w in self.sheets: w.close()
+        path = path or self.path
+        if os.path.isdir(path): shutil.rmtree(path)   # 续做时重写同名文件夹
+        os.replace(self.tmp, path)
+
+    def discard(self):
+        for w in self.sheets: w.discard()
+        if len(self.titles) > 1: shutil.rmtree(self.tmp, ignore_errors=True)
+
+# ================= 流式拆分引擎 (不依赖界面) =================
+SPLIT_MAX_OPEN = 64          # 同时打开的输出工作簿上限
+SPLIT_SPILL_ROWS = 20000     # 溢出缓冲行数上限，超过即写入临时文件
+
+def _nolog(msg, level="INFO"): pass
+
+def safe_file_name(v): return str(v).replace('/', '_').strip()
+
+# ----- 拆分键: 单列 / 组合列 / 对照表分组，一次读取可同时产出多种拆分 -----
+SPLIT_UNMAPPED = "未分组"     # 对照表里没有的取值归入此组
+
+def load_group_map(path):
+    """分组对照表 {取值: 组名}: CSV (UTF-8 或 GBK) 或 xlsx 的前两列。首行若是表头只多一条用不到的映射。"""
+    with (open_reader(path) if path.lower().endswith((".xlsx", ".xlsm")) else CsvReader(path)) as rd: rows = list(rd.iter_rows())
+    out = {}
+    for r in rows:
+        if len(r) >= 2 and r[0] is not None and str(r[0]).strip() and r[1] is not None and str(r[1]).strip():
+            out[str(r[0]).strip()] = str(r[1]).strip()
+    if not out: raise ValueError(f"分组对照表为空: {path}")
+    return out
+
+class SplitKey:
+    """一种拆分方式: 单列 ("3")、组合列 ("3+5"，各列取值以 _ 连接) 或再按对照表归组 ("3:区县分组.csv")。
+    get(行) 取出分类值，任一列为空时返回 None；单列时原样返回单元格值，与原先的拆分一致。
+    label 为多种拆分时的输出子文件夹名；对照表里没有的取值归入 SPLIT_UNMAPPED 并记在 unmapped。"""
+    def __init__(self, cols, map_path=None):
+        self.cols = cols; self.map_path = map_path; self.unmapped = set()
+        self.mapping = load_group_map(map_path) if map_path else None
+        self.spec = "+".join(map(str, cols)) + (f":{map_path}" if map_path else "")
+        self.label = f"按第{'+'.join(map(str, cols))}列" + (f"_{os.path.splitext(os.path.basename(map_path))[0]}" if map_path else "")
+        self.simple = len(cols) == 1 and not map_path
+        self.max_col = max(cols)
+        idx = [c - 1 for c in cols]
+        if self.simple:
+            c = idx[0]; self.get = lambda r: r[c] if c < len(r) else None
+            return
+        def get(r):
+            parts = []
+            for c in idx:
+                v = r[c] if c < len(r) else None
+                if v is None or not str(v).strip(): return None
+                parts.append(str(v).strip())
+            k = "_".join(parts)
+            if self.mapping is None: return k
+            g = self.mapping.get(k)
+            if g is None: self.unmapped.add(k); return SPLIT_UNMAPPED
+            return g
+        self.get = get
+
+    def ident(self):
+        """检查点里记的标识: 说明串和对照表的修改时间。"""
+        return [self.spec, os.stat(self.map_path).st_mtime_ns if self.map_path else None]
+
+def parse_split_keys(spec):
+    """拆分列说明 -> [SplitKey]。多种拆分以 ; 分隔，如 "3; 5; 3+5; 3:区县分组.csv"；整数即单列。
+    已是 SplitKey 列表时原样返回。"""
+    if isinstance(spec, list): return spec
+    if isinstance(spec, int): spec = str(spec)
+    keys = []
+    for part in str(spec).replace("；", ";").split(";"):
+        cols, _, path = part.strip().partition(":")
+        if not cols.strip(): continue
+        try: cs = [int(x) for x in cols.replace("＋", "+").split("+")]
+        except ValueError: raise ValueError(f"拆分列无效: {part.strip()}")
+        if any(c < 1 for c in cs): raise ValueError(f"拆分列无效: {part.strip()}")
+        keys.append(SplitKey(cs, path.strip() or None))
+    if not keys: raise ValueError("未给出拆分列")
+    if len({k.label for k in keys}) < len(keys): raise ValueError(f"拆分方式重复: {spec}")
+    return keys
+
+def _layout_dirs(out, keys):
+    """各拆分方式的输出子文件夹 (相对 out)；只有一种时直接输出到 out。"""
+    subs = [k.label if len(keys) > 1 else "" for k in keys]
+    for s in subs:
+        if s: os.makedirs(os.path.join(out, s), exist_ok=True)
+    return subs
+
+def _report_unmapped(keys, log):
+    for k in keys:
+        if k.unmapped:
+            log(f"{k.label}: {len(k.unmapped)} 个取值不在对照表中，归入“{SPLIT_UNMAPPED}” ({', '.join(sorted(k.unmapped)[:10])}{' 等' if len(k.unmapped) > 10 else ''})", "WARN")
+
+class _SplitBook:
+    """一个分类的输出工作簿: 每个选中的工作表各对应一个同名表，按顺序建立并先写入该表的表头。
+    heads[j] 为第 j 个表的表头行 (与各分类共用，读到数据区之前就已齐全)。"""
+    def __init__(self, titles, heads):
+        self.nb = openpyxl.Workbook(write_only=True); self.titles = titles; self.heads = heads; self.sheets = []
+
+    def sheet(self, j):
+        while len(self.sheets) <= j:
+            k = len(self.sheets); ns = self.nb.create_sheet(self.titles[k])
+            ns.sheet_format.defaultRowHeight = 25
+            for r in self.heads[k]: ns.append(r)
+            self.sheets.append(ns)
+        return self.sheets[j]
+
+    def save(self, path): self.sheet(len(self.titles) - 1); self.nb.save(path)
+
+    def discard(self): _discard_sheets(self.sheets)
+
+def _discard_sheets(sheets):
+    """放弃未保存的 write_only 工作表: 关掉各自的临时文件 (否则回收时报 I/O 错误)。"""
+    for ns in sheets:
+        try: ns.close()
+        except Exception: pass
+
+def _iter_spill(path):
+    with open(path, "rb") as fp:
+        while True:
+            try: yield pickle.load(fp)
+            except EOFError: return
+
+def stream_split(f, start, col, out, ts, max_open=SPLIT_MAX_OPEN, log=_nolog, reader=None, prof=_noprof, sheets=None, job=_nojob,
+                 fmt="xlsx", encoding=CSV_ENCODING):
+    """单遍流式拆分: 数据行直接写入各分类的 write_only 工作簿。
+    fmt 为平面格式 (见 FLAT_FORMATS) 时改为只写取值的 FlatBook，每类一个文件，首行为表头标签；encoding 为 CSV 编码。
+    分类数超过 max_open 时，多出的分类先溢出到临时文件，扫描结束后逐个落盘，
+    内存占用只与 max_open 和溢出缓冲有关，与总行数无关。
+    sheets 为工作表名列表时依次读取这些表 (压缩包只打开一次)，每个输出文件含同样的几个表，
+    某分类在某表没有数据时该表只有表头；None 为活动工作表。
+    col 为拆分列号或拆分列说明 (见 parse_split_keys)：有多种拆分方式时每行同时分给各方式的分类，
+    各方式输出到各自的子文件夹，总表仍只读一遍；分类按 (方式, 取值) 计，共用 max_open 和溢出缓冲。
+    job 为 JobJournal 时跳过已写出的分类 (不再缓冲其行)，每写出一个记一笔，每 JOB_CHECK_ROWS 行和每个文件之间检查取消。
+    返回生成的文件数 (含续做时跳过的)。"""
+    keys = parse_split_keys(col); subs = _layout_dirs(out, keys); gets = list(enumerate(k.get for k in keys))
+    tmp = tempfile.mkdtemp(prefix="split_spill_")
+    sheets = sheets or [None]; heads = [[] for _ in sheets]
+    books, spill, buf = {}, {}, {}; skipped = set()
+    buffered = 0; cnt = 0; rows = 0
+    def fname(k): return os.path.join(subs[k[0]], output_name(f"{safe_file_name(k[1])}_极速_{ts}", fmt, len(sheets)))
+    def new_book(k): return _SplitBook(titles, heads) if fmt == "xlsx" else FlatBook(os.path.join(out, fname(k)), titles, heads, fmt, encoding, log=log)
+
+    def flush():
+        with prof.phase("溢出"):
+            for k, recs in buf.items():
+                with open(spill[k], "ab") as fp:
+                    for rec in recs: pickle.dump(rec, fp, pickle.HIGHEST_PROTOCOL)
+        buf.clear()
+
+    def save(k, book):
+        job.check(); path = os.path.join(out, fname(k))
+        with prof.phase("保存"): book.save(path)
+        job.mark(fname(k)); prof.file_out(path); log(f"生成: {os.path.join(subs[k[0]], safe_file_name(k[1]))}", "SUCCESS")
+
+    try:
+        prof.file_in(f)
+        with prof.phase("打开"): rd = open_reader(f, reader)
+        titles = [s or rd.title for s in sheets]
+        with rd, prof.phase("分类写入"):
+            for j, sheet in enumerate(sheets):
+                if len(sheets) > 1: log(f"读取工作表: {titles[j]}", "INFO")
+                i = -1
+                for i, r in enumerate(prof.timed(rd.iter_rows(sheet=sheet), "读取解析")):
+                    if i+1 < start: heads[j].append(r); continue
+                    if i % JOB_CHECK_ROWS == 0: job.check()
+                    for li, get in gets:
+                        v = get(r)
+                        if not v: continue
+                        v = (li, v)
+                        if v in books: books[v].sheet(j).append(r); continue
+                        if v in skipped: continue
+                        if v not in spill:
+                            if job.skip(fname(v)): skipped.add(v); continue
+                            if len(books) < max_open:
+                                books[v] = new_book(v); books[v].sheet(j).append(r); continue
+                            spill[v] = os.path.join(tmp, f"{len(spill)}.bin")
+                        buf.setdefault(v, []).append((j, r)); buffered += 1
+                        if buffered >= SPLIT_SPILL_ROWS: flush(); buffered = 0
+                rows += max(0, i + 2 - start)
+        prof.count(rows=rows)
+        flush(); _report_unmapped(keys, log)
+        if skipped: log(f"续做: 跳过已写出的 {len(skipped)} 个分类", "INFO")
+        if spill: log(f"分类数 {len(books) + len(spill)} 超过同时打开上限 {max_open}，{len(spill)} 个分类经临时文件写出", "INFO")
+        cnt = len(skipped)
+        for k, book in books.items(): save(k, book); cnt += 1
+        books.clear()
+        for k, path in spill.items():
+            job.check(); book = new_book(k)
+            with prof.phase("分类写入"):
+                for j, r in prof.timed(_iter_spill(path), "溢出"): book.sheet(j).append(r)
+            save(k, book); cnt += 1
+            os.remove(path)
+    finally:
+        for book in books.values(): book.discard()   # 中途停下时未写出的分类
+        shutil.rmtree(tmp, ignore_errors=True)
+    return cnt
+
+# ================= 单遍完美拆分 (不依赖 Excel/WPS) =================
+class _StyleCopier:
+    """把源单元格样式搬到目标工作簿，同一种源样式只复制一次。"""
+    def __init__(self): self.cache = {}
+
+    def cell(self, ws, src):
+        c = WriteOnlyCell(ws, value=src.value)
+        if not src.has_style: return c
+        key = tuple(src._style); st = self.cache.get(key)
+        if st is not None: c._style = copy(st); return c
+        c.font = copy(src.font); c.fill = copy(src.fill); c.border = copy(src.border)
+        c.alignment = copy(src.alignment); c.protection = copy(src.protection); c.number_format = src.number_format
+        self.cache[key] = copy(c._style)
+        return c
+
+def _copy_sheet_layout(ws, ns, start):
+    """把版式搬到 write_only 工作表: 行格式、冻结窗格、列宽、start 以上的合并单元格。须在首次 append 前调用。"""
+    ns.sheet_format = copy(ws.sheet_format); ns.freeze_panes = ws.freeze_panes
+    for letter, dim in ws.column_dimensions.items():
+        d = ns.column_dimensions[letter]; d.width = dim.width; d.hidden = dim.hidden
+    for m in ws.merged_cells.ranges:
+        if m.max_row < start: ns.merged_cells.add(m.coord)
+
+def _append_styled_row(ws, ns, r, n, sc, max_col, fix=None):
+    """把源表第 r 行连同样式、行高写成目标表第 n 行。fix(公式, 表名) 给出时用来改写公式。"""
+    rd = ws.row_dimensions.get(r)
+    if rd is not None and rd.height: ns.row_dimensions[n].height = rd.height
+    cells = [sc.cell(ns, ws.cell(r, c)) for c in range(1, max_col + 1)]  # ws[r] 每次都重算 max_column
+    if fix:
+        for c in cells:
+            if c.data_type == "f": c.value = fix(c.value, ws.title)
+    ns.append(cells)
+
+def _split_compactors(layouts, heads, per_sheet):
+    """目标文件各被拆分表的删行换算 (见 _Compactor): 同 Excel 整表复制后删掉不属于该目标的数据行。"""
+    return {ws.title: _Compactor(ws.title, heads + rows, range(1, max_col + 1), ws.max_row, max_col)
+            for (ws, _, max_col), rows in zip(layouts, per_sheet)}
+
+def _fix_formula(cps, v, here):
+    """按各被拆分表的删行改写 here 表里的公式 (含数组公式)，指向被删行的地址变成 #REF!。"""
+    from openpyxl.worksheet.formula import ArrayFormula
+    if isinstance(v, ArrayFormula):
+        cp = cps.get(here)
+        return ArrayFormula(cp.ranges(v.ref) if cp else v.ref, _fix_formula(cps, v.text, here))
+    for cp in cps.values(): v = cp.formula(v, here)
+    return v
+
+def styled_split(f, start, col, out, log=_nolog, prof=_noprof, sheets=None, job=_nojob):
+    """完美拆分的单遍实现: 总表只读入一次，按拆分列把行号分组，再把表头和各组数据行
+    连同样式、行高、列宽、合并单元格直接写成各目标文件，不再整表复制后逐行删除。
+    公式保留为公式，地址按删掉其他组的行改写 (同完美拆分)；没有参与拆分的工作表原样带到每个目标文件。
+    sheets 为工作表名列表时每个表分别分组，每个目标文件含同样的几个表；None 为活动工作表。
+    col 为拆分列号或拆分列说明 (见 parse_split_keys)，多种拆分方式在同一遍里分组，各自输出到子文件夹。
+    job 为 JobJournal 时跳过已写出的目标，每个目标之间检查取消。返回生成的文件数 (含续做时跳过的)。"""
+    keys = parse_split_keys(col); subs = _layout_dirs(out, keys)
+    src = SHADOWS.resolve(f); prof.file_in(src)
+    with prof.phase("读取解析"): wb = openpyxl.load_workbook(src)
+    wss = [wb[s] for s in sheets] if sheets else [wb.active]
+    groups = [{} for _ in keys]  # 各拆分方式: 目标 -> 各表的行号列表
+    kcols = {c for k in keys for c in k.cols}; kmax = max(kcols)
+    with prof.phase("分组"):
+        for j, ws in enumerate(wss):
+            # 拆分列里有公式时按缓存的计算结果分组
+            if any(c.data_type == "f" for (r, c0), c in ws._cells.items() if c0 in kcols and r >= start):
+                with open_reader(f, "xml", ws.title) as rd: it = list(rd.iter_rows(min_row=start, max_col=kmax))
+            else:
+                pad = (None,) * (min(kcols) - 1)
+                it = (pad + r for r in ws.iter_rows(min_row=start, min_col=min(kcols), max_col=kmax, values_only=True))
+            for i, r in enumerate(it):
+                for g, k in zip(groups, keys):
+                    v = k.get(r)
+                    if v: g.setdefault(str(v).strip(), [[] for _ in wss])[j].append(start + i)
+    _report_unmapped(keys, log)
+    targets = [(os.path.join(subs[li], f"{safe_file_name(k)}.xlsx"), per_sheet) for li, g in enumerate(groups) for k, per_sheet in g.items()]
+    layouts = []
+    for ws in wss:
+        row_merges = {}
+        for m in ws.merged_cells.ranges:
+            if m.min_row >= start and m.min_row == m.max_row: row_merges.setdefault(m.min_row, []).append((m.min_col, m.max_col))
+        layouts.append((ws, row_merges, ws.max_column))
+    others = [ws for ws in wb.worksheets if ws not in wss]
+    has_f = any(c.data_type == "f" for ws in wb.worksheets for c in ws._cells.values())
+    heads = list(range(1, start)); bad = 0
+    log(f"单遍分组完成: {len(targets)} 个目标" + (f" ({len(keys)} 种拆分)" if len(keys) > 1 else ""), "INFO")
+    cnt = sum(job.skip(name) for name, _ in targets)
+    if cnt: log(f"续做: 跳过已写出的 {cnt} 个目标", "INFO")
+    for idx, (name, per_sheet) in enumerate(targets):
+        if job.skip(name): continue
+        job.check(); log(f"[{idx+1}/{len(targets)}] {name}", "INFO")
+        nb = openpyxl.Workbook(write_only=True); sc = _StyleCopier()
+        with prof.phase("样式写入"):
+            cps = _split_compactors(layouts, heads, per_sheet) if has_f else {}
+            fix = (lambda v, here: _fix_formula(cps, v, here)) if has_f else None
+            split = {ws.title: (ws, row_merges, max_col, rows) for (ws, row_merges, max_col), rows in zip(layouts, per_sheet)}
+            for sw in wb.worksheets:
+                if sw in others:     # 原样整表带过去
+                    ns = nb.create_sheet(sw.title); _copy_sheet_layout(sw, ns, sw.max_row + 1)
+                    for r in range(1, sw.max_row + 1): _append_styled_row(sw, ns, r, r, sc, sw.max_column, fix)
+                    continue
+                ws, row_merges, max_col, rows = split[sw.title]
+                ns = nb.create_sheet(ws.title); _copy_sheet_layout(ws, ns, start)
+                for n, r in enumerate(heads + rows, 1):
+                    for a, b in row_merges.get(r, ()): ns.merged_cells.add(CellRange(min_col=a, min_row=n, max_col=b, max_row=n))
+                    _append_styled_row(ws, ns, r, n, sc, max_col, fix)
+        bad += sum(cp.bad for cp in cps.values())
+        path = os.path.join(out, name)
+        with prof.phase("保存"): nb.save(path)
+        job.mark(name); prof.file_out(path); prof.count(rows=sum(map(len, per_sheet))); cnt += 1
+    wb.close()
+    if bad: log(f"{bad} 处公式解析不了，原样保留 (其中的地址未随拆分调整)", "WARN")
+    return cnt
+
+_REF_END = re.compile(r"(\$?[A-Za-z]{1,3})?(\$?\d+)?")
+
+class _Compactor:
+    """删掉若干行/列后的位置换算: 行列号按其前删掉的行列数前移，区域收缩到保留的行列，
+    整个落在删掉的行列里的引用变成 #REF! (同 Excel 删行列)。formula 改写公式里指向该表的地址。"""
+    def __init__(self, title, rows, cols, max_row, max_col):
+        self.title, self.max_row, self.max_col = title, max_row, max_col; rs, cs = set(rows), set(cols)
+        self.drows = [r for r in range(1, max_row + 1) if r not in rs]
+        self.dcols = [c for c in range(1, max_col + 1) if c not in cs]
+        self.bad = 0                 # 解析不了、原样保留的公式数
+
+    def row(self, r): return r - bisect_right(self.drows, r)
+    def col(self, c): return c - bisect_right(self.dcols, c)
+
+    def box(self, c1, r1, c2, r2):
+        """区域 (列/行可为 None 表示整行/整列) 收缩后的新边界，整个被删时返回 None。"""
+        if c1 is not None:
+            c1, c2 = c1 - bisect_left(self.dcols, c1), c2 - bisect_right(self.dcols, c2)
+            if c2 < c1: return None
+        if r1 is not None:
+            r1, r2 = r1 - bisect_left(self.drows, r1), r2 - bisect_right(self.drows, r2)
+            if r2 < r1: return None
+        return c1, r1, c2, r2
+
+    def addr(self, text):
+        """改写一个不带表名的地址 (A1、$A$1:B5、A:C、3:5)；不是地址 (名称、结构化引用) 时原样返回。"""
+        ends = [_REF_END.fullmatch(e) for e in text.split(":")]
+        if not text or len(ends) > 2 or not all(ends) or not all(m.group(0) for m in ends): return text
+        if len(ends) == 1 and not (ends[0].group(1) and ends[0].group(2)): return text
+        if len(ends) == 2 and any(bool(ends[0].group(i)) != bool(ends[1].group(i)) for i in (1, 2)): return text
+        cs = [m.group(1) for m in ends]; rs = [m.group(2) for m in ends]
+        try:
+            c = [column_index_from_string(x.lstrip("$")) for x in cs] if cs[0] else [None, None]
+        except ValueError: return text
+        r = [int(x.lstrip("$")) for x in rs] if rs[0] else [None, None]
+        if (c[0] or 0) > 16384 or (r[0] or 0) > 1048576: return text
+        nb = self.box(c[0], r[0], c[-1], r[-1])
+        if nb is None: return "#REF!"
+        out = []
+        for i, m in enumerate(ends):
+            part = ""
+            if cs[0]: part += "$" * cs[i].startswith("$") + get_column_letter(nb[0] if i == 0 else nb[2])
+            if rs[0]: part += "$" * rs[i].startswith("$") + str(nb[1] if i == 0 else nb[3])
+            out.append(part)
+        return ":".join(out)
+
+    def ref(self, text, here):
+        """改写一个可能带表名的引用 ('表'!A1)；here 为公式所在的表名，指向其他表的原样返回。"""
+        if "!" in text:
+            sh, a = text.rsplit("!", 1)
+            name = sh[1:-1].replace("''", "'") if sh.startswith("'") and sh.endswith("'") else sh
+            if name != self.title: return text
+            a = self.addr(a)
+            return a if a == "#REF!" else f"{sh}!{a}"
+        return self.addr(text) if here == self.title else text
+
+    def formula(self, f, here):
+        from openpyxl.formula.tokenizer import Tokenizer, Token
+        try:
+            tok = Tokenizer(f)
+            for t in tok.items:
+                if t.type == Token.OPERAND and t.subtype == Token.RANGE: t.value = self.ref(t.value, here)
+            return tok.render()
+        except Exception: self.bad += 1; return f
+
+    def ranges(self, sqref):
+        """多区域 (sqref) 收缩后的字符串，全被删时返回空串。"""
+        out = []
+        for cr in str(sqref).split():
+            nb = self.box(*range_boundaries(cr))
+            if nb: out.append(CellRange(min_col=nb[0], min_row=nb[1], max_col=nb[2], max_row=nb[3]).coord)
+        return " ".join(out)
+
+# ================= 清洗: 删除全空行/列 (不依赖 Excel/WPS) =================
+def _clean_name(file_path):
+    base = os.path.splitext(os.path.basename(file_path))[0]
+    ts = datetime.datetime.now().strftime("%H%M%S")
+    return os.path.join(os.path.dirname(file_path), f"{base}_清洗_{ts}.xlsx")
+
+def _compact_sheet(wb, ws, cp, rows, cols):
+    """在原工作簿里就地删掉 ws 的空行/空列: 搬动单元格和行高列宽，收缩合并单元格、条件格式、数据验证、
+    筛选与打印区域，并改写整个工作簿 (各表公式、数组公式、定义名称) 里指向 ws 的引用。"""
+    from openpyxl.cell.cell import MergedCell
+    from openpyxl.formatting.formatting import ConditionalFormattingList
+    from openpyxl.worksheet.cell_range import MultiCellRange
+    from openpyxl.worksheet.formula import ArrayFormula
+    merged = list(ws.merged_cells.ranges); ws.merged_cells = MultiCellRange()
+    rset, cset = set(rows), set(cols); cells = {}
+    for (r, c), cell in ws._cells.items():
+        if r in rset and c in cset and not isinstance(cell, MergedCell):
+            cell.row = cp.row(r); cell.column = cp.col(c); cells[(cell.row, cell.column)] = cell
+    ws._cells = cells
+    for m in merged:
+        nb = cp.box(m.min_col, m.min_row, m.max_col, m.max_row)
+        if nb and (nb[2] > nb[0] or nb[3] > nb[1]): ws.merge_cells(start_row=nb[1], start_column=nb[0], end_row=nb[3], end_column=nb[2])
+    dims = [(r, d) for r, d in ws.row_dimensions.items() if r in rset or r > cp.max_row]
+    ws.row_dimensions.clear()
+    for r, d in dims: d.index = cp.row(r); ws.row_dimensions[d.index] = d
+    old = list(ws.column_dimensions.values()); ws.column_dimensions.clear()
+    for d in old:       # 列宽按保留的列逐列搬，已用区域右边的整段 (常见 min..16384) 整体前移
+        lo = d.min or column_index_from_string(d.index); hi = d.max or lo
+        for c in [c for c in cols if lo <= c <= hi] + ([max(lo, cp.max_col + 1)] if hi > cp.max_col else []):
+            nd = copy(d); nd.min = cp.col(c); nd.max = nd.min if c <= cp.max_col else cp.col(hi)
+            nd.index = get_column_letter(nd.min); ws.column_dimensions[nd.index] = nd
+    if ws.freeze_panes:
+        c, r = range_boundaries(ws.freeze_panes)[:2]
+        ws.freeze_panes = f"{get_column_letter(c - bisect_left(cp.dcols, c))}{r - bisect_left(cp.drows, r)}"
+    cf = ws.conditional_formatting; ws.conditional_formatting = ConditionalFormattingList()
+    for rng, rules in cf._cf_rules.items():
+        sq = cp.ranges(rng.sqref)
+        if not sq: continue
+        for rule in rules:
+            rule.formula = [cp.formula("=" + x, ws.title)[1:] for x in rule.formula]
+            ws.conditional_formatting.add(sq, rule)
+    for dv in list(ws.data_validations.dataValidation):
+        sq = cp.ranges(dv.sqref)
+        if not sq: ws.data_validations.dataValidation.remove(dv); continue
+        dv.sqref = MultiCellRange(sq)
+        for k in ("formula1", "formula2"):
+            if getattr(dv, k): setattr(dv, k, cp.formula("=" + getattr(dv, k), ws.title)[1:])
+    if ws.auto_filter.ref: ws.auto_filter.ref = cp.ranges(ws.auto_filter.ref) or None
+    if ws.print_area:
+        areas = [cp.ref(a, ws.title) for a in ws.print_area.split(",")]
+        ws.print_area = [a.split("!")[-1].replace("$", "") for a in areas if "#REF!" not in a] or None
+    for sh in wb.worksheets:
+        for row in sh.iter_rows():
+            for cell in row:
+                v = cell.value
+                if isinstance(v, str) and cell.data_type == "f": cell.value = cp.formula(v, sh.title)
+                elif isinstance(v, ArrayFormula):
+                    v.text = cp.formula(v.text, sh.title)
+                    if sh is ws: v.ref = cp.ranges(v.ref) or cell.coordinate
+        for dn in sh.defined_names.values(): dn.attr_text = cp.formula("=" + dn.attr_text, None)[1:]
+    for dn in wb.defined_names.values(): dn.attr_text = cp.formula("=" + dn.attr_text, None)[1:]
+
+def compact_clean(file_path, log=_nolog, prof=_noprof):
+    """一遍找出活动表里全空的行和列，在原工作簿里就地删掉后另存 (其余工作表原样保留)。
+    公式保留为公式，各表公式、定义名称、合并单元格、条件格式、数据验证里指向该表的地址随删行列改写，
+    指向被删行列的单独引用变成 #REF! (同 Excel)。openpyxl 不支持的对象 (如形状、控件) 不会带到新文件。返回新文件路径。"""
+    src = SHADOWS.resolve(file_path); prof.file_in(src)
+    with prof.phase("读取解析"): wb = openpyxl.load_workbook(src); ws = wb.active
+    rows = []; used = set()
+    with prof.phase("查找空行列"):
+        for r, vals in enumerate(ws.iter_rows(values_only=True), 1):
+            hit = [c for c, v in enumerate(vals, 1) if v is not None and v != ""]
+            if hit: rows.append(r); used.update(hit)
+    cols = sorted(used)
+    log(f"删除空行 {ws.max_row - len(rows)} 个、空列 {ws.max_column - len(cols)} 个", "INFO")
+    cp = _Compactor(ws.title, rows, cols, ws.max_row, ws.max_column)
+    with prof.phase("删行列"): _compact_sheet(wb, ws, cp, rows, cols)
+    with zipfile.ZipFile(src) as z:
+        if any(n.startswith(("xl/drawings/", "xl/ctrlProps/", "xl/activeX/")) for n in z.namelist()):
+            log("文件里有图表/形状/控件，不经 Excel 清洗时可能丢失，需要保留请用引擎清洗", "WARN")
+    if cp.bad: log(f"{cp.bad} 个公式解析不了，原样保留 (其中的地址未随删行列调整)", "WARN")
+    out = _clean_name(file_path)
+    with prof.phase("保存"): wb.save(out)
+    prof.file_out(out); prof.count(rows=len(rows))
+    return out
+
+# ================= 合并读取 (可多进程并行) / 流式写出 =================
+MERGE_WORKERS = 1            # 1 = 串行读取
+MERGE_BATCH_ROWS = 5000      # 每批交给写入端的行数
+MERGE_QUEUE_BATCHES = 4      # 并行读取时每个在途文件最多缓存的批数
+MERGE_MANIFEST_NAME = "_merge_manifest.json"  # 上次汇总表各行块来自哪个源文件
+MERGE_MANIFEST_VERSION = 2   # 2: 行块按 (文件, 工作表) 记录
+MERGE_TEMPLATE_FULL_MB = 2   # 模板不超过此大小时整本载入取表头，更大的先另存一份只含表头行的副本
+
+def row_has_data(r): return any(c is not None and str(c).strip() != "" for c in r)
+
+def _sheet_rows(rd, start_row, vec=None, sheet=None):
+    remap = _remapper(vec)
+    for r in rd.iter_rows(min_row=start_row, sheet=sheet):
+        if row_has_data(r): yield remap(r) if remap else r
+
+def iter_file_rows(f, start_row, reader=None, vec=None, sheet=None):
+    """逐行产出单个文件 (某个工作表，None 为活动工作表) start_row 及之后的非空行。
+    vec 为列对齐索引 (见 column_map)，按它重排各列。"""
+    with open_reader(f, reader) as rd: yield from _sheet_rows(rd, start_row, vec, sheet)
+
+def _merge_read_worker(start_row, reader, batch, tasks, slots):
+    # 读取进程: 逐个领取 (槽位, 文件, 列对齐, 工作表)，每 batch 行一批放进该槽位的队列 (队列满时等写入端取走)，
+    # 读完放 None，出错放错误说明；收到 None 任务后退出
+    _ignore_sigint()
+    while True:
+        t = tasks.get()
+        if t is None: break
+        slot, f, vec, sheet = t; q = slots[slot]
+        try:
+            for rows in _batched(iter_file_rows(f, start_row, reader, vec, sheet), batch): q.put(rows)
+            q.put(None)
+        except Exception as e: q.put(f"{os.path.basename(f)}: {e}")
+
+# ----- 按表头对齐列 -----
+def _norm_label(v): return "".join(str(v).split()) if v is not None else ""
+
+def header_labels(head):
+    """由表头区 (start_row 以上各行的取值) 得出每列的标签。
+    只看从第一个至少有两格内容的行起的表格表头 (跳过标题、填报说明)；多层表头自上而下用 | 连接，
+    上层的分组标题向右延伸到下层有内容而本层为空的列。"""
+    rows = [[_norm_label(v) for v in r] for r in head]
+    top = next((i for i, r in enumerate(rows) if sum(1 for v in r if v) >= 2), len(rows))
+    rows = rows[top:]
+    width = max((len(r) for r in rows), default=0)
+    rows = [r + [""] * (width - len(r)) for r in rows]
+    for i in range(len(rows) - 1):
+        cur, below = rows[i], rows[i + 1]
+        for c in range(1, width):
+            if not cur[c] and below[c] and cur[c - 1] and below[c - 1]: cur[c] = cur[c - 1]
+    labels = ["|".join(v for v in col if v) for col in zip(*rows)]
+    while labels and not labels[-1]: labels.pop()
+    return labels
+
+def read_header(f, start_row, reader=None, stats=None, sheet=None):
+    """文件 (工作表) start_row 以上的表头区取值；扫描统计里存有足够的前几行时不再打开文件。"""
+    stats = sheet_stats(stats, sheet)
+    if stats and start_row - 1 <= len(stats["head"]): return stats["head"][:start_row - 1]
+    if start_row <= 1: return []
+    with open_reader(f, reader, sheet) as rd: return [list(r) for r in rd.iter_rows(max_row=start_row - 1)]
+
+def column_map(templ_labels, labels):
+    """模板第 j 列取源文件第 vec[j] 列 (-1 表示源文件没有此列)。同名列按出现次序一一对应。
+    返回 (vec, 信息)；列完全一致时 vec 为 None。信息含 missing (模板有源文件没有)、extra (源文件多出)、moved (顺序不同)。"""
+    pos = {}
+    for i, l in enumerate(labels): pos.setdefault(l, deque()).append(i)
+    vec = [pos[l].popleft() if pos.get(l) else -1 for l in templ_labels]
+    used = set(vec)
+    info = {"missing": [l for l, i in zip(templ_labels, vec) if i < 0],
+            "extra": [l or f"第{i+1}列" for i, l in enumerate(labels) if i not in used],
+            "moved": [i for i in vec if i >= 0] != sorted(i for i in vec if i >= 0)}
+    if vec == list(range(len(vec))) and not info["extra"]: return None, info
+    return vec, info
+
+def describe_mismatch(info):
+    """列对齐信息的简短说明，一致时返回 "一致"。"""
+    parts = []
+    if info["missing"]: parts.append(f"缺{len(info['missing'])}列")
+    if info["extra"]: parts.append(f"多{len(info['extra'])}列")
+    if info["moved"]: parts.append("顺序不同")
+    return " ".join(parts) or "一致"
+
+def align_columns(files, templ, start_row, reader=None, stats=None, sheet=None):
+    """按表头为每个文件建立列对齐索引，返回 (vecs, infos)，与 files 一一对应。
+    stats 为 {文件: 扫描统计}；sheet 为比对的工作表名 (None 为各自的活动工作表)。"""
+    stats = stats or {}
+    tl = header_labels(read_header(templ, start_row, reader, stats.get(templ), sheet))
+    vecs, infos = [], []
+    for f in files:
+        vec, info = column_map(tl, header_labels(read_header(f, start_row, reader, stats.get(f), sheet)))
+        vecs.append(vec); infos.append(info)
+    return vecs, infos
+
+def _remapper(vec):
+    """把对齐索引预编译成整行一次取齐的函数 (itemgetter)，缺失列取 None。"""
+    if vec is None: return None
+    width = max(vec, default=-1) + 1; pad = (None,) * (width + 1)
+    get = itemgetter(*[i if i >= 0 else width for i in vec]) if vec else None
+    def remap(r):
+        r = tuple(r[:width]); r += pad[len(r):]
+        return get(r) if len(vec) > 1 else (get(r),) if vec else ()
+    return remap
+
+def _batched(it, n):
+    buf = []; sent = False
+    for x in it:
+        buf.append(x)
+        if len(buf) >= n: yield buf; buf = []; sent = True
+    if buf or not sent: yield buf
+
+def iter_merge_rows(files, start_row, workers=MERGE_WORKERS, reader=None, vecs=None, sheets=None):
+    """按原始文件顺序产出 (序号, 文件, 行批次)，同一文件可能连续产出多批，每批最多 MERGE_BATCH_ROWS 行。
+    workers>1 时由读取进程并行解析，在途文件最多 workers*2 个，各占一个槽位队列，每个最多缓存
+    MERGE_QUEUE_BATCHES 批，写入端按顺序逐批消费，内存只与批大小有关，与文件大小无关。vecs 为各文件的列对齐索引。
+    sheets 与 files 一一对应，给出读哪个工作表 (None 为活动工作表)；同一文件可连续出现多次，
+    串行时只打开一次，并行时每个工作表各是一个任务。"""
+    vecs = vecs or [None] * len(files); sheets = sheets or [None] * len(files)
+    if workers <= 1 or len(files) < 2:
+        rd = None; cur = None
+        try:
+            for idx, f in enumerate(files):
+                if f != cur:
+                    if rd: rd.close()
+                    rd = open_reader(f, reader); cur = f
+                for rows in _batched(_sheet_rows(rd, start_row, vecs[idx], sheets[idx]), MERGE_BATCH_ROWS): yield idx, f, rows
+        finally:
+            if rd: rd.close()
+        return
+    # 第 i 个文件用 i % n 号槽位: 前一个用该槽位的文件读完 (被消费完) 后才派发，任务按文件顺序领取，
+    # 正在消费的文件总有进程在读，不会因后面的槽位写满而卡住
+    ctx = multiprocessing.get_context(); n = min(workers * 2, len(files)); tasks = ctx.Queue()
+    slots = [ctx.Queue(MERGE_QUEUE_BATCHES) for _ in range(n)]
+    procs = [ctx.Process(target=_merge_read_worker, daemon=True, args=(start_row, reader or READER_BACKEND, MERGE_BATCH_ROWS, tasks, slots))
+             for _ in range(min(workers, len(files)))]
+    for p in procs: p.start()
+    def task(i): tasks.put((i % n, files[i], vecs[i], sheets[i]))
+    for i in range(n): task(i)
+    done = False
+    try:
+        for idx, f in enumerate(files):
+            q = slots[idx % n]
+            while True:
+                try: rows = q.get(timeout=1)
+                except queue.Empty:
+                    if not all(p.is_alive() for p in procs): raise RuntimeError("读取进程意外退出")
+                    continue
+                if rows is None: break
+                if isinstance(rows, str): raise RuntimeError(f"读取失败: {rows}")
+                yield idx, f, rows
+            if idx + n < len(files): task(idx + n)
+        for _ in procs: tasks.put(None)
+        done = True
+    finally:
+        for p in procs:     # 中途停下时不再等在读的文件
+            if done: p.join(timeout=30)
+            if p.is_alive(): p.terminate()
+        if not done:
+            for q in [tasks] + slots: q.cancel_join_thread()
+
+_ROW_TAG = re.compile(rb"<(?:[\w.-]+:)?row\b([^>]*)>")
+_ROW_NO = re.compile(rb'(?:^|\s)r="(\d+)"')
+_DATA_END = re.compile(rb"</(?:[\w.-]+:)?sheetData>")
+
+def _trim_rows(src, dst, start_row, chunk=1 << 20):
+    """按字节复制工作表 XML，去掉第 start_row 行及以后的 <row>，其余 (列宽、合并单元格、冻结窗格等) 原样保留。
+    找到第一个要去掉的行后只搜 </sheetData>，不解析数据行。"""
+    buf = b""; scan = 0; row_no = 0; cut = None
+    while cut is None:
+        data = src.read(chunk); buf += data
+        for m in _ROW_TAG.finditer(buf, scan):
+            n = _ROW_NO.search(m.group(1)); row_no = int(n.group(1)) if n else row_no + 1
+            if row_no >= start_row: cut = m.start(); break
+            scan = m.end()
+        if cut is None and (not data or _DATA_END.search(buf, scan)): dst.write(buf); shutil.copyfileobj(src, dst); return
+    dst.write(buf[:cut]); buf = buf[cut:]
+    while True:
+        m = _DATA_END.search(buf)
+        if m: dst.write(buf[m.start():]); shutil.copyfileobj(src, dst); return
+        data = src.read(chunk)
+        if not data: return                 # 残缺的 XML，留给 openpyxl 报错
+        buf = buf[-64:] + data              # 结束标签可能跨块
+
+def _header_only(path, start_row, out):
+    """把工作簿另存到 out，各工作表只留 start_row 以上的行，其余部件原样复制。"""
+    with zipfile.ZipFile(path) as zin, zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as zout:
+        parts = set(_sheet_parts(zin, _book_sheets(ET.fromstring(zin.read("xl/workbook.xml")))[0]).values())
+        for info in zin.infolist():
+            with zin.open(info) as a, zout.open(info, "w") as b:
+                if info.filename in parts: _trim_rows(a, b, start_row)
+                else: shutil.copyfileobj(a, b, 1 << 20)
+
+def _merge_book(templ, start_row, sheets=None, save_path=None, fmt="xlsx", encoding=CSV_ENCODING, widths=None, log=None):
+    """新建汇总工作簿，每个工作表 (sheets 为表名列表，None 为活动工作表) 各建一个同名表，
+    start_row 以上的表头连同样式、行高、列宽、合并单元格取自模板的同名表。返回 (工作簿, [表...])。
+    模板超过 MERGE_TEMPLATE_FULL_MB 时只载入它的表头副本 (见 _header_only)，不整本读入数据行。
+    fmt 为平面格式时改为写到 save_path 的 FlatBook (表头只取标签，widths 为各表列数)；模板是 CSV 时表头只有取值。"""
+    if fmt != "xlsx" or is_csv(templ):
+        titles = sheets or [list_sheets(templ)[1]]; heads = [read_header(templ, start_row, sheet=s) for s in sheets or [None]]
+        if fmt != "xlsx":
+            nb = FlatBook(save_path, titles, heads, fmt, encoding, widths, log); return nb, [nb.sheet(j) for j in range(len(titles))]
+        nb = openpyxl.Workbook(write_only=True); out = []
+        for t, head in zip(titles, heads):
+            ns = nb.create_sheet(t); out.append(ns)
+            for r in head: ns.append(r)
+        return nb, out
+    src = SHADOWS.resolve(templ); tmp = None
+    if os.path.getsize(src) > MERGE_TEMPLATE_FULL_MB << 20:
+        fd, tmp = tempfile.mkstemp(suffix=os.path.splitext(src)[1]); os.close(fd)
+        try: _header_only(src, start_row, tmp)
+        except: os.remove(tmp); raise
+        src = tmp
+    try: tw = openpyxl.load_workbook(src)
+    finally:
+        if tmp: os.remove(tmp)
+    nb = openpyxl.Workbook(write_only=True); out = []; sc = _StyleCopier()
+    for s in sheets or [None]:
+        tws = tw[s] if s else tw.active; ns = nb.create_sheet(tws.title)
+        _copy_sheet_layout(tws, ns, start_row); ns.sheet_format.defaultRowHeight = 25
+        max_col = tws.max_column
+        for r in range(1, start_row): _append_styled_row(tws, ns, r, r, sc, max_col)
+        out.append(ns)
+    tw.close()
+    return nb, out
+
+# ----- 去重 -----
+DEDUP_BUFFER = 200000        # 当前文件的指纹先放在集合里，超过此数就排序压成紧凑数组
+
+def _norm_cell(v):
+    if isinstance(v, str): return v.strip()
+    if isinstance(v, float) and v.is_integer(): return int(v)
+    return "" if v is None else v
+
+def parse_key_cols(text):
+    """ "2,3" -> [2, 3]；空串返回 None (整行比较)。"""
+    cols = [int(x) for x in str(text or "").replace("，", ",").split(",") if x.strip()]
+    if any(c < 1 for c in cols): raise ValueError(f"列号无效: {text}")
+    return cols or None
+
+class RowDeduper:
+    """合并时的重复行检测。每行 (或指定的关键列) 规整后取 8 字节 blake2b 指纹，只存指纹:
+    处理完的文件的指纹排序后压成 array('Q') 有序段 (每行 8 字节)，按大小逐级合并，查找用二分；
+    当前文件另行记录，以区分文件内重复与跨文件重复。"""
+    def __init__(self, key_cols=None):
+        self.key = itemgetter(*[c - 1 for c in key_cols]) if key_cols and len(key_cols) > 1 else None
+        self.key_cols = key_cols
+        self.runs = []; self.cur = set(); self.cur_runs = []
+        self.in_file = 0; self.cross_file = 0; self.per_file = {}; self.name = None; self.sheet = None
+
+    def _fp(self, r):
+        if self.key_cols:
+            w = max(self.key_cols); r = tuple(r[:w]) + (None,) * (w - len(r[:w]))
+            k = [_norm_cell(v) for v in (self.key(r) if self.key else (r[self.key_cols[0] - 1],))]
+        else:
+            k = [_norm_cell(v) for v in r]
+            while k and k[-1] == "": k.pop()
+        if self.sheet is not None: k.append(self.sheet)   # 不同工作表各自去重
+        return int.from_bytes(hashlib.blake2b(repr(k).encode("utf-8"), digest_size=8).digest(), "little")
+
+    @staticmethod
+    def _has(runs, fp):
+        for a in runs:
+            i = bisect_left(a, fp)
+            if i < len(a) and a[i] == fp: return True
+        return False
+
+    def start_file(self, name, sheet=None):
+        self.end_file(); self.sheet = sheet; self.name = f"{name} [{sheet}]" if sheet else name
+
+    def end_file(self):
+        """把当前文件的指纹并入已处理的有序段。"""
+        runs = self.cur_runs + ([array("Q", sorted(self.cur))] if self.cur else [])
+        for a in runs:
+            self.runs.append(a)
+            while len(self.runs) > 1 and len(self.runs[-2]) <= 2 * len(self.runs[-1]):
+                b = self.runs.pop(); a2 = self.runs.pop(); self.runs.append(array("Q", sorted(a2 + b)))
+        self.cur = set(); self.cur_runs = []
+
+    def seen(self, r):
+        """第一次出现返回 False 并记住；重复返回 True 并计数。"""
+        fp = self._fp(r)
+        if fp in self.cur or self._has(self.cur_runs, fp): kind = 0
+        elif self._has(self.runs, fp): kind = 1
+        else:
+            self.cur.add(fp)
+            if len(self.cur) >= DEDUP_BUFFER: self.cur_runs.append(array("Q", sorted(self.cur))); self.cur = set()
+            return False
+        st = self.per_file.setdefault(self.name, [0, 0]); st[kind] += 1
+        if kind: self.cross_file += 1
+        else: self.in_file += 1
+        return True
+
+    def report(self, log):
+        what = f"按第 {','.join(map(str, self.key_cols))} 列" if self.key_cols else "整行"
+        log(f"去重 ({what}): 文件内重复 {self.in_file} 行，跨文件重复 {self.cross_file} 行，均已跳过", "STATS")
+        for name, (a, b) in sorted(self.per_file.items(), key=lambda x: -sum(x[1])):
+            log(f"  - {name}: 文件内 {a} 行，与前面文件重复 {b} 行", "STATS")
+
+# ----- 增量合并 -----
+def _source_sig(f, old=None):
+    """(大小, 修改时间, 哈希)；大小和修改时间与 old 相同时沿用 old 的哈希。"""
+    st = os.stat(f)
+    same = old and old["name"] == os.path.basename(f) and old["size"] == st.st_size and old["mtime"] == st.st_mtime_ns
+    return {"name": os.path.basename(f), "size": st.st_size, "mtime": st.st_mtime_ns, "hash": old["hash"] if same else file_digest(f)}
+
+def load_merge_manifest(folder):
+    try:
+        with open(os.path.join(folder, MERGE_MANIFEST_NAME), encoding="utf-8") as fp: data = json.load(fp)
+        return data if data.get("version") == MERGE_MANIFEST_VERSION else None
+    except (OSError, ValueError): return None
+
+def _save_merge_manifest(folder, data):
+    path = os.path.join(folder, MERGE_MANIFEST_NAME); tmp = path + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as fp: json.dump(data, fp, ensure_ascii=False)
+        os.replace(tmp, path)
+    except OSError: pass
+
+def _reusable_summary(folder, man, templ, start_row, align=False, sheets=None):
+    """上次的汇总表还能复用时返回其路径: 起始行、列对齐方式、工作表选择、模板内容相同，汇总表存在且未被改动过。"""
+    if not man or man["start_row"] != start_row or man.get("align", False) != align or man.get("dedup"): return None
+    if man.get("sheets") != sheets: return None
+    path = os.path.join(folder, man["summary"])
+    try: st = os.stat(path)
+    except OSError: return None
+    if [st.st_size, st.st_mtime_ns] != man["summary_sig"]: return None
+    if _source_sig(templ, man["template"])["hash"] != man["template"]["hash"]: return None
+    return path
+
+def _rstrip_row(r):
+    n = len(r)
+    while n and r[n-1] is None: n -= 1
+    return r[:n]
+
+def _unit_label(name, sheet): return f"{name} [{sheet}]" if sheet else name
+
+def incremental_merge(folder, files, templ, save_path, start_row, workers=MERGE_WORKERS, log=_nolog, reader=None, reuse=False,
+                      align=False, stats=None, dedup=None, prof=_noprof, sheets=None, cancel=None, fmt="xlsx", encoding=CSV_ENCODING):
+    """合并各文件的数据行。reuse 时为增量合并: 对照上次合并留下的清单 (每个源文件在汇总表中的行块)，
+    内容未变的文件直接从上次的汇总表顺序搬运行块，只重新读取新增或改动的文件。清单缺失、汇总表被改动、
+    起始行或模板变了时退回完整合并。增量合并后在 folder 里写新清单 (含各源文件的 SHA-1)；
+    不是增量合并时不算哈希也不写清单。align 时按表头把各文件的列对齐到模板 (见 align_columns)。
+    dedup 为 RowDeduper 时跳过重复行 (此时不复用旧汇总表: 前面文件的改动会影响后面文件哪些行算重复)。
+    sheets 为工作表名列表时各表分别合并进汇总表的同名表，没有该表的文件跳过；None 为各文件的活动工作表。
+    cancel (threading.Event) 置位后在两批之间停下并抛 JobCancelled。增量合并中途停下或出错时 (去重模式除外)，
+    已完成的行块另存为 <汇总表>_未完成.xlsx 并写进清单，下次增量合并时直接复用，即从中断处续做。
+    fmt 为平面格式 (见 FLAT_FORMATS) 时只写取值，encoding 为 CSV 编码；此时仍可复用上次的 xlsx 汇总表，
+    但不写清单，中断时也不留部分汇总表 (只有 xlsx 汇总表能被下次复用)。
+    返回合并行数 (各表合计)。"""
+    names = sheets or [None]; per_sheet = {}
+    with prof.phase("表头比对"):
+        has = {f: set(list_sheets(f)[0]) for f in files} if sheets else None
+        for s in names:
+            fs = [f for f in files if has is None or s in has[f]]
+            for f in files:
+                if has is not None and s not in has[f]: log(f"{os.path.basename(f)} 没有工作表 {s}，跳过", "WARN")
+            vecs = [None] * len(fs)
+            if align or stats:
+                vecs, infos = align_columns(fs, templ, start_row, reader, stats, s)
+                for f, info in zip(fs, infos):
+                    if describe_mismatch(info) == "一致": continue
+                    detail = "".join(f"，{k} {v}" for k, v in (("缺", info["missing"]), ("多", info["extra"])) if v)
+                    log(f"表头与模板不一致: {_unit_label(os.path.basename(f), s)} ({describe_mismatch(info)}{detail})",
+                        "WARN" if not align else "INFO")
+                if not align: vecs = [None] * len(fs)
+            per_sheet[s] = dict(zip(fs, vecs))
+    # 按文件、再按工作表排列，串行读取时每个文件只打开一次
+    units = [(f, s, per_sheet[s][f]) for f in files for s in names if f in per_sheet[s]]
+    if dedup and reuse: log("去重模式下完整合并", "INFO"); reuse = False
+    man = load_merge_manifest(folder) if reuse else None
+    old_path = _reusable_summary(folder, man, templ, start_row, align, sheets) if man else None
+    old = {(e["name"], e.get("sheet")): e for e in man["files"]} if old_path else {}
+    plan = []; sigs = {}; cursor = {}
+    with prof.phase("比对源文件"):
+        for f, s, vec in units:
+            e = old.get((os.path.basename(f), s))
+            sig = sigs.get(f) or sigs.setdefault(f, _source_sig(f, e) if reuse else {"name": os.path.basename(f)})
+            # 旧汇总表每个表只顺序读一遍，行块须按原先的先后顺序出现才能直接搬运
+            keep = e is not None and e["hash"] == sig["hash"] and e["first"] >= cursor.get(s, 0)
+            if keep: cursor[s] = e["first"] + e["count"]
+            plan.append((f, s, vec, sig, e if keep else None))
+    fresh = [(f, s, vec) for f, s, vec, _, e in plan if e is None]
+    unit = "文件/工作表" if sheets else "文件"
+    resumed = bool(old_path and man.get("partial"))
+    if resumed: log(f"续做上次中断的合并: 复用已完成的 {len(plan) - len(fresh)} 个{unit}，还需读取 {len(fresh)} 个", "INFO")
+    elif old_path: log(f"增量合并: 复用 {len(plan) - len(fresh)} 个{unit}的行块，重新读取 {len(fresh)} 个", "INFO")
+    elif reuse: log("没有可复用的上次汇总表，完整合并", "INFO")
+    # 平面格式的列数: 对齐后为模板列数，否则取扫描统计里各文件的最大列数 (没有统计时由首批数据定)
+    widths = [max((len(v) if v else (sheet_stats((stats or {}).get(f), s) or {}).get("cols", 0) for f, v in per_sheet[s].items()),
+                  default=0) for s in names]
+    with prof.phase("模板表头"): nb, outs = _merge_book(templ, start_row, sheets, save_path, fmt, encoding, widths, log)
+    prof.file_in(*{f for f, _, _ in fresh}, *([old_path] if old_path else []))
+    gen = prof.timed(iter_merge_rows([u[0] for u in fresh], start_row, workers, reader, [u[2] for u in fresh], [u[1] for u in fresh]),
+                     "读取解析")
+    nxt = next(gen, None); k = -1
+    old_rd = FastXmlReader(old_path) if old_path else None
+    old_rows = {}; pos = {}; out_row = {s: start_row for s in names}; blocks = []
+    appends = {s: prof.wrap(ns.append, "写入行") for s, ns in zip(names, outs)}
+    seen = prof.wrap(dedup.seen, "去重") if dedup else None
+
+    def save(path, partial=False):
+        with prof.phase("保存"): nb.save(path)
+        if fmt != "xlsx" or not reuse: return
+        if resumed:  # 上次中断留下的部分汇总表已并入本次的 (完整或部分) 汇总表
+            try: old_rd.close(); os.remove(old_path)
+            except OSError: pass
+        st = os.stat(path)
+        _save_merge_manifest(folder, {"version": MERGE_MANIFEST_VERSION, "summary": os.path.basename(path),
+                                      "summary_sig": [st.st_size, st.st_mtime_ns], "start_row": start_row, "align": align,
+                                      "dedup": bool(dedup), "sheets": sheets, "partial": partial,
+                                      "template": _source_sig(templ), "files": blocks,
+                                      "time": datetime.datetime.now().isoformat(timespec="seconds")})
+
+    try:
+        for idx, (f, s, _, sig, e) in enumerate(plan):
+            check_cancel(cancel); n = 0; append = appends[s]
+            if dedup: dedup.start_file(sig["name"], s)
+            if e:
+                if s not in old_rows:
+                    old_rows[s] = prof.timed(old_rd.iter_rows(min_row=start_row, sheet=s), "读取旧汇总表"); pos[s] = start_row
+                rows = old_rows[s]
+                for _ in range(e["first"] - pos[s]): next(rows)
+                for _ in range(e["count"]): append(_rstrip_row(next(rows)))
+                pos[s] = e["first"] + e["count"]; n = e["count"]
+            else:
+                k += 1; log(f"[{idx+1}/{len(plan)}] 读取: {_unit_label(sig['name'], s)}", "INFO")
+                while nxt is not None and nxt[0] == k:
+                    check_cancel(cancel)
+                    for r in nxt[2]:
+                        if seen and seen(r): continue
+                        append(r); n += 1
+                    nxt = next(gen, None)
+            blocks.append(dict(sig, sheet=s, first=out_row[s], count=n)); out_row[s] += n
+    except BaseException:
+        if blocks and reuse and fmt == "xlsx":
+            part = os.path.splitext(save_path)[0] + "_未完成.xlsx"
+            try:
+                save(part, partial=True)
+                log(f"合并中断: 已完成的 {len(blocks)}/{len(plan)} 个{unit}存入 {os.path.basename(part)}，再次增量合并时从此处续做", "WARN")
+            except Exception as e: log(f"中断时保存已完成部分失败: {e}", "ERROR")
+        elif fmt != "xlsx": nb.discard()
+        else: _discard_sheets(outs)
+        raise
+    finally:
+        gen.close()
+        if old_rd: old_rd.close()
+    if dedup: dedup.end_file(); dedup.report(log)
+    total = sum(out_row[s] - start_row for s in names)
+    save(save_path)
+    prof.file_out(save_path); prof.count(rows=total)
+    return total
+
+# ================= 扫描统计与持久索引 =================
+SCAN_INDEX_NAME = "_scan_index.json" # 文件夹内的旁路索引文件
+SCAN_INDEX_VERSION = 4               # 统计口径变化时递增，旧索引自动作废
+STATS_HEAD_ROWS = 100                # 保留前若干行的取值，起始行落在其中时直接从直方图扣除
+HIST_MAX_KEYS = 2000                 # 单列取值种类超过此数视为非分类列，不再计数
+SCAN_WORKERS = max(1, min(4, os.cpu_count() or 1))  # 并发解析进程数
+
+def file_digest(f, chunk=1 << 20):
+    h = hashlib.sha1()
+    with open(f, "rb") as fp:
+        for b in iter(lambda: fp.read(chunk), b""): h.update(b)
+    return h.hexdigest()
+
+def _key(v): return "" if v is None or v == "" else str(v).strip()
+
+def _analyze_rows(rows, hist_cols=()):
+    total = 0; max_c = 0; gaps = []; wide = []; head = []
+    hist = {c: {} for c in hist_cols}; cols = sorted(hist)
+    for i, r in enumerate(rows, 1):
+        total = i
+        if len(r) > max_c: max_c = len(r)
+        if not row_has_data(r): gaps.append(i)
+        if i <= STATS_HEAD_ROWS: head.append([_key(v) for v in r])
+        for c in cols:
+            k = _key(r[c-1]) if c <= len(r) else ""
+            if not k or c not in hist: continue
+            h = hist[c]; h[k] = h.get(k, 0) + 1
+            if len(h) > HIST_MAX_KEYS: wide.append(c); del hist[c]
+    return {"total": total, "valid": total - len(gaps), "empty": len(gaps), "cols": max_c, "gaps": gaps,
+            "hist": {str(c): h for c, h in hist.items()}, "hist_cols": cols, "wide": sorted(wide), "head": head}
+
+def analyze_file(f, reader=None, prof=_noprof, hist_cols=()):
+    """单遍统计整个文件: 物理总行、有效行、空行、最大列数，另外
+    gaps: 空行行号 (升序)，任意起始行的有效行数由它直接算出 (见 valid_rows_from)；
+    hist: hist_cols 里各列的取值计数 {列号: {值: 次数}} (只算要分析的拆分列，扫描回收文件夹时不算)，
+    取值种类超过 HIST_MAX_KEYS 的列记入 wide；hist_cols 记下算过哪些列；
+    head: 前 STATS_HEAD_ROWS 行的取值，用于从直方图中扣除表头 (见 column_histogram)。
+    顶层为活动工作表 (表名记在 sheet)；有多个工作表时同一次打开逐表统计，
+    其余各表记在 sheets {表名: 统计} 里，取用见 sheet_stats。"""
+    with prof.phase("打开"): rd = open_reader(f, reader)
+    with rd, prof.phase("统计"):
+        st = _analyze_rows(prof.timed(rd.iter_rows(), "读取解析"), hist_cols)
+        st["sheet"] = rd.title; st["sheet_names"] = list(rd.sheet_names)
+        others = [n for n in rd.sheet_names if n != rd.title]
+        if others: st["sheets"] = {n: _analyze_rows(prof.timed(rd.iter_rows(sheet=n), "读取解析"), hist_cols) for n in others}
+    return st
+
+def sheet_stats(st, sheet=None):
+    """扫描统计里某个工作表的部分 (None 为活动工作表)；没有该表时返回 None。"""
+    if st is None or sheet is None or sheet == st.get("sheet"): return st
+    return st.get("sheets", {}).get(sheet)
+
+def valid_rows_from(st, start_row):
+    """start_row 及之后的有效 (非空) 行数，即合并时该文件实际贡献的行数。"""
+    s = max(1, start_row); gaps = st["gaps"]
+    return max(0, st["total"] - s + 1) - (len(gaps) - bisect_left(gaps, s))
+
+def column_histogram(st, col_idx, start_row):
+    """start_row 及之后第 col_idx 列的取值计数 (Counter)。缓存推不出来 (没算过该列) 时返回 None，需重新读取。"""
+    if col_idx in st["wide"] or col_idx not in st["hist_cols"]: return None
+    head = st["head"]; skip = max(0, start_row - 1)
+    if skip > len(head) and start_row <= st["total"]: return None
+    c = Counter(st["hist"].get(str(col_idx), {}))
+    for keys in head[:skip]:
+        k = keys[col_idx-1] if col_idx-1 < len(keys) else ""
+        if k: c[k] -= 1
+    return +c
+
+def histogram_cols(col_idx):
+    """拆分列说明 (见 parse_split_keys) 的分类预览能直接取自直方图的列: 单一的普通拆分列，其余情况现读。"""
+    keys = parse_split_keys(col_idx)
+    return [keys[0].cols[0]] if len(keys) == 1 and keys[0].simple else []
+
+class ScanIndex:
+    """文件夹扫描统计的持久索引 (文件夹内的 JSON 旁路文件)。
+    大小和修改时间都没变的文件直接命中；变了则比对内容哈希，哈希相同仍算命中，
+    只有新增或内容改动的文件才重新解析。命中/未命中次数同时累计到索引里。"""
+    def __init__(self, folder):
+        self.path = os.path.join(folder, SCAN_INDEX_NAME)
+        self.entries = {}; self.counters = {"hits": 0, "misses": 0}; self.hits = 0; self.misses = 0
+        try:
+            with open(self.path, encoding="utf-8") as fp: data = json.load(fp)
+            if data.get("version") == SCAN_INDEX_VERSION:
+                self.entries = data.get("files", {}); self.counters.update(data.get("counters", {}))
+        except (OSError, ValueError): pass
+
+    def lookup(self, f):
+        """命中返回缓存的统计；未命中返回 None，解析后用 store 写回。"""
+        st = os.stat(f); key = os.path.basename(f); e = self.entries.get(key)
+        if e and e["size"] == st.st_size and e["mtime"] == st.st_mtime_ns:
+            self.hits += 1; return e["stats"]
+        h = file_digest(f)
+        if e and e["hash"] == h:
+            self.hits += 1; e["size"] = st.st_size; e["mtime"] = st.st_mtime_ns; return e["stats"]
+        self.misses += 1; self.entries[key] = {"hash": h, "size": st.st_size, "mtime": st.st_mtime_ns, "stats": None}
+        return None
+
+    def store(self, f, stats): self.entries[os.path.basename(f)]["stats"] = stats
+
+    def stats(self, f, reader=None, hist_cols=()):
+        """命中且算过 hist_cols 各列直方图时用缓存，否则重新统计 (连同缓存里已算过的列) 并写回。"""
+        st = self.lookup(f); done = set(st["hist_cols"]) | set(st["wide"]) if st else set()
+        if st is None or not done.issuperset(hist_cols):
+            st = analyze_file(f, reader, hist_cols=sorted(set(hist_cols) | set(st["hist_cols"] if st else ()))); self.store(f, st)
+        return st
+
+    def save(self, files=None):
+        """写回索引，只保留本次扫描到的文件 (files 为 None 时保留全部)。"""
+        keep = set(self.entries) if files is None else {os.path.basename(f) for f in files}
+        self.counters["hits"] += self.hits; self.counters["misses"] += self.misses
+        data = {"version": SCAN_INDEX_VERSION, "counters": self.counters,
+                "last_scan": {"time": datetime.datetime.now().isoformat(timespec="seconds"), "hits": self.hits, "misses": self.misses},
+                "files": {k: v for k, v in self.entries.items() if k in keep and v["stats"] is not None}}
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as fp: json.dump(data, fp, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError: pass
+
+def scan_files(files, index, workers=SCAN_WORKERS, emit=None, cancel=None, reader=None, prof=None):
+    """并发扫描: 索引命中的文件立即产出，其余交给进程池解析。
+    每得到一个结果调用 emit(序号, 文件, 统计或异常)，产出顺序即完成顺序。
+    cancel (threading.Event) 置位后不再等待剩余任务。返回是否完整扫描。"""
+    emit = emit or (lambda idx, f, res: None); cancel = cancel or threading.Event(); prof = prof or _noprof
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_ignore_sigint) if workers > 1 else None
+    futs = {}
+    def parsed(f, st): index.store(f, st); prof.file_in(f); prof.count(rows=st["total"], parsed=1)
+    try:
+        for idx, f in enumerate(files):
+            if cancel.is_set(): return False
+            try:
+                with prof.phase("索引查找"): st = index.lookup(f)
+                if st is None:
+                    if pool: futs[pool.submit(analyze_file, f, reader)] = (idx, f); continue
+                    st = analyze_file(f, reader, prof); parsed(f, st)
+                else: prof.count(cached=1)
+            except Exception as e: emit(idx, f, e); continue
+            emit(idx, f, st)
+        for fut in prof.timed(as_completed(futs), "等待子进程解析"):
+            if cancel.is_set(): return False
+            idx, f = futs[fut]
+            try: st = fut.result(); parsed(f, st)
+            except Exception as e: emit(idx, f, e); continue
+            emit(idx, f, st)
+    finally:
+        # 取消时不等剩余任务；正常结束时等进程池收尾，否则在子进程里调用时退出会卡在回收工作进程上
+        if pool: pool.shutdown(wait=not cancel.is_set(), cancel_futures=True)
+    return True
+
+def cached_stats(f, reader=None, hist_cols=()):
+    """单个文件的统计，经所在文件夹的扫描索引缓存。hist_cols 为要算直方图的列 (见 histogram_cols)。"""
+    index = ScanIndex(os.path.dirname(os.path.abspath(f)))
+    st = index.stats(f, reader, hist_cols); index.save()
+    return st
+
+def list_merge_files(folder):
+    """回收文件夹中待合并的 .xlsx 和 .csv/.tsv (排除汇总表和 Office 临时文件)。"""
+    files = [f for f in glob.glob(os.path.join(folder, "*")) if f.lower().endswith((".xlsx",) + CSV_EXTS)]
+    return [f for f in files if "汇总" not in os.path.basename(f) and not os.path.basename(f).startswith("~$")]
+
+# ================= 分页预览 (行偏移索引 + LRU 页缓存) =================
+PREVIEW_PAGE_ROWS = 200      # 每页行数
+PREVIEW_CACHE_PAGES = 32     # 每个文件在内存中保留的页数
+PREVIEW_MAX_FILES = 4        # 同时保留索引的文件数
+PREVIEW_EMIT_SEC = 0.2       # 建索引时进度回调的最小间隔
+
+class SheetPager:
+    """后台顺序读一遍工作表，每页序列化进临时文件并记下偏移，之后跳到任意行只需读一页。
+    最近访问的页保存在 LRU 缓存里；索引未建完时也可读取已就绪的部分。
+    log 非空时在建索引线程里分阶段计时 (deep 时连同 cProfile)，建完把报告写进 log。"""
+    def __init__(self, path, reader=None, page_rows=PREVIEW_PAGE_ROWS, cache_pages=PREVIEW_CACHE_PAGES, on_progress=None,
+                 log=None, deep=False):
+        self.path = path; self.reader = reader; self.page_rows = page_rows; self.cache_pages = cache_pages
+        self.on_progress = on_progress or (lambda pager: None); self.log = log; self.deep = deep
+        self.sig = self._signature()
+        self.offsets = []            # 第 i 页在临时文件中的 (偏移, 长度)
+        self.rows = 0; self.max_col = 0; self.error = None
+        self.pages = OrderedDict(); self.lock = threading.Lock()
+        self.done = threading.Event(); self.stop = threading.Event()
+        self.fp = tempfile.TemporaryFile(prefix="excel_preview_")
+        self.thread = threading.Thread(target=self._build, daemon=True, name="preview"); self.thread.start()
+
+    def _signature(self):
+        st = os.stat(self.path); return st.st_size, st.st_mtime_ns
+
+    def stale(self):
+        try: return self._signature() != self.sig
+        except OSError: return True
+
+    def _flush_page(self, page):
+        blob = pickle.dumps(page, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.fp.seek(0, 2); off = self.fp.tell(); self.fp.write(blob)
+            self.offsets.append((off, len(blob))); self.rows += len(page)
+
+    def _build(self):
+        page = []; last = 0
+        prof = RunProfile("preview", self.log, self.deep, file=self.path, reader=self.reader) if self.log else _noprof
+        flush = prof.wrap(self._flush_page, "分页写入")
+        try:
+            prof.file_in(self.path)
+            with prof.phase("打开"): rd = open_reader(self.path, self.reader)
+            with rd, prof.phase("转文本"):
+                for r in prof.timed(rd.iter_rows(), "读取解析"):
+                    if self.stop.is_set(): return
+                    vals = ["" if v is None else str(v) for v in r]
+                    while vals and vals[-1] == "": vals.pop()
+                    if len(vals) > self.max_col: self.max_col = len(vals)
+                    page.append(vals)
+                    if len(page) == self.page_rows:
+                        flush(page); page = []
+                        now = time.perf_counter()
+                        if len(self.offsets) == 1: prof.count(first_page_s=round(now - prof.t0, 3))
+                        if len(self.offsets) <= 1 or now - last >= PREVIEW_EMIT_SEC: last = now; self.on_progress(self)
+            if page: flush(page)
+            prof.count(rows=self.rows)
+        except Exception as e: self.error = e
+        finally:
+            self.done.set()
+            if self.stop.is_set(): prof.finish("cancelled")
+        if self.stop.is_set(): return
+        prof.report(status="ok" if self.error is None else f"error: {self.error}")
+        self.on_progress(self)
+
+    def _page(self, i):
+        with self.lock:
+            page = self.pages.get(i)
+            if page is not None: self.pages.move_to_end(i); return page
+            off, n = self.offsets[i]
+            self.fp.seek(off); page = pickle.loads(self.fp.read(n))
+            self.pages[i] = page
+            if len(self.pages) > self.cache_pages: self.pages.popitem(last=False)
+            return page
+
+    def get_rows(self, start, count):
+        """返回 [(行号, [单元格文本...]), ...]，行号从 1 开始；只含已建好索引的行。"""
+        out = []; r = max(1, start); end = min(start + count, self.rows + 1)
+        while r < end:
+            i, k = divmod(r - 1, self.page_rows)
+            page = self._page(i); take = page[k:k + end - r]
+            out.extend(enumerate(take, r)); r += len(take)
+        return out
+
+    def close(self):
+        self.stop.set()
+        with self.lock:
+            self.pages.clear()
+            try: self.fp.close()
+            except Exception: pass
+
+class PagerCache:
+    """按文件保留最近使用的 SheetPager，文件有改动时重建。"""
+    def __init__(self, max_files=PREVIEW_MAX_FILES):
+        self.max_files = max_files; self.pagers = OrderedDict()
+
+    def get(self, path, reader=None, on_progress=None, log=None, deep=False):
+        key = os.path.abspath(path); p = self.pagers.pop(key, None)
+        if p is not None and (p.stale() or p.error or p.reader != reader): p.close(); p = None
+        if p is None: p = SheetPager(path, reader, on_progress=on_progress, log=log, deep=deep)
+        else: p.on_progress = on_progress or p.on_progress
+        self.pagers[key] = p
+        while len(self.pagers) > self.max_files: self.pagers.popitem(last=False)[1].close()
+        return p
+
+    def close(self):
+        for p in self.pagers.values(): p.close()
+        self.pagers.clear()
+
+# ================= 报告 =================
+def analysis_report(f, start_row, col_idx, reader=None, stats=None, sheet=None):
+    """拆分列的分类预览报告，返回文本行列表。stats 为 analyze_file 的结果，缺省时现读；sheet 为工作表名。
+    col_idx 可为拆分列说明 (见 parse_split_keys)，多种拆分一遍读完，逐种列出。"""
+    hc = histogram_cols(col_idx); st = sheet_stats(stats or analyze_file(f, reader, hist_cols=hc), sheet)
+    if st is None: raise ValueError(f"没有工作表: {sheet}")
+    keys = parse_split_keys(col_idx)
+    counters = [column_histogram(st, hc[0], start_row)] if hc else [None]
+    if counters[0] is None:
+        counters = [Counter() for _ in keys]
+        with open_reader(f, reader, sheet) as rd:
+            for r in rd.iter_rows(min_row=start_row):
+                for c, k in zip(counters, keys):
+                    v = _key(k.get(r))
+                    if v: c[v] += 1
+    rep = [f"文件: {_unit_label(os.path.basename(f), sheet)}", f"扫描: {st['total']}", f"有效: {valid_rows_from(st, start_row)} (第 {start_row} 行起)",
+           f"列数: {st['cols']}"]
+    for c, k in zip(counters, keys):
+        rep += ["-"*30, f"【分类预览 · {k.label}】" if len(keys) > 1 else "【分类预览】"]
+        for v, n in c.most_common(): rep.append(f"{v} : {n}")
+        if k.unmapped: rep.append(f"(对照表中没有: {', '.join(sorted(k.unmapped)[:10])}{' 等' if len(k.unmapped) > 10 else ''})")
+    return rep
+
+def merge_estimate(stats, start_row, sheets=None):
+    """按 {文件: 扫描统计} 计算合并后的总行数 (不含空行)。sheets 为工作表名列表时按这些表合计。"""
+    return sum(valid_rows_from(ss, start_row) for st in stats.values() for s in sheets or [None]
+               for ss in [sheet_stats(st, s)] if ss)
+
+def merge_report(stats, start_row, sheets=None):
+    """合并预估报告，返回文本行列表。stats 为 {文件: 扫描统计}；sheets 为工作表名列表时逐表列出。"""
+    report = []
+    report.append("============ 📊 合并预估报告 ============")
+    report.append(f"基准起始行: {start_row}")
+    report.append(f"文件总数: {len(stats)}")
+    report.append("-" * 45)
+    report.append(f"{'文件名':<30} | {'物理总行':<8} | {'实际贡献':<8}")
+    report.append("-" * 45)
+    total_valid = 0
+    for f_path, full in stats.items():
+        for s in sheets or [None]:
+            st = sheet_stats(full, s)
+            if st is None: continue
+            fname = _unit_label(os.path.basename(f_path), s)
+            valid = valid_rows_from(st, start_row)
+            total_valid += valid
+            dname = (fname[:25] + '..') if len(fname) > 25 else fname
+            report.append(f"{dname:<30} | {st['total']:<8} | {valid:<8}")
+    report.append("-" * 45)
+    report.append(f"【汇总】 合并后总行数: {total_valid}")
+    return report
+
+# ================= 模拟引擎 (无 Excel/WPS 时测试与基准用) =================
+FAKE_PROG_ID = "Fake.Application"
+FAKE_CRASH_RATE = 0.0        # 打开工作簿时模拟进程崩溃的概率
+
+class FakeComError(Exception): pass
+
+class _FakeRange:
+    def __init__(self, sheet, rows=(), cols=()): self.sheet = sheet; self.rows = set(rows); self.cols = set(cols)
+    @property
+    def EntireRow(self): return self
+    @property
+    def Row(self): return min(self.rows, default=self.sheet.flush().min_row)
+    @property
+    def Column(self): return min(self.cols, default=self.sheet.flush().min_column)
+    def Delete(self): self.sheet.delete(self.rows, self.cols)
+
+class _FakeCount:
+    def __init__(self, n): self.Count = n
+
+class _FakeUsedRange:
+    def __init__(self, ws):
+        self.Row = ws.min_row; self.Column = ws.min_column
+        self.Rows = _FakeCount(ws.max_row - ws.min_row + 1); self.Columns = _FakeCount(ws.max_column - ws.min_column + 1)
+
+class _FakeSheet:
+    """删行/删列先攒着 (原行列号)，读表或保存时一次搬完单元格。调用方都是自下而上、
+    自右向左删，攒着的期间前面的行列号不变；否则先落实已攒的再记。"""
+    def __init__(self, ws): self.ws = ws; self.rows = []; self.cols = []
+    def unmoved(self, rows, cols):
+        """rows/cols 的行列号是否还没被已攒的删除改变"""
+        return not (self.rows and cols) and not (self.cols and rows) and \
+            (not rows or not self.rows or max(rows) < self.rows[0]) and (not cols or not self.cols or max(cols) < self.cols[0])
+    def delete(self, rows, cols):
+        if not self.unmoved(rows, cols): self.flush()
+        self.rows = sorted(set(self.rows) | set(rows)); self.cols = sorted(set(self.cols) | set(cols))
+    def flush(self):
+        # 结果同逐段 delete_rows/delete_cols (只搬单元格)，但所有单元格只搬一遍
+        rows, cols = self.rows, self.cols
+        if rows or cols:
+            rs, cs = set(rows), set(cols); cells = {}
+            for (r, c), cell in self.ws._cells.items():
+                if r in rs or c in cs: continue
+                cell.row = r - bisect_right(rows, r); cell.column = c - bisect_right(cols, c)
+                cells[(cell.row, cell.column)] = cell
+            self.ws._cells = cells; self.rows = []; self.cols = []
+        return self.ws
+    @property
+    def UsedRange(self): return _FakeUsedRange(self.flush())
+    def Rows(self, r): return _FakeRange(self, rows=[r])
+    def Columns(self, c): return _FakeRange(self, cols=[c])
+    def Range(self, ref):
+        c1, r1, c2, r2 = range_boundaries(ref)
+        return _FakeRange(self, rows=range(r1, min(r2, self.flush().max_row) + 1))
+
+class _FakeWorkbook:
+    def __init__(self, books, path):
+        self.books = books; self.path = path; self.wb = openpyxl.load_workbook(path); self.sheets = {}
+    def _sheet(self, ws):
+        if ws.title not in self.sheets: self.sheets[ws.title] = _FakeSheet(ws)
+        return self.sheets[ws.title]
+    @property
+    def FullName(self): return os.path.abspath(self.path)
+    @property
+    def ActiveSheet(self): return self._sheet(self.wb.active)
+    def Worksheets(self, name): return self._sheet(self.wb[name])
+    def _save(self, path):
+        for s in self.sheets.values(): s.flush()
+        self.wb.save(path)
+    def Save(self): self._save(self.path)
+    def SaveAs(self, path, FileFormat=51): self.path = path; self._save(path)
+    def Close(self, SaveChanges=False):
+        if SaveChanges: self.Save()
+        self.wb.close(); self.books.items.remove(self)
+
+class _FakeWorkbooks:
+    def __init__(self, app): self.app = app; self.items = []
+    @property
+    def Count(self): return len(self.items)
+    def __call__(self, i): return self.items[i - 1]
+    def Open(self, path):
+        if random.random() < self.app.crash_rate: self.app.alive = False; raise FakeComError("模拟引擎崩溃")
+        wb = _FakeWorkbook(self, path); self.items.append(wb); return wb
+
+class _FakeFunctions:
+    def CountA(self, rng):
+        s = rng.sheet; ws = s.ws if s.unmoved(rng.rows, rng.cols) else s.flush(); n = 0
+        for r in rng.rows:
+            n += sum(1 for c in range(1, ws.max_column + 1) if ws.cell(r, c).value not in (None, ""))
+        for c in rng.cols:
+            n += sum(1 for r in range(1, ws.max_row + 1) if ws.cell(r, c).value not in (None, ""))
+        return n
+
+class FakeApp:
+    """进程内的模拟 Excel/WPS: 只实现本工具用到的一小部分 COM 接口 (Workbooks.Open、Rows/Columns.Delete、
+    Union、CountA、Save/SaveAs)，底层用 openpyxl 读写，便于在没有 Office 的机器上测试引擎池与调度。"""
+    def __init__(self, crash_rate=None):
+        self.alive = True; self.crash_rate = FAKE_CRASH_RATE if crash_rate is None else crash_rate
+        self.Visible = False; self.DisplayAlerts = False; self.ScreenUpdating = True
+        self._books = _FakeWorkbooks(self); self.WorksheetFunction = _FakeFunctions()
+    @property
+    def Workbooks(self):
+        if not self.alive: raise FakeComError("RPC 服务器不可用")
+        return self._books
+    def Union(self, a, b): return _FakeRange(a.sheet, a.rows | b.rows, a.cols | b.cols)
+    def Quit(self): self.alive = False
+
+# ================= Excel / WPS (COM) 与引擎池 =================
+ENGINE_POOL_SIZE = 1         # 每种应用最多同时常驻的实例数
+
+def detect_engines():
+    """返回 (有 Excel, 有 WPS)。只查注册表中的 ProgID，不启动应用。"""
+    if not HAS_WIN32: return False, False
+    def registered(*prog_ids):
+        for p in prog_ids:
+            try: pywintypes.IID(p); return True
+            except pywintypes.com_error: pass
+        return False
+    return registered('Excel.Application'), registered('Et.Application', 'Ket.Application')
+
+def app_name_for(choice, has_excel, has_wps):
+    if choice == "fake": return FAKE_PROG_ID
+    if choice == "excel": return 'Excel.Application'
+    if choice == "wps": return 'Et.Application'
+    if has_excel: return 'Excel.Application'
+    if has_wps: return 'Et.Application'
+    return None
+
+def has_engine(prog_id): return bool(prog_id) and (HAS_WIN32 or prog_id == FAKE_PROG_ID)
+
+def _dispatch(prog_id):
+    # DispatchEx 总是启动新进程: Dispatch 会挂到用户已打开的 Excel/WPS 上，归还时就会动到用户的工作簿
+    if prog_id == FAKE_PROG_ID: return FakeApp()
+    try: app = win32.DispatchEx(prog_id)
+    except: app = win32.DispatchEx('Ket.Application')
+    app.Visible = False; app.DisplayAlerts = False
+    return app
+
+def _quit(app):
+    if app: 
+        try: app.Quit() 
+        except: pass
+
+def _open_books(app):
+    """实例上已打开的工作簿 (完整路径)，含个人宏工作簿、加载项等。"""
+    books = app.Workbooks
+    return frozenset(books(i).FullName for i in range(1, books.Count + 1))
+
+def _reset(app, keep=frozenset()):
+    """关闭任务在实例上打开后没关的工作簿 (不保存)，keep 里借出前就开着的不动。返回实例是否仍可用。"""
+    try:
+        books = app.Workbooks
+        for i in range(books.Count, 0, -1):
+            if books(i).FullName not in keep: books(i).Close(False)
+        app.ScreenUpdating = True
+        return True
+    except: return False
+
+def _apartment(prog_id):
+    # 工作线程进入 MTA，实例可在线程间复用；已是 STA 的线程 (如主线程) 只能复用自己创建的实例
+    if prog_id == FAKE_PROG_ID or not HAS_WIN32: return None
+    try: pythoncom.CoInitializeEx(pythoncom.COINIT_MULTITHREADED); return "mta"
+    except pythoncom.com_error: return threading.get_ident()
+
+class EnginePool:
+    """Excel/WPS 实例池: 首次使用时才启动应用，用完归还保持常驻，下次任务直接复用；
+    任务出错后实例若已失效 (崩溃/被关闭) 就丢弃，下次借用时重新启动。
+    归还时只关闭本次借用期间打开的工作簿，借出前已开着的 (个人宏工作簿、加载项) 不动。"""
+    def __init__(self, size=ENGINE_POOL_SIZE, launch=_dispatch):
+        self.size = size; self.launch = launch
+        self.idle = {}; self.live = {}; self.cond = threading.Condition()
+        self.counters = {"launched": 0, "reused": 0, "discarded": 0}
+
+    def acquire(self, prog_id):
+        key = (prog_id, _apartment(prog_id))
+        with self.cond:
+            while True:
+                idle = self.idle.setdefault(key, [])
+                if idle: self.counters["reused"] += 1; return key, idle.pop()
+                if self.live.get(key, 0) < self.size: self.live[key] = self.live.get(key, 0) + 1; break
+                self.cond.wait()
+        try: app = self.launch(prog_id)
+        except:
+            with self.cond: self.live[key] -= 1; self.cond.notify()
+            raise
+        with self.cond: self.counters["launched"] += 1
+        return key, app
+
+    def release(self, key, app, healthy=True, keep=frozenset()):
+        if healthy and _reset(app, keep):
+            with self.cond: self.idle.setdefault(key, []).append(app); self.cond.notify()
+            return
+        _quit(app)
+        with self.cond: self.live[key] -= 1; self.counters["discarded"] += 1; self.cond.notify()
+
+    @contextmanager
+    def session(self, prog_id):
+        """借用一个实例: with pool.session(prog_id) as app: ..."""
+        key, app = self.acquire(prog_id); healthy = True; keep = frozenset()
+        try: keep = _open_books(app); yield app
+        except BaseException: healthy = _reset(app, keep); raise
+        finally: self.release(key, app, healthy, keep)
+
+    def shutdown(self):
+        """退出所有空闲实例。"""
+        with self.cond:
+            for key, idle in self.idle.items():
+                for app in idle: _quit(app)
+                self.live[key] -= len(idle); idle.clear()
+
+ENGINES = EnginePool()
+atexit.register(ENGINES.shutdown)
+
+ENGINE_RETRIES = 1           # 实例崩溃时换新实例重试的次数
+PERFECT_WORKERS = 1          # 完美拆分的引擎进程数，每个进程各自启动一个应用实例
+
+def sanitize_file(file_path, prog_id, log=_nolog, pool=None, cache=None):
+    """经 Excel/WPS 另存一份影子文件以修复格式问题，失败时返回原文件。
+    影子按内容哈希缓存 (见 ShadowCache)，同一文件内容再次处理时直接复用。"""
+    if not has_engine(prog_id): return file_path
+    cache = cache or SHADOWS; abs_path = os.path.abspath(file_path)
+    try:
+        hit = cache.get(abs_path, prog_id)
+        if hit: log(f"影子缓存命中 ({prog_id})", "INFO"); return hit
+        log(f"影子缓存 ({prog_id})...", "INFO")
+        def produce(tmp):
+            with (pool or ENGINES).session(prog_id) as app:
+                wb = app.Workbooks.Open(abs_path); wb.SaveAs(tmp, FileFormat=51); wb.Close()
+        return cache.put(abs_path, prog_id, produce)
+    except: 
+        return file_path
+
+def native_clean(file_path, prog_id, log=_nolog, pool=None, prof=_noprof):
+    """经 Excel/WPS 逐行逐列删除空行/空列并另存 (保留公式)，返回新文件路径。"""
+    prof.file_in(file_path); t = time.perf_counter()
+    with (pool or ENGINES).session(prog_id) as app:
+        prof.add("引擎获取", time.perf_counter() - t)
+        with prof.phase("打开"): wb = app.Workbooks.Open(os.path.abspath(file_path)); ws = wb.ActiveSheet
+        mr = ws.UsedRange.Rows.Count + ws.UsedRange.Row - 1
+        mc = ws.UsedRange.Columns.Count + ws.UsedRange.Column - 1
+        log("扫描并删除空行/列...", "INFO")
+        with prof.phase("删行列"):
+            for r in range(mr, 0, -1):
+                if app.WorksheetFunction.CountA(ws.Rows(r)) == 0: ws.Rows(r).Delete()
+            for c in range(mc, 0, -1):
+                if app.WorksheetFunction.CountA(ws.Columns(c)) == 0: ws.Columns(c).Delete()
+        out = _clean_name(file_path)
+        with prof.phase("保存"): wb.SaveAs(os.path.abspath(out), FileFormat=51); wb.Close()
+        prof.file_out(out); prof.count(rows=mr)
+        return out
+
+def _split_owners(shadow_file, start_row, keys, sheets=None):
+    """一遍读出每种拆分方式的 {表名: ({行号: 拆分值}, 最后一个有效数据行)}，表名 None 为活动工作表。"""
+    wb_scan = openpyxl.load_workbook(shadow_file, read_only=True, data_only=True); owners = [{} for _ in keys]
+    for s in sheets or [None]:
+        ws_scan = wb_scan[s] if s else wb_scan.active
+        real_max = [0] * len(keys); maps = [{} for _ in keys]
+        for i, r in enumerate(ws_scan.iter_rows(values_only=True)):
+            row_num = i+1
+            if row_num >= start_row:
+                for li, k in enumerate(keys):
+                    val = k.get(r)
+                    if val: real_max[li] = row_num; maps[li][row_num] = str(val).strip()
+        for li in range(len(keys)): owners[li][s] = (maps[li], real_max[li])
+    wb_scan.close()
+    return owners
+
+def _split_one(app, t_path, target_val, owners, start_row, tm=None):
+    """在已复制好的 t_path 中，逐个选中的工作表删掉不属于 target_val 的行并保存 (owners 见 _split_owners)。
+    tm 为 dict 时记下 打开/删行/保存 的秒数。"""
+    tm = {} if tm is None else tm; t = time.perf_counter()
+    wb = app.Workbooks.Open(os.path.abspath(t_path))
+    tm["打开"] = tm.get("打开", 0) + time.perf_counter() - t; t = time.perf_counter()
+    app.ScreenUpdating = False
+    for name, (row_data_map, real_max_row) in owners.items():
+        ws = wb.Worksheets(name) if name else wb.ActiveSheet
+        if real_max_row < 1048576:
+            try: ws.Range(f"A{real_max_row+1}:A1048576").EntireRow.Delete()
+            except: pass
+        del_rng = None; bat = 0
+        for r in range(real_max_row, start_row-1, -1):
+            owner = row_data_map.get(r)
+            should_del = False
+            if owner and owner != target_val: should_del = True
+            elif not owner: should_del = True 
+            if should_del:
+                if not del_rng: del_rng = ws.Rows(r)
+                else: del_rng = app.Union(del_rng, ws.Rows(r))
+                bat += 1
+            if bat >= 50: del_rng.Delete(); del_rng = None; bat = 0
+        if del_rng: del_rng.Delete()
+    app.ScreenUpdating = True
+    tm["删行"] = tm.get("删行", 0) + time.perf_counter() - t; t = time.perf_counter()
+    wb.Save(); wb.Close()
+    tm["保存"] = tm.get("保存", 0) + time.perf_counter() - t
+
+def _perfect_target(pool, prog_id, original_file, t_path, target_val, owners, start_row):
+    """处理一个目标，引擎失效时换新实例重试。返回 (用时秒, 错误或 None, 重试次数, {阶段: 秒})。"""
+    t0 = time.perf_counter(); err = None; tm = {}
+    for attempt in range(ENGINE_RETRIES + 1):
+        try:
+            t = time.perf_counter(); shutil.copy2(original_file, t_path)
+            tm["复制"] = tm.get("复制", 0) + time.perf_counter() - t; t = time.perf_counter()
+            with pool.session(prog_id) as app:
+                tm["引擎获取"] = tm.get("引擎获取", 0) + time.perf_counter() - t
+                _split_one(app, t_path, target_val, owners, start_row, tm)
+            return time.perf_counter() - t0, None, attempt, tm
+        except Exception as e: err = e
+    return time.perf_counter() - t0, f"{err}", ENGINE_RETRIES, tm
+
+def _perfect_worker(prog_id, original_file, owners, start_row, tasks, results):
+    # 引擎进程: 独占一个应用实例，逐个领取目标，收到 None 后退出应用
+    _ignore_sigint(); pool = EnginePool()
+    try:
+        while True:
+            t = tasks.get()
+            if t is None: break
+            idx, li, target_val, t_path = t
+            dt, err, retries, tm = _perfect_target(pool, prog_id, original_file, t_path, target_val, owners[li], start_row)
+            results.put((idx, dt, err, retries, tm, os.getpid()))
+    finally: pool.shutdown()
+
+def _run_perfect_workers(jobs, workers, prog_id, original_file, owners, start_row, log, cancel=None):
+    """把 jobs [(序号, 拆分方式, 目标, 输出路径)] 分给 workers 个引擎进程，完成一个产出一个结果。
+    任务逐个补发 (在途最多 workers*2 个)；cancel 置位后不再补发，等在途的做完即结束。"""
+    ctx = multiprocessing.get_context("spawn"); tasks = ctx.Queue(); results = ctx.Queue()
+    procs = [ctx.Process(target=_perfect_worker, daemon=True,
+                         args=(prog_id, original_file, owners, start_row, tasks, results))
+             for _ in range(workers)]
+    for p in procs: p.start()
+    todo = iter(jobs); left = 0; closed = False
+    def feed():
+        nonlocal left, closed
+        j = None if closed or (cancel is not None and cancel.is_set()) else next(todo, None)
+        if j is not None: tasks.put(j); left += 1; return
+        if not closed:
+            for _ in procs: tasks.put(None)
+            closed = True
+    for _ in range(workers * 2): feed()
+    try:
+        while left:
+            try: r = results.get(timeout=1)
+            except queue.Empty:
+                if not any(p.is_alive() for p in procs): log("引擎进程全部意外退出", "ERROR"); return
+                continue
+            left -= 1; feed(); yield r
+    finally:
+        for p in procs:
+            p.join(timeout=30)
+            if p.is_alive(): p.terminate()
+
+def perfect_split(original_file, start_row, col_idx, output_dir, prog_id, log=_nolog, pool=None, workers=PERFECT_WORKERS,
+                  prof=_noprof, sheets=None, job=_nojob):
+    """完美拆分 (COM): 每个目标复制一份原表，再经 Excel/WPS 删除不属于该目标的行。返回生成的文件数 (含续做时跳过的)。
+    sheets 为工作表名列表时在每个选中的表里删行 (其余表原样保留)，None 为活动工作表。
+    col_idx 为拆分列号或拆分列说明 (见 parse_split_keys)，多种拆分共用一遍定位，各自输出到子文件夹。
+    job 为 JobJournal 时跳过已完成的目标，每完成一个记一笔；取消后不再派发新目标，在途的做完后抛 JobCancelled。
+    workers > 1 时目标分给多个引擎进程并行处理，每个进程各有一个应用实例；
+    各目标的 复制/引擎获取/打开/删行/保存 耗时由引擎进程带回，按进程累加进 prof。"""
+    pool = pool or ENGINES
+    log(f">>> 完美模式 ({prog_id})...", "ENGINE")
+    prof.file_in(original_file)
+    with prof.phase("影子清洗"): shadow_file = sanitize_file(original_file, prog_id, log, pool)
+    keys = parse_split_keys(col_idx); subs = _layout_dirs(output_dir, keys)
+    with prof.phase("定位行"): owners = _split_owners(shadow_file, start_row, keys, sheets)
+    _report_unmapped(keys, log)
+    prof.count(rows=max(sum(len(m) for m, _ in o.values()) for o in owners))
+    for s, (_, real_max_row) in owners[0].items():
+        log(f"{f'[{s}] ' if s else ''}有效数据截止: {max(o[s][1] for o in owners)} 行", "INFO")
+    _, ext = os.path.splitext(original_file)
+    names = [(li, t, os.path.join(subs[li], f"{safe_file_name(t)}{ext}"))
+             for li, o in enumerate(owners) for t in sorted({v for m, _ in o.values() for v in m.values()})]
+    jobs = [(i, li, t, os.path.join(output_dir, n)) for i, (li, t, n) in enumerate([x for x in names if not job.skip(x[2])])]
+    skipped = len(names) - len(jobs)
+    if skipped: log(f"续做: 跳过已完成的 {skipped} 个目标，剩余 {len(jobs)} 个", "INFO")
+    workers = max(1, min(workers, len(jobs)))
+    if workers > 1:
+        log(f"{workers} 个引擎进程并行处理 {len(jobs)} 个目标", "ENGINE")
+        results = _run_perfect_workers(jobs, workers, prog_id, original_file, owners, start_row, log, job.cancel)
+    else:
+        results = ((i, *_perfect_target(pool, prog_id, original_file, p, t, owners[li], start_row), os.getpid())
+                   for i, li, t, p in jobs if not job.cancelled)
+    count = 0; done = 0; t0 = time.perf_counter()
+    for idx, dt, err, retries, tm, pid in results:
+        done += 1; t_file = os.path.relpath(jobs[idx][3], output_dir)
+        for k, v in tm.items(): prof.add(k, v)
+        note = f"，重试 {retries} 次" if retries else ""
+        if err: log(f"[{done}/{len(jobs)}] {t_file} 引擎错: {err}", "ERROR"); job.fail(); continue
+        count += 1; prof.file_out(jobs[idx][3]); job.mark(t_file)
+        eta = (time.perf_counter() - t0) / done * (len(jobs) - done)
+        log(f"[{done}/{len(jobs)}] {t_file} 用时 {dt:.1f} 秒 (进程 {pid}{note})，预计剩余 {eta:.0f} 秒", "INFO")
+    log(f"完美拆分耗时 {time.perf_counter() - t0:.1f} 秒 ({workers} 个引擎进程)", "STATS")
+    job.check()
+    return count + skipped
+
+# ================= 任务入口 (界面与命令行共用) =================
+SPLIT_MODES = ("fast", "styled", "perfect")
+
+def split_params(f, start_row, col_idx, mode, sheets=None, fmt="xlsx", encoding=CSV_ENCODING):
+    """拆分任务的检查点参数: 总表 (路径、大小、修改时间) 和拆分设定 (含对照表的修改时间、输出格式)，相同时才能续做。"""
+    st = os.stat(f)
+    return {"file": os.path.abspath(f), "size": st.st_size, "mtime": st.st_mtime_ns, "mode": mode,
+            "start_row": start_row, "col": [k.ident() for k in parse_split_keys(col_idx)], "sheets": sheets,
+            "format": fmt, "encoding": encoding if fmt in ("csv", "tsv") else None}
+
+def run_split(f, start_row, col_idx, mode="fast", out_dir=None, reader=None, prog_id=None, log=_nolog, workers=PERFECT_WORKERS,
+              prof=None, sheets=None, resume=False, cancel=None, fmt="xlsx", encoding=CSV_ENCODING):
+    """拆分总表，默认输出到总表旁的 拆分结果_<时间戳> 文件夹。prof 为 RunProfile 时分阶段计时。
+    fmt 为 xlsx 以外的输出格式 (见 OUTPUT_FORMATS) 时只写取值，仅极速模式可用；encoding 为 CSV 编码。
+    sheets 为工作表选择串 (见 select_sheets)，空为活动工作表。
+    col_idx 为拆分列号或拆分列说明 (见 parse_split_keys)，给多种拆分时一遍读完，各自输出到以拆分方式命名的子文件夹。
+    输出目录里记检查点 (JobJournal)；resume 时续做同一设定下最近一次未完成的输出目录 (或给定的 out_dir)，
+    跳过已写出的文件。cancel (threading.Event) 置位后在两批之间停下并抛 JobCancelled。返回 (输出目录, 文件数)。"""
+    prof = prof or _noprof
+    check_output_format(fmt, encoding)
+    if fmt != "xlsx" and mode != "fast": raise ValueError(f"输出 {fmt} 只能用极速模式 (其余模式保留样式，只能写 xlsx)")
+    sheets = resolve_sheets(f, sheets)
+    if sheets: log(f"工作表: {', '.join(sheets)}", "INFO")
+    col_idx = parse_split_keys(col_idx)
+    if len(col_idx) > 1: log(f"{len(col_idx)} 种拆分同时进行: {', '.join(k.label for k in col_idx)}", "INFO")
+    if mode == "perfect" and not has_engine(prog_id): log("无引擎", "ERROR"); return out_dir, 0
+    ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    params = split_params(f, start_row, col_idx, mode, sheets, fmt, encoding)
+    if resume and not out_dir: out_dir = find_resumable(os.path.dirname(os.path.abspath(f)), "拆分结果_", "split", params)
+    out_dir = out_dir or os.path.join(os.path.dirname(f), f"拆分结果_{ts}")
+    if not os.path.exists(out_dir): os.makedirs(out_dir)
+    job = JobJournal(out_dir, "split", params, resume, cancel, log, {"ts": ts})
+    if job.resumed: log(f"断点续做: {out_dir} (已完成 {len(job.done)} 个文件)", "INFO"); ts = job.meta.get("ts", ts)
+    try:
+        if mode == "fast":
+            log("极速模式 (单遍流式)..." + (f" 输出 {fmt}" if fmt != "xlsx" else ""), "INFO")
+            cnt = stream_split(f, start_row, col_idx, out_dir, ts, log=log, reader=reader, prof=prof, sheets=sheets, job=job,
+                               fmt=fmt, encoding=encoding)
+        elif mode == "styled":
+            log(">>> 完美·单遍模式 (样式直写)...", "ENGINE")
+            cnt = styled_split(f, start_row, col_idx, out_dir, log=log, prof=prof, sheets=sheets, job=job)
+        else: cnt = perfect_split(f, start_row, col_idx, out_dir, prog_id, log=log, workers=workers, prof=prof, sheets=sheets, job=job)
+        if job.failed: log(f"{job.failed} 个文件失败，续做时只重做这些", "WARN")
+        else: job.finish()
+    finally: job.close()
+    return out_dir, cnt
+
+def run_clean(file_path, prog_id=None, log=_nolog, prof=None):
+    """删除空行/空列另存。不给引擎时走 compact_clean，否则经 Excel/WPS。返回新文件路径。"""
+    prof = prof or _noprof
+    if not prog_id:
+        log("清洗 (单遍压缩，无需引擎)...", "INFO"); return compact_clean(file_path, log, prof)
+    log(f"清洗 ({prog_id})...", "ENGINE"); return native_clean(file_path, prog_id, log, prof=prof)
+
+def run_merge(folder, start_row, files=None, template=None, workers=MERGE_WORKERS, reader=None, log=_nolog, incremental=False,
+              align=False, stats=None, dedup=False, key_cols=None, prof=None, sheets=None, cancel=None, fmt="xlsx", encoding=CSV_ENCODING):
+    """合并回收文件夹 (.xlsx 和 .csv/.tsv)，输出 合并汇总表_<时间戳>.xlsx，fmt 为平面格式时输出对应格式 (见 output_name)。incremental 时复用上次汇总表中未改动文件的行块，
+    上次中断留下的部分汇总表也照此复用 (即续做)，并在回收文件夹里记清单 (见 incremental_merge)；cancel 见 incremental_merge；
+    align 时按表头对齐列；dedup 时跳过重复行 (key_cols 为比较的列号，缺省整行)；
+    sheets 为工作表选择串 (按模板的表名解析，见 select_sheets)，空为各文件的活动工作表。
+    stats 为已有的扫描统计 {文件: 统计}，用来免读表头。返回 (输出文件, 行数)。"""
+    check_output_format(fmt, encoding)
+    files = files or list_merge_files(folder)
+    if not files: raise ValueError("未找到 .xlsx / .csv 文件")
+    templ = template or files[0]
+    ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    log(f"合并中... 模板: {os.path.basename(templ)}", "INFO")
+    sheets = resolve_sheets(templ, sheets)
+    if sheets: log(f"工作表: {', '.join(sheets)}", "INFO")
+    save_path = os.path.join(folder, output_name(f"合并汇总表_{ts}", fmt, len(sheets or [None])))
+    return save_path, incremental_merge(folder, files, templ, save_path, start_row, workers, log, reader, incremental, align, stats,
+                                        RowDeduper(key_cols) if dedup else None, prof or _noprof, sheets, cancel, fmt, encoding)
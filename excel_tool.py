@@ -1,23 +1,21 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk, scrolledtext
-import openpyxl
-from openpyxl.utils import get_column_letter
 import os
-import shutil
 import datetime
 import threading
-import glob
-from collections import Counter
+import time
+import queue
+from excel_core import (JsonLineLog, RunProfile, JobCancelled, PagerCache, HAS_WIN32, READER_BACKEND, MERGE_WORKERS, PERFECT_WORKERS, SCAN_WORKERS, ScanIndex, scan_files, cached_stats, histogram_cols, align_columns, describe_mismatch, parse_key_cols,
+                        parse_split_keys, OUTPUT_FORMATS, CSV_ENCODING, resolve_sheets, sheet_stats, list_merge_files, analysis_report, merge_estimate, merge_report, detect_engines, app_name_for, has_engine,
+                        run_clean, run_split, run_merge)
 
 # 版本号
 APP_VERSION = "V40 (终极融合·全功能完整版)"
-
-# 尝试导入 win32com
-try:
-    import win32com.client as win32
-    HAS_WIN32 = True
-except ImportError:
-    HAS_WIN32 = False
+SCAN_UI_BATCH = 50                   # 界面每次从队列取出的结果数
+SCAN_POLL_MS = 100                   # 界面轮询结果队列的间隔
+LOG_FLUSH_MS = 100                   # 日志刷新到界面的间隔
+LOG_FLUSH_BATCH = 2000               # 每次刷新最多处理的日志/界面动作数
+LOG_MAX_LINES = 5000                 # 日志框最多保留的行数
 
 class ExcelToolApp:
     def __init__(self, root):
@@ -33,13 +31,19 @@ class ExcelToolApp:
         self.style.configure("Treeview.Heading", font=("Microsoft YaHei", 9, "bold"), background="#d9d9d9")
 
         # 核心缓存
-        self.preview_cache = {"max_row": 0, "max_col": 0}
+        self.pagers = PagerCache() # 预览: 每个文件的行偏移索引与页缓存
+        self.preview_pager = None; self.preview_top = 1; self.preview_cols = 0
         self.merge_files_cache = [] 
         self.current_template = None 
-        self.file_stats_cache = {} # V39: 物理行数缓存
+        self.file_stats_cache = {} # 扫描统计缓存 (空行表/直方图)，点击预览行时即时计算
+        self.scan_job = None # 进行中的扫描任务
+        self.jobs = [] # 进行中的拆分/合并任务 [(线程, 取消标志)]
         
         # 引擎状态
         self.has_excel = False; self.has_wps = False; self.engine_choice = tk.StringVar(value="auto")
+        self.reader_choice = tk.StringVar(value=READER_BACKEND) # 读取后端
+        self.out_format = tk.StringVar(value="xlsx") # 极速拆分与合并的输出格式，xlsx 以外只写取值
+        self.out_encoding = tk.StringVar(value=CSV_ENCODING)
 
         # --- 1. 顶部引擎 ---
         self.init_engine_panel()
@@ -63,10 +67,11 @@ class ExcelToolApp:
         frame_prev_ctrl = tk.Frame(frame_preview)
         frame_prev_ctrl.pack(fill="x", pady=(0, 5))
         
-        tk.Label(frame_prev_ctrl, text="预览行数限制:", font=("Microsoft YaHei", 9)).pack(side="left")
-        self.preview_limit = tk.IntVar(value=50) # 默认50行
-        self.spin_limit = tk.Spinbox(frame_prev_ctrl, from_=10, to=10000, textvariable=self.preview_limit, width=6)
-        self.spin_limit.pack(side="left", padx=5)
+        tk.Label(frame_prev_ctrl, text="跳转到行:", font=("Microsoft YaHei", 9)).pack(side="left")
+        self.entry_preview_row = tk.Entry(frame_prev_ctrl, width=8)
+        self.entry_preview_row.pack(side="left", padx=5)
+        self.entry_preview_row.bind('<Return>', lambda e: self.jump_preview())
+        tk.Button(frame_prev_ctrl, text="跳转", command=self.jump_preview, height=1).pack(side="left")
         
         tk.Button(frame_prev_ctrl, text="⟳ 刷新预览", command=self.refresh_preview, height=1, bg="#E0FFFF").pack(side="left", padx=5)
         
@@ -78,21 +83,31 @@ class ExcelToolApp:
         self.tree.tag_configure('odd', background='white')
         self.tree.tag_configure('even', background='#f2f5f9')
         
-        vsb = ttk.Scrollbar(frame_preview, orient="vertical", command=self.tree.yview)
+        # 纵向滚动条按整表行数虚拟滚动，表格里只放当前可见的几行
+        self.preview_vsb = vsb = ttk.Scrollbar(frame_preview, orient="vertical", command=self.on_preview_scroll)
         hsb = ttk.Scrollbar(frame_preview, orient="horizontal", command=self.tree.xview)
-        self.tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
+        self.tree.configure(xscrollcommand=hsb.set)
         
         self.tree.pack(side="left", fill="both", expand=True)
         vsb.pack(side="right", fill="y")
         hsb.pack(side="bottom", fill="x")
         
         self.tree.bind('<ButtonRelease-1>', self.on_preview_click)
+        self.tree.bind('<MouseWheel>', lambda e: self.scroll_preview(-3 if e.delta > 0 else 3))
+        self.tree.bind('<Button-4>', lambda e: self.scroll_preview(-3))
+        self.tree.bind('<Button-5>', lambda e: self.scroll_preview(3))
+        self.tree.bind('<Prior>', lambda e: self.scroll_preview(-self.preview_visible()))
+        self.tree.bind('<Next>', lambda e: self.scroll_preview(self.preview_visible()))
+        self.tree.bind('<Configure>', lambda e: self.render_preview())
         self.current_preview_file = None # 记录当前预览文件以便刷新
 
         # --- 4. 日志 ---
         log_frame = tk.Frame(root)
         log_frame.pack(fill="x", padx=10, pady=5)
         tk.Label(log_frame, text=f"版本: {APP_VERSION}", fg="gray", anchor="e").pack(side="right", padx=10)
+        self.deep_profile = tk.BooleanVar(value=False) # 各任务都分阶段计时；勾选后另记 cProfile 热点与内存峰值
+        tk.Checkbutton(log_frame, text="深度剖析", variable=self.deep_profile).pack(side="right")
+        tk.Button(log_frame, text="⏹ 停止任务", command=self.stop_jobs).pack(side="right", padx=5)
         tk.Label(log_frame, text="执行日志:", font=("Microsoft YaHei", 9, "bold"), anchor="w").pack(fill="x")
         self.log_text = scrolledtext.ScrolledText(log_frame, height=8, state='disabled', font=("Consolas", 9))
         self.log_text.pack(fill="both", expand=True)
@@ -102,18 +117,80 @@ class ExcelToolApp:
         self.log_text.tag_config("WARN", foreground="#FF8C00"); self.log_text.tag_config("ENGINE", foreground="#FF00FF")
         self.log_text.tag_config("STATS", foreground="#008080")
 
+        # 日志与跨线程界面动作统一排队，由主线程定时批量刷新
+        self.ui_queue = queue.Queue()
+        self.op_log = JsonLineLog()
+        self.root.after(LOG_FLUSH_MS, self.flush_ui_queue)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
         self.check_engines()
 
     # --- 辅助 ---
     def log(self, msg, level="INFO"):
+        # 任意线程可调用: 只入队，不碰控件
         ts = datetime.datetime.now().strftime("%H:%M:%S")
-        self.log_text.config(state='normal')
-        self.log_text.insert(tk.END, f"[{ts}] {msg}\n", level)
-        self.log_text.see(tk.END); self.log_text.config(state='disabled')
-        self.root.update()
-
-    def clear_log(self):
-        self.log_text.config(state='normal'); self.log_text.delete(1.0, tk.END); self.log_text.config(state='disabled')
+        self.ui_queue.put(("log", f"[{ts}] {msg}\n", level))
+        self.op_log.log(msg, level)
+
+    def clear_log(self): self.ui_queue.put(("clear",))
+
+    def ui(self, fn, *args):
+        """把界面动作排到主线程执行 (供后台线程使用)。"""
+        self.ui_queue.put(("call", fn, args))
+
+    # --- 拆分/合并任务: 后台线程 + 取消标志 ---
+    def start_job(self, target, args, name):
+        cancel = threading.Event()
+        t = threading.Thread(target=target, args=args + (cancel,), daemon=True, name=name); t.start()
+        self.jobs = [j for j in self.jobs if j[0].is_alive()] + [(t, cancel)]
+
+    def stop_jobs(self):
+        running = [(t, ev) for t, ev in self.jobs if t.is_alive()]
+        if not running: self.log("没有进行中的拆分/合并任务。", "INFO"); return
+        for _, ev in running: ev.set()
+        self.log("正在停止: 做完当前一批后停下，已完成的部分可续做。", "WARN")
+
+    def on_close(self):
+        # 关窗时先让任务停在两批之间并留下检查点，再退出
+        running = [(t, ev) for t, ev in self.jobs if t.is_alive()]
+        if running and not messagebox.askyesno("退出", "任务仍在进行。停止并保留已完成的部分后退出？"): return
+        for _, ev in running: ev.set()
+        if self.scan_job: self.scan_job["cancel"].set()
+        self._close_when_idle()
+
+    def _close_when_idle(self):
+        if any(t.is_alive() for t, _ in self.jobs): self.root.after(200, self._close_when_idle); return
+        self.root.destroy()
+
+    def flush_ui_queue(self):
+        lines = []
+        def write():
+            if not lines: return
+            self.log_text.config(state='normal')
+            for line, level in lines: self.log_text.insert(tk.END, line, level)
+            n = int(self.log_text.index('end-1c').split('.')[0])
+            if n > LOG_MAX_LINES: self.log_text.delete(1.0, f"{n - LOG_MAX_LINES + 1}.0")
+            self.log_text.see(tk.END); self.log_text.config(state='disabled')
+            lines.clear()
+        for _ in range(LOG_FLUSH_BATCH):
+            try: item = self.ui_queue.get_nowait()
+            except queue.Empty: break
+            if item[0] == "log": lines.append(item[1:]); continue
+            write()
+            if item[0] == "clear": self.log_text.config(state='normal'); self.log_text.delete(1.0, tk.END); self.log_text.config(state='disabled')
+            else:
+                try: item[1](*item[2])
+                except Exception as e: self.log(f"界面更新失败: {e}", "ERROR")
+        write()
+        self.op_log.flush()
+        self.root.after(LOG_FLUSH_MS, self.flush_ui_queue)
+
+    def show_text_window(self, title, lines, geometry=None):
+        top = tk.Toplevel(self.root); top.title(title)
+        if geometry: top.geometry(geometry)
+        txt = scrolledtext.ScrolledText(top, font=("Consolas", 10))
+        txt.pack(fill="both", expand=True, padx=10, pady=10)
+        txt.insert(tk.END, "\n".join(lines)); txt.config(state='disabled')
 
     def get_column_letter(self, n):
         s=""; 
@@ -121,6 +198,8 @@ class ExcelToolApp:
         return s
 
     def ask_open_folder(self, folder_path, message="操作完成！"):
+        if threading.current_thread() is not threading.main_thread():
+            self.ui(self.ask_open_folder, folder_path, message); return
         if messagebox.askyesno("完成", f"{message}\n\n是否立即打开文件夹查看？"):
             try: os.startfile(folder_path)
             except: pass
@@ -136,17 +215,18 @@ class ExcelToolApp:
         rb_excel = tk.Radiobutton(frame_eng, text="🟢 Excel", variable=self.engine_choice, value="excel", bg="#F0F8FF")
         rb_wps = tk.Radiobutton(frame_eng, text="🔵 WPS", variable=self.engine_choice, value="wps", bg="#F0F8FF")
         rb_auto.pack(side="left"); rb_excel.pack(side="left"); rb_wps.pack(side="left")
+        tk.Label(frame_eng, text="| 读取:", bg="#F0F8FF").pack(side="left", padx=5)
+        tk.Radiobutton(frame_eng, text="openpyxl", variable=self.reader_choice, value="openpyxl", bg="#F0F8FF").pack(side="left")
+        tk.Radiobutton(frame_eng, text="⚡ 快速XML", variable=self.reader_choice, value="xml", bg="#F0F8FF").pack(side="left")
+        tk.Label(frame_eng, text="| 输出:", bg="#F0F8FF").pack(side="left", padx=5)
+        ttk.Combobox(frame_eng, textvariable=self.out_format, values=OUTPUT_FORMATS, state="readonly", width=8).pack(side="left")
+        tk.Label(frame_eng, text="CSV编码:", bg="#F0F8FF").pack(side="left", padx=(5, 0))
+        ttk.Combobox(frame_eng, textvariable=self.out_encoding, values=(CSV_ENCODING, "gb18030"), width=10).pack(side="left")
         tk.Button(frame_eng, text="刷新", command=self.check_engines, width=8, bg="#E0E0E0").pack(side="right", padx=10)
 
     def check_engines(self):
         if not HAS_WIN32: self.lbl_status.config(text="❌ 未安装 pywin32", fg="red"); return
-        self.has_excel=False; self.has_wps=False
-        try: app=win32.Dispatch('Excel.Application'); app.Quit(); self.has_excel=True
-        except: pass
-        try: app=win32.Dispatch('Et.Application'); app.Quit(); self.has_wps=True
-        except: 
-            try: app=win32.Dispatch('Ket.Application'); app.Quit(); self.has_wps=True
-            except: pass
+        self.has_excel, self.has_wps = detect_engines()
         st = []
         if self.has_excel: st.append("Excel✅")
         if self.has_wps: st.append("WPS✅")
@@ -156,59 +236,81 @@ class ExcelToolApp:
         elif self.has_wps: self.engine_choice.set("wps")
 
     def get_active_app_name(self):
-        c = self.engine_choice.get()
-        if c == "excel": return 'Excel.Application'
-        if c == "wps": return 'Et.Application'
-        if self.has_excel: return 'Excel.Application'
-        if self.has_wps: return 'Et.Application'
-        return None
-
-    # --- 预览加载 (V40: 支持自定义行数) ---
+        return app_name_for(self.engine_choice.get(), self.has_excel, self.has_wps)
+
+    # --- 预览 (按需分页读取，只渲染可见行) ---
     def refresh_preview(self):
         if self.current_preview_file: self.load_preview(self.current_preview_file)
 
     def load_preview(self, file_path):
         if not file_path or not os.path.exists(file_path): return
         self.current_preview_file = file_path
-        
         try:
-            limit = int(self.preview_limit.get())
-            if limit < 1: limit = 50
-        except: limit = 50
-
-        try:
-            self.lbl_preview_info.config(text=f"正在读取: {os.path.basename(file_path)} ...", fg="blue")
-            self.root.update()
-            
-            wb = openpyxl.load_workbook(file_path, data_only=True, read_only=True)
-            ws = wb.active
-            self.tree.delete(*self.tree.get_children())
-            
-            first_row = []
-            for r in ws.iter_rows(min_row=1, max_row=1, values_only=True): first_row = list(r); break
-            
-            if not first_row: 
-                self.lbl_preview_info.config(text=f"预览: [空文件]", fg="red"); wb.close(); return
-
-            max_col = min(len(first_row), 30)
-            cols = [str(i) for i in range(max_col + 1)]
-            self.tree['columns'] = cols
-            self.tree.column("0", width=40, anchor='center'); self.tree.heading("0", text="行号")
-            for i in range(1, max_col + 1):
-                c = self.get_column_letter(i)
-                self.tree.column(str(i), width=100, anchor='w'); self.tree.heading(str(i), text=f"{c}")
-            
-            cnt = 0
-            for i, r in enumerate(ws.iter_rows(min_row=1, max_row=limit, max_col=max_col, values_only=True)):
-                vals = [i+1] + ["" if v is None else str(v) for v in r]
-                tag = 'even' if i%2==0 else 'odd'
-                self.tree.insert("", "end", values=vals, tags=(tag,))
-                cnt += 1
-            
-            wb.close()
-            self.lbl_preview_info.config(text=f"当前预览: {os.path.basename(file_path)} (显示前 {cnt} 行)", fg="#2E8B57")
+            self.preview_pager = self.pagers.get(file_path, self.reader_choice.get(),
+                                                 on_progress=lambda p: self.ui(self.on_preview_progress, p),
+                                                 log=self.log, deep=self.deep_profile.get())
         except Exception as e:
-            self.log(f"预览失败: {e}", "ERROR"); self.lbl_preview_info.config(text="预览失败", fg="red")
+            self.log(f"预览失败: {e}", "ERROR"); self.lbl_preview_info.config(text="预览失败", fg="red"); return
+        self.preview_top = 1; self.preview_cols = 0
+        self.tree.delete(*self.tree.get_children())
+        self.on_preview_progress(self.preview_pager)
+
+    def on_preview_progress(self, pager):
+        if pager is not self.preview_pager: return
+        name = os.path.basename(pager.path)
+        if pager.error:
+            self.log(f"预览失败: {pager.error}", "ERROR"); self.lbl_preview_info.config(text="预览失败", fg="red"); return
+        if pager.done.is_set() and not pager.rows:
+            self.lbl_preview_info.config(text=f"预览: [空文件]", fg="red"); return
+        if pager.done.is_set(): self.lbl_preview_info.config(text=f"当前预览: {name} (共 {pager.rows} 行, {pager.max_col} 列)", fg="#2E8B57")
+        else: self.lbl_preview_info.config(text=f"正在索引: {name} (已读 {pager.rows} 行，可先浏览) ...", fg="blue")
+        self.render_preview()
+
+    def setup_preview_columns(self, max_col):
+        cols = [str(i) for i in range(max_col + 1)]
+        self.tree['columns'] = cols
+        self.tree.column("0", width=60, anchor='center', stretch=False); self.tree.heading("0", text="行号")
+        for i in range(1, max_col + 1):
+            self.tree.column(str(i), width=100, anchor='w', stretch=False); self.tree.heading(str(i), text=self.get_column_letter(i))
+        self.preview_cols = max_col
+
+    def preview_visible(self):
+        h = self.tree.winfo_height()
+        return max(1, h // 28 - 1) if h > 1 else 8
+
+    def render_preview(self):
+        p = self.preview_pager
+        if p is None: return
+        if p.max_col > self.preview_cols: self.setup_preview_columns(p.max_col)
+        n = self.preview_visible()
+        self.preview_top = max(1, min(self.preview_top, p.rows - n + 1))
+        self.tree.delete(*self.tree.get_children())
+        for r, vals in p.get_rows(self.preview_top, n):
+            self.tree.insert("", "end", values=[r] + vals, tags=('even' if r % 2 else 'odd',))
+        if p.rows: self.preview_vsb.set((self.preview_top - 1) / p.rows, min(1.0, (self.preview_top - 1 + n) / p.rows))
+        else: self.preview_vsb.set(0, 1)
+
+    def scroll_preview(self, delta):
+        if self.preview_pager is None: return "break"
+        self.preview_top += delta; self.render_preview()
+        return "break"
+
+    def on_preview_scroll(self, *args):
+        p = self.preview_pager
+        if p is None or not p.rows: return
+        if args[0] == "moveto": self.preview_top = int(float(args[1]) * p.rows) + 1
+        elif args[0] == "scroll":
+            step = self.preview_visible() if args[2] == "pages" else 1
+            self.preview_top += int(args[1]) * step
+        self.render_preview()
+
+    def jump_preview(self):
+        try: row = int(self.entry_preview_row.get())
+        except: return
+        p = self.preview_pager
+        if p is None: return
+        if row > p.rows: self.log(f"第 {row} 行{'不存在' if p.done.is_set() else '尚未索引到'} (当前共 {p.rows} 行)", "WARN")
+        self.preview_top = row; self.render_preview()
 
     def on_preview_click(self, event):
         region = self.tree.identify("region", event.x, event.y)
@@ -228,6 +330,7 @@ class ExcelToolApp:
                 self.entry_merge_start_row.delete(0, tk.END); self.entry_merge_start_row.insert(0, str(row_idx))
                 # [V39] 触发即时统计
                 self.calculate_merge_stats(row_idx)
+                self.refresh_header_check()
 
     # ================= V39 智能统计 =================
     def calculate_merge_stats(self, start_row):
@@ -235,44 +338,30 @@ class ExcelToolApp:
             self.log("【提示】请先扫描文件夹，才能进行统计。", "WARN")
             return
         total_files = len(self.file_stats_cache)
-        estimated_total_rows = 0
-        for f_path, total_rows in self.file_stats_cache.items():
-            valid = max(0, total_rows - start_row + 1)
-            estimated_total_rows += valid
+        try: sheets = self.merge_sheets()
+        except (OSError, ValueError) as e: self.log(str(e), "ERROR"); return
+        estimated_total_rows = merge_estimate(self.file_stats_cache, start_row, sheets)
         self.log("-" * 40, "STATS")
         self.log(f"【即时统计】 数据开始行: {start_row}", "STATS")
         self.log(f"  - 参与文件: {total_files} 个", "STATS")
-        self.log(f"  - 预计合并总行数: {estimated_total_rows} 行", "STATS")
+        self.log(f"  - 合并总行数 (不含空行): {estimated_total_rows} 行", "STATS")
         self.log("-" * 40, "STATS")
 
     def run_merge_report_thread(self):
-        threading.Thread(target=self.generate_merge_report, daemon=True).start()
-
-    def generate_merge_report(self):
+        # 界面取值都在主线程读好再交给后台线程
         if not self.file_stats_cache: messagebox.showwarning("提示", "请先扫描文件夹"); return
         try: start_row = int(self.entry_merge_start_row.get())
         except: messagebox.showerror("错误", "起始行号无效"); return
+        files = self.merge_files_cache; templ = (self.current_template or files[0]) if files else None
+        args = (dict(self.file_stats_cache), start_row, templ, self.entry_merge_sheets.get())
+        threading.Thread(target=self.generate_merge_report, args=args, daemon=True).start()
+
+    def generate_merge_report(self, stats, start_row, templ, sheet_spec):
+        try: sheets = resolve_sheets(templ, sheet_spec) if templ else None
+        except (OSError, ValueError) as e: self.ui(messagebox.showerror, "错误", str(e)); return
         self.log("正在生成合并报告...", "INFO")
-        report = []
-        report.append("============ 📊 合并预估报告 ============")
-        report.append(f"基准起始行: {start_row}")
-        report.append(f"文件总数: {len(self.file_stats_cache)}")
-        report.append("-" * 45)
-        report.append(f"{'文件名':<30} | {'物理总行':<8} | {'预计贡献':<8}")
-        report.append("-" * 45)
-        total_valid = 0
-        for f_path, total_rows in self.file_stats_cache.items():
-            fname = os.path.basename(f_path)
-            valid = max(0, total_rows - start_row + 1)
-            total_valid += valid
-            dname = (fname[:25] + '..') if len(fname) > 25 else fname
-            report.append(f"{dname:<30} | {total_rows:<8} | {valid:<8}")
-        report.append("-" * 45)
-        report.append(f"【汇总】 预计合并后总行数: {total_valid}")
-        top = tk.Toplevel(self.root); top.title("合并分析报告"); top.geometry("600x700")
-        txt = scrolledtext.ScrolledText(top, font=("Consolas", 10))
-        txt.pack(fill="both", expand=True, padx=10, pady=10)
-        txt.insert(tk.END, "\n".join(report)); txt.config(state='disabled')
+        report = merge_report(stats, start_row, sheets)
+        self.ui(self.show_text_window, "合并分析报告", report, "600x700")
         self.log("合并报告已生成。", "SUCCESS")
 
     # ================= 拆分页面 =================
@@ -286,9 +375,15 @@ class ExcelToolApp:
         tk.Button(f_btns, text="📊 分析报告", command=self.run_analysis_thread, bg="#B0E0E6").pack(side="left", padx=2)
         tk.Label(frame_top, text="2. 数据开始行:", font=("Microsoft YaHei", 10, "bold")).grid(row=2, column=0, sticky="w", pady=(5, 2))
         self.entry_start_row = tk.Entry(frame_top, width=15, bg="#F0F8FF"); self.entry_start_row.insert(0, "9"); self.entry_start_row.grid(row=3, column=0, sticky="w")
-        tk.Label(frame_top, text="3. 拆分列号:", font=("Microsoft YaHei", 10, "bold")).grid(row=2, column=1, sticky="w", pady=(5, 2))
-        self.entry_split_col = tk.Entry(frame_top, width=15, bg="#F0F8FF"); self.entry_split_col.insert(0, "3"); self.entry_split_col.grid(row=3, column=1, sticky="w")
+        tk.Label(frame_top, text="3. 拆分列:", font=("Microsoft YaHei", 10, "bold")).grid(row=2, column=1, sticky="w", pady=(5, 2))
+        self.entry_split_col = tk.Entry(frame_top, width=24, bg="#F0F8FF"); self.entry_split_col.insert(0, "3"); self.entry_split_col.grid(row=3, column=1, sticky="w")
         tk.Label(frame_top, text="👈 点击下方预览表自动填充", fg="blue").grid(row=2, column=2, rowspan=2, columnspan=2, sticky="w", padx=10)
+        f_sheets = tk.Frame(frame_top); f_sheets.grid(row=4, column=0, columnspan=4, sticky="w", pady=(5, 0))
+        tk.Label(f_sheets, text="工作表:").pack(side="left")
+        self.entry_split_sheets = tk.Entry(f_sheets, width=20); self.entry_split_sheets.pack(side="left", padx=5)
+        tk.Label(f_sheets, text="(留空=活动表, *=全部, 逗号分隔表名或通配)", fg="gray").pack(side="left")
+        tk.Label(frame_top, text="拆分列: 3+5 为组合列, 3:对照表.csv 按对照表归组, 多种拆分以 ; 分隔 (一次读完, 各出一个子文件夹)",
+                 fg="gray").grid(row=5, column=0, columnspan=4, sticky="w")
         frame_middle = tk.Frame(frame); frame_middle.pack(fill="x", padx=10, pady=0)
         frame_mode = tk.LabelFrame(frame_middle, text="4. 拆分执行", padx=10, pady=5)
         frame_mode.pack(side="left", fill="both", expand=True, padx=(0, 5), pady=5)
@@ -297,10 +392,19 @@ class ExcelToolApp:
         rb_perf = tk.Radiobutton(frame_mode, text="完美 (推荐)", variable=self.split_mode, value="perfect", fg="#8A2BE2")
         rb_perf.pack(anchor="w"); 
         if not HAS_WIN32: rb_perf.config(state="disabled")
+        f_perf = tk.Frame(frame_mode); f_perf.pack(anchor="w", padx=20)
+        tk.Label(f_perf, text="引擎进程数:", fg="gray").pack(side="left")
+        self.perfect_workers = tk.IntVar(value=PERFECT_WORKERS)
+        tk.Spinbox(f_perf, from_=1, to=os.cpu_count() or 1, textvariable=self.perfect_workers, width=4).pack(side="left", padx=5)
+        tk.Radiobutton(frame_mode, text="完美·单遍 (无需引擎)", variable=self.split_mode, value="styled", fg="#2E8B57").pack(anchor="w")
+        self.split_resume = tk.BooleanVar(value=True) # 设定相同时接着上次未完成的输出目录做
+        tk.Checkbutton(frame_mode, text="断点续做 (跳过上次已写出的文件)", variable=self.split_resume).pack(anchor="w")
         tk.Button(frame_mode, text="开始执行拆分", command=self.process_split, bg="#e1f5fe", height=1).pack(fill="x", pady=5)
         frame_tools = tk.LabelFrame(frame_middle, text="5. 实用工具箱", padx=10, pady=5, fg="#2E8B57")
         frame_tools.pack(side="left", fill="both", expand=True, padx=(5, 0), pady=5)
-        tk.Button(frame_tools, text="🧹 强力清洗并另存", command=self.process_clean_save, bg="#98FB98", height=1).pack(anchor="center", fill="x", pady=10)
+        tk.Button(frame_tools, text="🧹 强力清洗并另存", command=self.process_clean_save, bg="#98FB98", height=1).pack(anchor="center", fill="x", pady=(10, 2))
+        self.clean_via_engine = tk.BooleanVar(value=False) # 默认单遍压缩，勾选后经 Excel/WPS (保留图表形状等)
+        tk.Checkbutton(frame_tools, text="经 Excel/WPS 清洗 (保留图表、形状，较慢)", variable=self.clean_via_engine).pack(anchor="w")
 
     # ================= 合并页面 =================
     def init_merge_tab(self):
@@ -316,15 +420,32 @@ class ExcelToolApp:
         self.entry_merge_start_row = tk.Entry(frame_btns, width=10, bg="#F0F8FF"); self.entry_merge_start_row.insert(0, "9"); self.entry_merge_start_row.pack(side="left", padx=5)
         tk.Button(frame_btns, text="📉 刷新统计", command=lambda: self.calculate_merge_stats(int(self.entry_merge_start_row.get() or 9)), bg="#E0FFFF").pack(side="left", padx=5)
         tk.Button(frame_btns, text="📊 合并报告", command=self.run_merge_report_thread, bg="#B0E0E6").pack(side="left", padx=5)
+        tk.Label(frame_btns, text="并行进程:").pack(side="left", padx=(10, 0))
+        self.merge_workers = tk.IntVar(value=MERGE_WORKERS)
+        tk.Spinbox(frame_btns, from_=1, to=os.cpu_count() or 1, textvariable=self.merge_workers, width=4).pack(side="left", padx=5)
+        self.merge_incremental = tk.BooleanVar(value=False) # 复用上次汇总表中未改动文件的行块 (在文件夹里记清单)
+        tk.Checkbutton(frame_btns, text="增量合并", variable=self.merge_incremental).pack(side="left", padx=5)
+        self.merge_align = tk.BooleanVar(value=False) # 按表头把各文件的列对齐到模板
+        tk.Checkbutton(frame_btns, text="按表头对齐列", variable=self.merge_align).pack(side="left", padx=5)
+        self.merge_dedup = tk.BooleanVar(value=False) # 跳过重复行
+        tk.Checkbutton(frame_btns, text="去重, 按列:", variable=self.merge_dedup).pack(side="left", padx=(5, 0))
+        self.entry_dedup_cols = tk.Entry(frame_btns, width=8); self.entry_dedup_cols.pack(side="left")
+        tk.Label(frame_btns, text="(留空=整行)", fg="gray").pack(side="left")
+        tk.Label(frame_btns, text="工作表:").pack(side="left", padx=(10, 0))
+        self.entry_merge_sheets = tk.Entry(frame_btns, width=10); self.entry_merge_sheets.pack(side="left")
+        tk.Label(frame_btns, text="(留空=活动表, *=全部)", fg="gray").pack(side="left")
 
         self.lbl_template = tk.Label(frame_top, text="当前模板: [未选择] (默认首个)", fg="gray"); self.lbl_template.grid(row=3, column=1, columnspan=2, sticky="w", padx=10)
+        frame_scan = tk.Frame(frame_top); frame_scan.grid(row=3, column=0, sticky="w")
+        tk.Button(frame_scan, text="⏹ 取消扫描", command=self.cancel_scan).pack(side="left")
+        self.lbl_scan_rate = tk.Label(frame_scan, text="", fg="gray"); self.lbl_scan_rate.pack(side="left", padx=5)
         tk.Button(frame_top, text="开始合并", command=self.process_merge, bg="#e1f5fe", height=2, width=20).grid(row=2, column=3, rowspan=2, padx=10)
 
         frame_list = tk.LabelFrame(frame, text="📄 待合并文件列表 (点击预览)", padx=10, pady=5)
         frame_list.pack(fill="both", expand=True, padx=20, pady=5)
 
         self.file_tree = ttk.Treeview(frame_list, show='headings', height=6)
-        self.file_tree['columns'] = ("idx", "filename", "total_rows", "valid_rows", "empty_rows", "cols", "size")
+        self.file_tree['columns'] = ("idx", "filename", "total_rows", "valid_rows", "empty_rows", "cols", "size", "header")
         self.file_tree.tag_configure('odd', background='white'); self.file_tree.tag_configure('even', background='#f9f9f9')
         self.file_tree.column("idx", width=40, anchor='center'); self.file_tree.heading("idx", text="序号")
         self.file_tree.column("filename", width=200, anchor='w'); self.file_tree.heading("filename", text="文件名")
@@ -333,6 +454,8 @@ class ExcelToolApp:
         self.file_tree.column("empty_rows", width=60); self.file_tree.heading("empty_rows", text="空行")
         self.file_tree.column("cols", width=50); self.file_tree.heading("cols", text="列数")
         self.file_tree.column("size", width=80); self.file_tree.heading("size", text="大小")
+        self.file_tree.column("header", width=130); self.file_tree.heading("header", text="表头 (对比模板)")
+        self.file_tree.tag_configure('mismatch', foreground='#C62828')
 
         vsb_f = ttk.Scrollbar(frame_list, orient="vertical", command=self.file_tree.yview); self.file_tree.configure(yscrollcommand=vsb_f.set)
         self.file_tree.pack(side="left", fill="both", expand=True); vsb_f.pack(side="right", fill="y")
@@ -344,40 +467,88 @@ class ExcelToolApp:
         if f: self.entry_file_path.delete(0, tk.END); self.entry_file_path.insert(0, f); self.load_preview(f)
     def select_folder_and_scan(self):
         d = filedialog.askdirectory()
-        if d: self.entry_folder_path.delete(0, tk.END); self.entry_folder_path.insert(0, d); threading.Thread(target=self.scan_merge_folder, daemon=True).start()
+        if d: self.entry_folder_path.delete(0, tk.END); self.entry_folder_path.insert(0, d); self.scan_merge_folder()
 
-    # --- V39 全景扫描逻辑 ---
-    def scan_merge_folder(self):
+    # --- V39 全景扫描逻辑 (后台进程池解析，主线程 after() 分批刷新) ---
+    def scan_merge_folder(self, on_done=None):
         folder = self.entry_folder_path.get()
         if not folder: return
+        if self.scan_job: self.scan_job["cancel"].set()
+        self.scan_job = None
         self.clear_log(); self.log(f"正在全景扫描: {folder}", "INFO")
         for item in self.file_tree.get_children(): self.file_tree.delete(item)
         self.merge_files_cache = []; self.file_stats_cache = {}; self.current_template = None; self.lbl_template.config(text="模板: [未选择]", fg="gray")
-        files = glob.glob(os.path.join(folder, "*.xlsx"))
-        files = [f for f in files if "汇总" not in os.path.basename(f) and not os.path.basename(f).startswith("~$")]
-        if not files: self.log("未找到 .xlsx 文件", "WARN"); return
-        self.log(f"发现 {len(files)} 个文件，开始深度分析...", "INFO")
-        for idx, f in enumerate(files):
-            try:
-                wb = openpyxl.load_workbook(f, read_only=True, data_only=True); ws = wb.active
-                total = 0; valid = 0; max_c = 0
-                for i, r in enumerate(ws.iter_rows(values_only=True)):
-                    if i > 30000: total = "30000+"; break
-                    total = i + 1
-                    if len(r) > max_c: max_c = len(r)
-                    if any(c is not None and str(c).strip() != "" for c in r): valid += 1
-                wb.close()
-                empty = 0
-                if isinstance(total, int): empty = total - valid
-                self.file_stats_cache[f] = total if isinstance(total, int) else 30000 # 缓存物理总行
-                sz = f"{round(os.path.getsize(f)/1024, 1)} KB"
-                tag = 'even' if idx%2==0 else 'odd'
-                self.file_tree.insert("", "end", values=(idx+1, os.path.basename(f), total, valid, empty, max_c, sz), tags=(tag,))
-                self.merge_files_cache.append(f)
-                if idx%5==0: self.root.update()
-            except Exception as e: self.log(f"扫描失败: {os.path.basename(f)}", "ERROR")
-        self.log("全景扫描完成。", "SUCCESS")
+        files = list_merge_files(folder)
+        if not files: self.log("未找到 .xlsx / .csv 文件", "WARN"); return
+        self.log(f"发现 {len(files)} 个文件，开始深度分析 ({SCAN_WORKERS} 进程)...", "INFO")
+        job = {"folder": folder, "files": files, "q": queue.Queue(), "cancel": threading.Event(), "results": {},
+               "seen": 0, "t0": time.perf_counter(), "on_done": on_done, "reader": self.reader_choice.get(),
+               "deep": self.deep_profile.get()}
+        self.scan_job = job
+        threading.Thread(target=self._scan_worker, args=(job,), daemon=True, name="scan").start()
+        self.root.after(SCAN_POLL_MS, self._drain_scan, job)
+
+    def cancel_scan(self):
+        if self.scan_job: self.scan_job["cancel"].set(); self.log("正在取消扫描...", "WARN")
+
+    def _scan_worker(self, job):
+        # 后台线程: 不碰任何 Tk 控件，结果只进队列
+        index = ScanIndex(job["folder"])
+        prof = RunProfile("scan", self.log, job["deep"], folder=job["folder"], files=len(job["files"]), workers=SCAN_WORKERS)
+        try: scan_files(job["files"], index, SCAN_WORKERS, lambda *a: job["q"].put(a), job["cancel"], job["reader"], prof)
+        finally:
+            index.save(job["files"]); job["hits"] = index.hits; job["misses"] = index.misses
+            prof.report(status="cancelled" if job["cancel"].is_set() else "ok")
+            job["q"].put(None)
+
+    def _file_row(self, idx, f, st):
+        sz = f"{round(os.path.getsize(f)/1024, 1)} KB"
+        return (idx+1, os.path.basename(f), st["total"], st["valid"], st["empty"], st["cols"], sz, "")
+
+    def _sheet_rows(self, item_id, idx, st):
+        # 多工作表的文件在其下逐表列出统计；子行序号与父行相同，点击时仍指向该文件
+        self.file_tree.delete(*self.file_tree.get_children(item_id))
+        if not st.get("sheets"): return
+        for name in st.get("sheet_names", []):
+            s = sheet_stats(st, name)
+            self.file_tree.insert(item_id, "end", values=(idx+1, f"  └ {name}", s["total"], s["valid"], s["empty"], s["cols"], "", ""))
+        self.file_tree.item(item_id, open=True)
+
+    def _drain_scan(self, job):
+        if job is not self.scan_job: return
+        done = False
+        for _ in range(SCAN_UI_BATCH):
+            try: item = job["q"].get_nowait()
+            except queue.Empty: break
+            if item is None: done = True; break
+            idx, f, st = item; job["seen"] += 1
+            if isinstance(st, Exception): self.log(f"扫描失败: {os.path.basename(f)}", "ERROR"); continue
+            tag = 'even' if len(job["results"])%2==0 else 'odd'
+            job["results"][idx] = (f, st, self.file_tree.insert("", "end", values=self._file_row(idx, f, st), tags=(tag,)))
+            self._sheet_rows(job["results"][idx][2], idx, st)
+        dt = time.perf_counter() - job["t0"]
+        self.lbl_scan_rate.config(text=f"{job['seen']}/{len(job['files'])} · {job['seen'] / dt if dt else 0:.1f} 文件/秒")
+        if done: self._finish_scan(job)
+        else: self.root.after(SCAN_POLL_MS, self._drain_scan, job)
+
+    def _finish_scan(self, job):
+        # 按原始顺序重排并重新编号，序号与 merge_files_cache 下标一一对应
+        for pos, idx in enumerate(sorted(job["results"])):
+            f, st, item_id = job["results"][idx]
+            self.file_tree.move(item_id, "", pos)
+            self.file_tree.item(item_id, values=self._file_row(pos, f, st), tags=('even' if pos%2==0 else 'odd',))
+            self._sheet_rows(item_id, pos, st)
+            self.file_stats_cache[f] = st
+            self.merge_files_cache.append(f)
+        self.scan_job = None
+        self.log(f"索引命中 {job.get('hits', 0)} 个，重新解析 {job.get('misses', 0)} 个", "STATS")
+        cancelled = job["cancel"].is_set()
+        self.op_log.write(op="scan", seconds=round(time.perf_counter() - job["t0"], 3), status="cancelled" if cancelled else "ok",
+                          folder=job["folder"], files=len(job["files"]), hits=job.get("hits", 0), misses=job.get("misses", 0))
+        if cancelled: self.log(f"扫描已取消，已完成 {len(self.merge_files_cache)} 个文件。", "WARN")
+        else: self.log("全景扫描完成。", "SUCCESS")
         if self.merge_files_cache: self.set_template(0)
+        if job["on_done"] and self.merge_files_cache and not cancelled: job["on_done"]()
 
     def on_file_list_click(self, event):
         row_id = self.file_tree.identify_row(event.y)
@@ -398,225 +569,146 @@ class ExcelToolApp:
             self.current_template = path
             self.lbl_template.config(text=f"当前模板: {os.path.basename(path)}", fg="#8A2BE2")
             self.load_preview(path)
+            self.refresh_header_check()
 
-    # --- 核心：修复与清理 ---
-    def sanitize_file(self, file_path):
-        if not HAS_WIN32: return file_path
-        abs_path = os.path.abspath(file_path)
-        temp_dir = os.path.join(os.path.dirname(abs_path), "_temp_repair")
-        if not os.path.exists(temp_dir): os.makedirs(temp_dir)
-        temp_path = os.path.join(temp_dir, os.path.basename(file_path).split('.')[0] + "_shadow.xlsx")
-        prog = self.get_active_app_name()
-        if not prog: return file_path
-        self.log(f"影子缓存 ({prog})...", "INFO")
-        app = None
+    def refresh_header_check(self):
+        """按当前模板和数据开始行比对各文件表头，结果写进文件列表的“表头”列。"""
+        files = self.merge_files_cache
+        if not files: return
+        try: start_row = int(self.entry_merge_start_row.get())
+        except: return
+        templ = self.current_template or files[0]
         try:
-            try: app = win32.Dispatch(prog)
-            except: app = win32.Dispatch('Ket.Application')
-            app.Visible = False; app.DisplayAlerts = False
-            wb = app.Workbooks.Open(abs_path); wb.SaveAs(temp_path, FileFormat=51); wb.Close(); app.Quit()
-            return temp_path
-        except: 
-            if app: 
-                try: app.Quit() 
-                except: pass
-            return file_path
+            sheets = self.merge_sheets(); sheet = sheets[0] if sheets else None   # 选了多个表时按第一个比对
+            has = [f for f in files if sheet is None or sheet in self.file_stats_cache.get(f, {}).get("sheet_names", [sheet])]
+            _, infos = align_columns(has, templ, start_row, self.reader_choice.get(), self.file_stats_cache, sheet)
+            infos = dict(zip(has, infos))
+        except Exception as e: self.log(f"表头比对失败: {e}", "ERROR"); return
+        bad = 0
+        for pos, (item, f) in enumerate(zip(self.file_tree.get_children(), files)):
+            text = describe_mismatch(infos[f]) if f in infos else f"无工作表 {sheet}"; bad += text != "一致"
+            self.file_tree.set(item, "header", text)
+            self.file_tree.item(item, tags=('mismatch' if text != "一致" else 'even' if pos%2==0 else 'odd',))
+        if bad: self.log(f"{bad} 个文件的表头与模板不一致 (见文件列表“表头”列)，可勾选“按表头对齐列”后合并。", "WARN")
+
+    def merge_sheets(self):
+        """合并页的工作表选择，按当前模板解析；留空返回 None (各文件的活动工作表)。"""
+        files = self.merge_files_cache
+        return resolve_sheets(self.current_template or files[0], self.entry_merge_sheets.get()) if files else None
 
+    # --- 核心：修复与清理 ---
     def process_clean_save(self):
         f = self.entry_file_path.get()
         if not f: return
         self.clear_log(); self.log("开始强力清洗...", "INFO")
-        if not HAS_WIN32: messagebox.showerror("错", "需Excel/WPS"); return
-        prog = self.get_active_app_name(); 
-        if not prog: return
-        threading.Thread(target=self.run_native_clean, args=(f, prog), daemon=True).start()
+        prog = None
+        if self.clean_via_engine.get():
+            prog = self.get_active_app_name()
+            if not has_engine(prog): messagebox.showerror("错", "需Excel/WPS"); return
+        threading.Thread(target=self.run_clean_job, args=(f, prog, self.deep_profile.get()), daemon=True, name="clean").start()
 
-    def run_native_clean(self, file_path, prog_id):
-        app = None
+    def run_clean_job(self, file_path, prog_id, deep):
         try:
-            try: app = win32.Dispatch(prog_id)
-            except: app = win32.Dispatch('Ket.Application')
-            app.Visible = False; app.DisplayAlerts = False
-            dir_name = os.path.dirname(file_path); base_name = os.path.basename(file_path)
-            ts = datetime.datetime.now().strftime("%H%M%S")
-            nm = f"{os.path.splitext(base_name)[0]}_清洗_{ts}.xlsx"
-            wb = app.Workbooks.Open(os.path.abspath(file_path)); ws = wb.ActiveSheet
-            mr = ws.UsedRange.Rows.Count + ws.UsedRange.Row - 1
-            mc = ws.UsedRange.Columns.Count + ws.UsedRange.Column - 1
-            self.log("扫描并删除空行/列...", "INFO")
-            for r in range(mr, 0, -1):
-                if app.WorksheetFunction.CountA(ws.Rows(r)) == 0: ws.Rows(r).Delete()
-            for c in range(mc, 0, -1):
-                if app.WorksheetFunction.CountA(ws.Columns(c)) == 0: ws.Columns(c).Delete()
-            wb.SaveAs(os.path.join(dir_name, nm), FileFormat=51); wb.Close(); app.Quit()
+            with self.op_log.op("clean", file=file_path, engine=prog_id or "native"), \
+                 RunProfile("clean", self.log, deep, file=file_path, engine=prog_id or "native") as prof:
+                out = run_clean(file_path, prog_id, log=self.log, prof=prof); nm = os.path.basename(out)
             self.log(f"完成: {nm}", "SUCCESS")
-            self.ask_open_folder(dir_name, f"清洗完成: {nm}")
-        except Exception as e:
-            self.log(f"清洗失败: {e}", "ERROR")
-            if app: 
-                try: app.Quit() 
-                except: pass
+            self.ask_open_folder(os.path.dirname(out), f"清洗完成: {nm}")
+        except Exception as e: self.log(f"清洗失败: {e}", "ERROR")
 
     # --- 拆分 ---
-    def run_analysis_thread(self): threading.Thread(target=self.generate_analysis_report, daemon=True).start()
-    def generate_analysis_report(self):
+    def run_analysis_thread(self):
+        # 界面取值都在主线程读好再交给后台线程
         f = self.entry_file_path.get()
         if not f: return
-        try: start_row=int(self.entry_start_row.get()); col_idx=int(self.entry_split_col.get())
+        try: start_row=int(self.entry_start_row.get())
         except: return
+        col_idx = self.split_keys()
+        if not col_idx: return
+        args = (f, start_row, col_idx, self.reader_choice.get(), self.entry_split_sheets.get())
+        threading.Thread(target=self.generate_analysis_report, args=args, daemon=True).start()
+
+    def generate_analysis_report(self, f, start_row, col_idx, reader, sheet_spec):
         self.log("分析中...", "INFO")
         try:
-            wb = openpyxl.load_workbook(f, read_only=True, data_only=True); ws = wb.active
-            total, data_cnt, vals = 0, 0, []
-            for i, r in enumerate(ws.iter_rows(values_only=True)):
-                if i>20000: total="20000+"; break
-                total=i+1
-                if i+1>=start_row:
-                    v = r[col_idx-1] if col_idx-1<len(r) else None
-                    if v: vals.append(str(v).strip())
-            wb.close()
-            counter = Counter(vals)
-            rep = [f"文件: {os.path.basename(f)}", f"扫描: {total}", f"有效: {data_cnt}", "-"*30, "【分类预览】"]
-            for k, v in counter.most_common(): rep.append(f"{k} : {v}")
-            top = tk.Toplevel(self.root); txt = scrolledtext.ScrolledText(top); txt.pack(fill="both")
-            txt.insert(tk.END, "\n".join(rep))
+            with self.op_log.op("analysis", file=f, start_row=start_row, col=col_idx):
+                st = cached_stats(f, reader, histogram_cols(col_idx)); rep = []
+                for s in resolve_sheets(f, sheet_spec) or [None]:
+                    rep += ([""] if rep else []) + analysis_report(f, start_row, col_idx, reader, st, s)
+            self.ui(self.show_text_window, "分析报告", rep)
         except Exception as e: self.log(f"错: {e}", "ERROR")
 
+    def split_keys(self):
+        """校验拆分列说明，返回原文 (各处按同一说明解析)；无效时记错误并返回 None。"""
+        spec = self.entry_split_col.get().strip()
+        try: parse_split_keys(spec); return spec
+        except (OSError, ValueError) as e: self.log(f"拆分列: {e}", "ERROR")
+
     def process_split(self):
         self.clear_log()
         f = self.entry_file_path.get()
         if not f: return
-        try: start_row=int(self.entry_start_row.get()); col_idx=int(self.entry_split_col.get())
+        try: start_row=int(self.entry_start_row.get())
         except: return
-        mode = self.split_mode.get()
-        ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        out_dir = os.path.join(os.path.dirname(f), f"拆分结果_{ts}")
-        if not os.path.exists(out_dir): os.makedirs(out_dir)
+        col_idx = self.split_keys()
+        if not col_idx: return
+        try: workers = max(1, int(self.perfect_workers.get()))
+        except: workers = PERFECT_WORKERS
+        args = (f, start_row, col_idx, self.split_mode.get(), self.reader_choice.get(), self.get_active_app_name(), workers,
+                self.deep_profile.get(), self.entry_split_sheets.get().strip() or None, self.split_resume.get(),
+                self.out_format.get(), self.out_encoding.get().strip() or CSV_ENCODING)
+        self.start_job(self.run_split_job, args, "split")
+
+    def run_split_job(self, f, start_row, col_idx, mode, reader, prog_id, workers, deep, sheets, resume, fmt, encoding, cancel):
         try:
-            cnt = 0
-            if mode == "fast": cnt = self.run_fast_split(f, start_row, col_idx, out_dir, ts)
-            else: cnt = self.run_perfect_split(f, start_row, col_idx, out_dir, ts)
+            with self.op_log.op("split", file=f, mode=mode, reader=reader, start_row=start_row, col=col_idx, workers=workers,
+                                sheets=sheets, resume=resume, format=fmt) as rec, \
+                 RunProfile("split", self.log, deep, file=f, mode=mode, reader=reader, workers=workers, format=fmt) as prof:
+                out_dir, cnt = run_split(f, start_row, col_idx, mode, reader=reader, prog_id=prog_id, log=self.log, workers=workers,
+                                         prof=prof, sheets=sheets, resume=resume, cancel=cancel, fmt=fmt, encoding=encoding)
+                rec["outputs"] = cnt
             self.ask_open_folder(out_dir, f"拆分完成！生成 {cnt} 个文件。")
+        except JobCancelled as e: self.log(f"拆分已停止: {e}", "WARN")
         except Exception as e: self.log(f"错: {e}", "ERROR")
 
-    def run_fast_split(self, f, start, col, out, ts):
-        self.log("极速模式...", "INFO")
-        wb = openpyxl.load_workbook(f, read_only=True, data_only=True); ws = wb.active
-        h, d = [], []
-        for i, r in enumerate(ws.iter_rows(values_only=True)):
-            if i+1 < start: h.append(r)
-            else: d.append(r)
-        wb.close()
-        m = {}
-        for r in d:
-            v = r[col-1] if col-1 < len(r) else None
-            if v: 
-                if v not in m: m[v] = []
-                m[v].append(r)
-        cnt = 0
-        for k, v in m.items():
-            n = str(k).replace('/', '_').strip()
-            nb = openpyxl.Workbook(); ns = nb.active
-            for r in h: ns.append(r)
-            for r in v: ns.append(r)
-            ns.sheet_format.defaultRowHeight = 25
-            nb.save(os.path.join(out, f"{n}_极速_{ts}.xlsx")); self.log(f"生成: {n}", "SUCCESS"); cnt+=1
-        return cnt
-
-    def run_perfect_split(self, original_file, start_row, col_idx, output_dir, timestamp):
-        prog_id = self.get_active_app_name()
-        if not prog_id: self.log("无引擎", "ERROR"); return
-        self.log(f">>> 完美模式 ({prog_id})...", "ENGINE")
-        shadow_file = self.sanitize_file(original_file)
-        temp_made = (shadow_file != original_file)
-        wb_scan = openpyxl.load_workbook(shadow_file, read_only=True, data_only=True); ws_scan = wb_scan.active
-        real_max_row = 0; row_data_map = {}
-        for i, r in enumerate(ws_scan.iter_rows(values_only=True)):
-            row_num = i+1
-            if row_num >= start_row:
-                val = r[col_idx-1] if col_idx-1<len(r) else None
-                if val: real_max_row = row_num; row_data_map[row_num] = str(val).strip()
-        wb_scan.close()
-        targets = set(row_data_map.values())
-        self.log(f"有效数据截止: {real_max_row} 行", "INFO")
-        app = None; count = 0
-        try:
-            try: app = win32.Dispatch(prog_id)
-            except: app = win32.Dispatch('Ket.Application')
-            app.Visible = False; app.DisplayAlerts = False
-            _, ext = os.path.splitext(original_file)
-            for idx, target_val in enumerate(targets):
-                safe_name = str(target_val).replace('/', '_').strip()
-                t_file = f"{safe_name}{ext}"
-                t_path = os.path.join(output_dir, t_file)
-                self.log(f"[{idx+1}/{len(targets)}] {t_file}", "INFO")
-                shutil.copy2(original_file, t_path)
-                wb = app.Workbooks.Open(os.path.abspath(t_path)); ws = wb.ActiveSheet
-                if real_max_row < 1048576:
-                    try: ws.Range(f"A{real_max_row+1}:A1048576").EntireRow.Delete()
-                    except: pass
-                app.ScreenUpdating = False
-                del_rng = None; bat = 0
-                for r in range(real_max_row, start_row-1, -1):
-                    owner = row_data_map.get(r)
-                    should_del = False
-                    if owner and owner != target_val: should_del = True
-                    elif not owner: should_del = True 
-                    if should_del:
-                        if not del_rng: del_rng = ws.Rows(r)
-                        else: del_rng = app.Union(del_rng, ws.Rows(r))
-                        bat += 1
-                    if bat >= 50: del_rng.Delete(); del_rng = None; bat = 0
-                if del_rng: del_rng.Delete()
-                app.ScreenUpdating = True
-                wb.Save(); wb.Close(); count += 1
-            app.Quit()
-        except Exception as e:
-            self.log(f"引擎错: {e}", "ERROR"); 
-            if app: 
-                try: app.Quit() 
-                except: pass
-        if temp_made: 
-            try: shutil.rmtree(os.path.dirname(shadow_file)) 
-            except: pass
-        return count
-
     # --- 合并 ---
     def process_merge(self):
         folder = self.entry_folder_path.get()
         if not folder: return
-        if not self.merge_files_cache: self.scan_merge_folder()
+        if self.scan_job: self.log("扫描尚未完成，请稍候。", "WARN"); return
+        if not self.merge_files_cache: self.scan_merge_folder(on_done=self.process_merge); return
         files = self.merge_files_cache
         if not files: return
         try: start_row = int(self.entry_merge_start_row.get())
         except: return
         templ = self.current_template if self.current_template else files[0]
-        ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        self.log(f"合并中... 模板: {os.path.basename(templ)}", "INFO")
+        try: workers = max(1, int(self.merge_workers.get()))
+        except: workers = MERGE_WORKERS
+        try: key_cols = parse_key_cols(self.entry_dedup_cols.get())
+        except ValueError as e: messagebox.showerror("错误", str(e)); return
+        opts = {"incremental": self.merge_incremental.get(), "align": self.merge_align.get(), "stats": dict(self.file_stats_cache),
+                "dedup": self.merge_dedup.get(), "key_cols": key_cols, "sheets": self.entry_merge_sheets.get().strip() or None,
+                "fmt": self.out_format.get(), "encoding": self.out_encoding.get().strip() or CSV_ENCODING}
+        args = (folder, start_row, list(files), templ, workers, self.reader_choice.get(), opts, self.deep_profile.get())
+        self.start_job(self.run_merge_job, args, "merge")
+
+    def run_merge_job(self, folder, start_row, files, templ, workers, reader, opts, deep, cancel):
         try:
-            save_name = f"合并汇总表_{ts}.xlsx"
-            save_path = os.path.join(folder, save_name)
-            if HAS_WIN32:
-                # 为了防止模板带脏数据，可以先清洗再copy
-                # 但为了速度，这里直接copy，假设模板是好的
-                shutil.copy2(templ, save_path)
-            else: shutil.copy2(templ, save_path)
-            main_wb = openpyxl.load_workbook(save_path); main_ws = main_wb.active
-            if main_ws.max_row >= start_row: main_ws.delete_rows(start_row, amount=main_ws.max_row - start_row + 1)
-            cnt = 0
-            for idx, f in enumerate(files):
-                self.log(f"[{idx+1}/{len(files)}] 读取: {os.path.basename(f)}", "INFO")
-                wb_src = openpyxl.load_workbook(f, read_only=True, data_only=True); ws_src = wb_src.active
-                for i, r in enumerate(ws_src.iter_rows(values_only=True)):
-                    if i+1 >= start_row and any(c is not None and str(c).strip()!="" for c in r):
-                        main_ws.append(r); cnt+=1
-                wb_src.close()
-            main_ws.sheet_format.defaultRowHeight = 25
-            main_wb.save(save_path)
+            t0 = time.perf_counter()
+            with self.op_log.op("merge", folder=folder, files=len(files), workers=workers, reader=reader, start_row=start_row,
+                                incremental=opts["incremental"], align=opts["align"], dedup=opts["dedup"], sheets=opts["sheets"],
+                                format=opts["fmt"]) as rec, \
+                 RunProfile("merge", self.log, deep, folder=folder, files=len(files), workers=workers, reader=reader, format=opts["fmt"]) as prof:
+                save_path, cnt = run_merge(folder, start_row, files, templ, workers, reader, log=self.log, prof=prof, cancel=cancel, **opts)
+                rec["rows"] = cnt
+            dt = time.perf_counter() - t0
+            self.log(f"合并耗时 {dt:.1f} 秒 ({workers} 进程, {cnt / dt if dt else 0:.0f} 行/秒)", "STATS")
             self.ask_open_folder(os.path.dirname(save_path), f"合并完成！共 {cnt} 行。")
+        except JobCancelled as e: self.log(f"合并已停止: {e}", "WARN")
         except Exception as e: self.log(f"合并错: {e}", "ERROR")
 
 if __name__ == "__main__":
+    import multiprocessing; multiprocessing.freeze_support()
     root = tk.Tk()
     app = ExcelToolApp(root)
     root.mainloop()
\ No newline at end of file
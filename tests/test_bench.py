@@ -0,0 +1,24 @@
+"""基准测试的内存按用例计: 不受父进程峰值影响，重的用例明显高于轻的；合并用例不动回收文件夹。"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import bench_excel as bench
+
+
+def test_case_memory_is_per_case(tmp_path):
+    master, folder = bench.prepare_data(str(tmp_path), 3000, 2)
+    hog = b"x" * (300 << 20)     # 父进程先占 300 MB，Linux 上 ru_maxrss 会被子进程继承
+    light = bench.run_case("preview", master, folder, "xml", 1, 3000)
+    heavy = bench.run_case("split_styled", master, folder, "openpyxl", 1, 3000)
+    del hog
+    assert light["mem_mb"] is not None and heavy["mem_mb"] is not None
+    assert light["mem_mb"] < 50
+    assert light["mem_mb"] * 2 < heavy["mem_mb"]
+
+
+def test_merge_cases_leave_sources_untouched(tmp_path):
+    master, folder = bench.prepare_data(str(tmp_path), 300, 2)
+    before = sorted(os.listdir(folder))
+    for case in ("merge", "merge_dedup"): bench.run_case(case, master, folder, "xml", 1, 300)
+    assert sorted(os.listdir(folder)) == before
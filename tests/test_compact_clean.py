@@ -0,0 +1,55 @@
+"""不经引擎的清洗 (compact_clean): 删掉全空的行和列，公式、合并单元格、列宽、条件格式、数据验证、定义名称随之改写。"""
+import os
+import sys
+
+import openpyxl
+from openpyxl.formatting.rule import CellIsRule
+from openpyxl.styles import PatternFill
+from openpyxl.workbook.defined_name import DefinedName
+from openpyxl.worksheet.datavalidation import DataValidation
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import excel_core as core
+
+
+def make_book(path):
+    """B、D 列和第 3、5 行全空。"""
+    wb = openpyxl.Workbook(); ws = wb.active; ws.title = "明细"
+    ws["A1"], ws["C1"], ws["E1"] = "区", "值", "两倍"
+    for r, k, v in ((2, "甲", 1), (4, "乙", 2), (6, "丙", 3)): ws[f"A{r}"], ws[f"C{r}"], ws[f"E{r}"] = k, v, f"=C{r}*2"
+    ws["A7"], ws["C7"], ws["E7"] = "合计", "=SUM(C2:C6)", "=C3"      # C3 在被删的空行里
+    ws["A8"] = "备注"; ws.merge_cells("A8:C8")
+    ws.column_dimensions["C"].width = 20; ws.freeze_panes = "A2"
+    dv = DataValidation(type="whole", operator="between", formula1="0", formula2="$C$7"); dv.add("C2:C6"); ws.add_data_validation(dv)
+    ws.conditional_formatting.add("C2:C6", CellIsRule(operator="greaterThan", formula=["$C$2"], fill=PatternFill("solid", fgColor="FFFF00")))
+    wb.defined_names["总计"] = DefinedName("总计", attr_text="'明细'!$C$7")
+    other = wb.create_sheet("汇总"); other["A1"] = "=明细!C4"; other["A2"] = "=SUM(明细!C:C)"
+    wb.save(path)
+
+
+def test_compact_clean(tmp_path):
+    src = str(tmp_path / "表.xlsx"); make_book(src)
+    out = core.compact_clean(src)
+    assert out != src and os.path.dirname(out) == str(tmp_path)
+    wb = openpyxl.load_workbook(out); ws = wb["明细"]
+    assert [list(r) for r in ws.iter_rows(values_only=True)] == [
+        ["区", "值", "两倍"], ["甲", 1, "=B2*2"], ["乙", 2, "=B3*2"], ["丙", 3, "=B4*2"],
+        ["合计", "=SUM(B2:B4)", "=#REF!"], ["备注", None, None]]
+    assert [str(m) for m in ws.merged_cells.ranges] == ["A6:B6"]
+    assert ws.column_dimensions["B"].width == 20 and ws.freeze_panes == "A2"
+    dv = ws.data_validations.dataValidation[0]
+    assert str(dv.sqref) == "B2:B4" and dv.formula2 == "$B$5"
+    (rng, rules), = ws.conditional_formatting._cf_rules.items()
+    assert str(rng.sqref) == "B2:B4" and rules[0].formula == ["$B$2"]
+    assert wb.defined_names["总计"].attr_text == "'明细'!$B$5"
+    assert [c.value for c in wb["汇总"]["A"]] == ["=明细!B3", "=SUM(明细!B:B)"]
+    assert openpyxl.load_workbook(src)["明细"]["E7"].value == "=C3"          # 原文件不动
+
+
+def test_compactor_refs():
+    cp = core._Compactor("表", rows=[1, 2, 4, 6], cols=[1, 3], max_row=6, max_col=3)
+    assert cp.formula("=A4+C6", "表") == "=A3+B4"
+    assert cp.formula("=A3", "表") == "=#REF!" and cp.formula("=SUM(A3:A5)", "表") == "=SUM(A3:A3)"
+    assert cp.formula("=B:B", "表") == "=#REF!" and cp.formula("=A1:C1", "表") == "=A1:B1"
+    assert cp.formula("=其他!A4", "表") == "=其他!A4" and cp.formula("=表!A4", "其他") == "=表!A3"
+    assert cp.formula("=VLOOKUP(x,名称,2)", "表") == "=VLOOKUP(x,名称,2)"
@@ -0,0 +1,89 @@
+"""引擎池借还与崩溃回收、多引擎进程完美拆分与单进程结果一致 (用模拟引擎 FakeApp)。"""
+import os
+import sys
+import threading
+
+import openpyxl
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import bench_excel as bench
+import excel_core as core
+
+P = core.FAKE_PROG_ID
+
+
+def make_pool(*apps, size=1):
+    """依次借出给定的实例 (用完再启动普通的 FakeApp)。"""
+    apps = list(apps)
+    return core.EnginePool(size=size, launch=lambda prog_id: apps.pop(0) if apps else core.FakeApp(crash_rate=0))
+
+
+@pytest.fixture
+def book(tmp_path):
+    path = str(tmp_path / "总表.xlsx")
+    bench.make_workbook(path, 60, 3)
+    return path
+
+
+def test_acquire_release_reuses_instance():
+    pool = make_pool()
+    key, app = pool.acquire(P)
+    pool.release(key, app)
+    key2, app2 = pool.acquire(P)
+    assert key2 == key and app2 is app
+    assert pool.counters == {"launched": 1, "reused": 1, "discarded": 0}
+    pool.release(key2, app2); pool.shutdown()
+    assert not app.alive and pool.live[key] == 0
+
+
+def test_acquire_waits_when_pool_full():
+    pool = make_pool(); key, app = pool.acquire(P); got = []
+    t = threading.Thread(target=lambda: got.append(pool.acquire(P))); t.start()
+    t.join(0.3)
+    assert t.is_alive() and not got          # 唯一的实例已借出，只能等
+    pool.release(key, app); t.join(5)
+    assert got and got[0][1] is app
+
+
+def test_session_closes_only_books_it_opened(book, tmp_path):
+    pool = make_pool(); key, app = pool.acquire(P)
+    personal = str(tmp_path / "个人宏.xlsx"); bench.make_workbook(personal, 1)
+    app.Workbooks.Open(personal); pool.release(key, app, keep=core._open_books(app))
+    with pool.session(P) as a:
+        assert a is app
+        a.Workbooks.Open(book)
+    assert core._open_books(app) == {os.path.abspath(personal)}
+
+
+def test_crashed_instance_is_discarded_and_relaunched(book):
+    pool = make_pool()
+    with pytest.raises(core.FakeComError):
+        with pool.session(P) as app:
+            app.Workbooks.Open(book); app.alive = False      # 任务做到一半引擎崩溃
+            app.Workbooks.Open(book)
+    assert pool.counters["discarded"] == 1
+    with pool.session(P) as app2: assert app2 is not app and app2.alive
+    assert pool.counters["launched"] == 2
+
+
+def test_perfect_target_retries_on_fresh_instance(book, tmp_path):
+    # 第一个实例打开工作簿即崩溃，换新实例重试后完成
+    pool = make_pool(core.FakeApp(crash_rate=1)); keys = core.parse_split_keys(bench.KEY_COL)
+    owners = core._split_owners(book, bench.START_ROW, keys)[0]
+    target = next(iter(owners[None][0].values())); out = str(tmp_path / "out.xlsx")
+    dt, err, retries, tm = core._perfect_target(pool, P, book, out, target, owners, bench.START_ROW)
+    assert err is None and retries == 1 and os.path.exists(out)
+    assert pool.counters == {"launched": 2, "reused": 0, "discarded": 1}
+
+
+def test_parallel_perfect_split_matches_serial(book, tmp_path):
+    outs = []
+    for w in (1, 2):
+        out = tmp_path / f"w{w}"; out.mkdir(); outs.append(out)
+        assert core.perfect_split(book, bench.START_ROW, bench.KEY_COL, str(out), P, pool=make_pool(), workers=w) > 1
+    names = sorted(os.listdir(outs[0]))
+    assert names == sorted(os.listdir(outs[1]))
+    for f in names:
+        a, b = (list(openpyxl.load_workbook(o / f).active.iter_rows(values_only=True)) for o in outs)
+        assert a == b, f
@@ -0,0 +1,70 @@
+"""平面格式 (CSV / TSV / Parquet / Arrow) 的读写: 取值与 xlsx 输出一致，Parquet / Arrow 列变宽或类型变了时重写已写部分。"""
+import csv
+import datetime
+import os
+import sys
+
+import openpyxl
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import bench_excel as bench
+import excel_core as core
+
+
+def read_back(path):
+    with core.open_reader(path) as rd: return [list(r) for r in rd.iter_rows()]
+
+
+def test_csv_reader_keeps_ids_as_text(tmp_path):
+    path = str(tmp_path / "表.csv")
+    with open(path, "w", encoding="gb18030", newline="") as fp:
+        csv.writer(fp).writerows([["编号", "身份证", "金额", "名称"], ["007", "110101199001011234", "12.50", "东城区"],
+                                  ["8", "", "-3", ""]])
+    assert read_back(path) == [["编号", "身份证", "金额", "名称"], ["007", "110101199001011234", 12.5, "东城区"], [8, None, -3, None]]
+
+
+@pytest.mark.parametrize("fmt,encoding", [("csv", core.CSV_ENCODING), ("tsv", "gb18030")])
+def test_split_to_text_matches_xlsx(tmp_path, fmt, encoding):
+    master = str(tmp_path / "总表.xlsx"); bench.make_workbook(master, 300, 6)
+    xl, flat = tmp_path / "xlsx", tmp_path / fmt; xl.mkdir(); flat.mkdir()
+    core.stream_split(master, bench.START_ROW, bench.KEY_COL, str(xl), "t")
+    n = core.stream_split(master, bench.START_ROW, bench.KEY_COL, str(flat), "t", fmt=fmt, encoding=encoding)
+    assert n == len(os.listdir(flat)) == len(os.listdir(xl))
+    for f in os.listdir(xl):
+        ws = openpyxl.load_workbook(xl / f).active
+        want = [[c.value for c in ws[bench.HEADER_ROWS]]]          # 首行为表头标签，日期写成文本
+        want += [[v if v is None or isinstance(v, (int, float)) else str(v) for v in r]
+                 for r in ws.iter_rows(min_row=bench.START_ROW, values_only=True)]
+        assert read_back(str(flat / f.replace(".xlsx", "." + fmt))) == want
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_arrow_writer_widens_and_retypes(tmp_path, monkeypatch, fmt):
+    pa = pytest.importorskip("pyarrow"); import pyarrow.parquet
+    monkeypatch.setattr(core, "FLAT_BATCH_ROWS", 2); logs = []
+    path = str(tmp_path / f"表.{fmt}")
+    w = core.FlatWriter(path, fmt, ["序号", "日期"], log=lambda m, level="INFO": logs.append(m))
+    day = datetime.date(2024, 1, 1)
+    for r in [(1, day), (2, day), (3.5, day, True), (4, None), ("备注", day)]: w.append(r)
+    w.close()
+    if fmt == "parquet": t = pyarrow.parquet.read_table(path)
+    else:
+        with pa.OSFile(path) as src: t = pa.ipc.open_file(src).read_all()
+    assert t.column_names == ["序号", "日期", "列3"]
+    assert t.column(0).to_pylist() == ["1", "2", "3.5", "4", "备注"]
+    assert t.column(1).to_pylist() == [day, day, day, None, day] and str(t.schema.field(1).type) == "date32[day]"
+    assert t.column(2).to_pylist() == [None, None, True, None, None]
+    assert len(logs) == 2               # 第二批加宽 (小数)，第三批改成字符串，各重写一次
+
+
+def test_merge_to_csv_mixes_sources(tmp_path):
+    folder = tmp_path / "回收"; folder.mkdir()
+    bench.make_workbook(str(folder / "区0.xlsx"), 40, 1)
+    with core.open_reader(str(folder / "区0.xlsx")) as rd, open(folder / "区1.csv", "w", encoding="gb18030", newline="") as fp:
+        csv.writer(fp).writerows(rd.iter_rows())
+    files = sorted(core.list_merge_files(str(folder))); save = str(tmp_path / "汇总.csv")
+    n = core.incremental_merge(str(folder), files, files[0], save, bench.START_ROW, fmt="csv")
+    rows = read_back(save)
+    assert n == len(rows) - 1 and rows[1:n // 2 + 1] == rows[n // 2 + 1:]
+    assert not os.path.exists(save + ".part")
@@ -0,0 +1,86 @@
+"""取消与续做: 第一批完成后取消，续做时跳过已完成的输出，最终结果与一次做完相同。"""
+import os
+import sys
+import threading
+
+import openpyxl
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import bench_excel as bench
+import excel_core as core
+
+
+def contents(out_dir, ts=None):
+    """输出目录里 {文件名 (去掉时间戳): 各行取值}，不含检查点日志。"""
+    got = {}
+    for f in os.listdir(out_dir):
+        if f == core.JOB_JOURNAL_NAME: continue
+        got[f.replace(f"_{ts}", "") if ts else f] = list(openpyxl.load_workbook(os.path.join(out_dir, f)).active.iter_rows(values_only=True))
+    return got
+
+
+@pytest.fixture
+def master(tmp_path):
+    path = str(tmp_path / "总表.xlsx")
+    bench.make_workbook(path, 200, 4)
+    return path
+
+
+@pytest.mark.parametrize("mode", ["fast", "styled", "perfect"])
+def test_split_cancel_then_resume(master, tmp_path, monkeypatch, mode):
+    prog_id = core.FAKE_PROG_ID if mode == "perfect" else None
+    full_dir, n = core.run_split(master, bench.START_ROW, bench.KEY_COL, mode, str(tmp_path / "一次做完"), prog_id=prog_id)
+
+    cancel = threading.Event(); mark = core.JobJournal.mark
+    def mark_then_cancel(self, name, **info): mark(self, name, **info); cancel.set()   # 第一个文件写完即取消
+    monkeypatch.setattr(core.JobJournal, "mark", mark_then_cancel)
+    out = str(tmp_path / "中断")
+    with pytest.raises(core.JobCancelled):
+        core.run_split(master, bench.START_ROW, bench.KEY_COL, mode, out, prog_id=prog_id, cancel=cancel)
+    first = core.read_journal(out)[1]
+    assert len(first) == 1 and not core.read_journal(out)[2]
+    name = next(iter(first)); mtime = os.stat(os.path.join(out, name)).st_mtime_ns
+
+    monkeypatch.setattr(core.JobJournal, "mark", mark); logs = []
+    _, cnt = core.run_split(master, bench.START_ROW, bench.KEY_COL, mode, out, prog_id=prog_id, resume=True,
+                            log=lambda m, level="INFO": logs.append(m))
+    assert cnt == n and any("已完成 1 个文件" in m for m in logs)
+    assert os.stat(os.path.join(out, name)).st_mtime_ns == mtime          # 已完成的没有重写
+    assert core.read_journal(out)[2]
+    ts = lambda d: core.read_journal(d)[0]["meta"]["ts"]
+    assert contents(out, ts(out)) == contents(full_dir, ts(full_dir))
+
+
+def test_merge_cancel_then_resume(tmp_path):
+    folder = tmp_path / "回收"; folder.mkdir()
+    for i in range(4): bench.make_workbook(str(folder / f"区{i}.xlsx"), 50, seed=i + 1)
+    files = sorted(core.list_merge_files(str(folder)))
+    full = str(tmp_path / "完整.xlsx")
+    n = core.incremental_merge(str(folder), files, files[0], full, bench.START_ROW)
+
+    cancel = threading.Event()
+    def log(m, level="INFO"):
+        if m.startswith("[2/"): cancel.set()       # 第一个文件读完、第二个开始时取消
+    save = str(folder / "合并汇总表_1.xlsx")
+    with pytest.raises(core.JobCancelled):
+        core.incremental_merge(str(folder), files, files[0], save, bench.START_ROW, log=log, reuse=True, cancel=cancel)
+    part = str(folder / "合并汇总表_1_未完成.xlsx")
+    assert os.path.exists(part) and not os.path.exists(save)
+    assert [e["name"] for e in core.load_merge_manifest(str(folder))["files"]] == ["区0.xlsx"]
+
+    logs = []; save = str(folder / "合并汇总表_2.xlsx")
+    assert core.incremental_merge(str(folder), files, files[0], save, bench.START_ROW, reuse=True,
+                                  log=lambda m, level="INFO": logs.append(m)) == n
+    assert any("复用已完成的 1 个文件" in m for m in logs) and not os.path.exists(part)
+    rows = lambda p: list(openpyxl.load_workbook(p).active.iter_rows(values_only=True))
+    assert rows(save) == rows(full)
+
+
+def test_plain_merge_cancel_leaves_nothing(tmp_path):
+    folder = tmp_path / "回收"; folder.mkdir()
+    for i in range(3): bench.make_workbook(str(folder / f"区{i}.xlsx"), 30, seed=i + 1)
+    files = sorted(core.list_merge_files(str(folder))); cancel = threading.Event(); cancel.set()
+    with pytest.raises(core.JobCancelled):
+        core.run_merge(str(folder), bench.START_ROW, files, cancel=cancel)
+    assert sorted(os.listdir(folder)) == ["区0.xlsx", "区1.xlsx", "区2.xlsx"]
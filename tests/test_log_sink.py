@@ -0,0 +1,88 @@
+"""日志与界面队列: 后台线程只入队，主线程定时批量写进日志框；JSON Lines 日志线程安全，每个操作记一行耗时。
+不创建 Tk 窗口，日志框等控件用假对象代替。"""
+import json
+import os
+import queue
+import sys
+import threading
+from types import SimpleNamespace
+
+import openpyxl
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import excel_core as core
+import excel_tool as gui
+
+
+class FakeText:
+    """只记下内容和刷新次数的日志框。"""
+    def __init__(self): self.lines = []; self.opened = 0
+    def config(self, state): self.opened += state == "normal"
+    def insert(self, where, text, tag=None): self.lines += text.splitlines()
+    def index(self, where): return f"{len(self.lines) + 1}.0"
+    def delete(self, a, b=None):
+        if b is None or b == "end": self.lines = []
+        else: del self.lines[:int(str(b).split(".")[0]) - 1]
+    def see(self, where): pass
+
+
+def fake_app(tmp_path):
+    app = SimpleNamespace(ui_queue=queue.Queue(), log_text=FakeText(), op_log=core.JsonLineLog(str(tmp_path / "log.jsonl")),
+                          root=SimpleNamespace(after=lambda ms, fn, *a: None))
+    for name in ("log", "ui", "clear_log", "flush_ui_queue"):
+        setattr(app, name, getattr(gui.ExcelToolApp, name).__get__(app))
+    return app
+
+
+def test_background_logs_are_batched(tmp_path, monkeypatch):
+    monkeypatch.setattr(gui, "LOG_FLUSH_BATCH", 1000)
+    app = fake_app(tmp_path); calls = []
+    threads = [threading.Thread(target=lambda i=i: [app.log(f"线程{i} 第{k}行") for k in range(300)]) for i in range(4)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert app.log_text.lines == []          # 后台线程没碰日志框
+    app.ui(calls.append, "界面动作")
+    app.flush_ui_queue()                     # 每次最多处理 LOG_FLUSH_BATCH 条，一次写进日志框
+    assert app.log_text.opened == 1 and len(app.log_text.lines) == 1000 and not calls
+    app.flush_ui_queue()
+    assert app.log_text.opened == 2 and len(app.log_text.lines) == 1200
+    assert calls == ["界面动作"] and app.ui_queue.empty()
+
+
+def test_log_box_keeps_last_lines(tmp_path, monkeypatch):
+    monkeypatch.setattr(gui, "LOG_MAX_LINES", 50)
+    app = fake_app(tmp_path)
+    for k in range(120): app.log(f"第{k}行")
+    app.flush_ui_queue()
+    assert len(app.log_text.lines) == 49 and app.log_text.lines[-1].endswith("第119行")
+    app.clear_log(); app.log("新的一行"); app.flush_ui_queue()
+    assert len(app.log_text.lines) == 1
+
+
+def test_json_log_records_ops(tmp_path):
+    log = core.JsonLineLog(str(tmp_path / "log.jsonl"))
+    threads = [threading.Thread(target=lambda: [log.log("消息", "INFO") for _ in range(200)]) for _ in range(4)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    with log.op("split", file="总表.xlsx") as info: info["rows"] = 10
+    with pytest.raises(core.JobCancelled):
+        with log.op("merge"): raise core.JobCancelled()
+    log.close()
+    with open(tmp_path / "log.jsonl", encoding="utf-8") as fp: recs = [json.loads(line) for line in fp]
+    assert sum(r.get("msg") == "消息" for r in recs) == 800
+    ops = [r for r in recs if "op" in r]
+    assert [(r["op"], r["status"]) for r in ops] == [("split", "ok"), ("merge", "cancelled")] and ops[0]["rows"] == 10
+
+
+def test_report_worker_uses_only_its_arguments(tmp_path):
+    # 后台线程只用传入的取值，不读控件 (假对象上没有任何输入框)
+    path = str(tmp_path / "表.xlsx")
+    wb = openpyxl.Workbook(); ws = wb.active
+    for v in ("区", "甲", "乙", "甲"): ws.append([v])
+    wb.save(path)
+    app = fake_app(tmp_path); app.show_text_window = "窗口"; shown = []
+    app.ui = lambda fn, *a: shown.append((fn, *a))
+    t = threading.Thread(target=gui.ExcelToolApp.generate_analysis_report, args=(app, path, 2, "1", "openpyxl", ""))
+    t.start(); t.join()
+    assert shown and shown[0][:2] == ("窗口", "分析报告") and "甲 : 2" in shown[0][2]
@@ -0,0 +1,120 @@
+"""合并: 并行读取与串行结果一致；大模板只载入表头副本，表头与整本载入一致；
+增量合并与完整合并结果相同，完整合并不在回收文件夹里留清单。"""
+import os
+import random
+import sys
+import time
+import zipfile
+
+import openpyxl
+import pytest
+from openpyxl.styles import Font, PatternFill
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import excel_core as core
+
+START_ROW = 3
+
+
+def make_book(path, rows, seed=0):
+    """两行表头 (合并的加粗标题、底色表头、列宽) 的明细表，约 1/10 为空行。"""
+    rnd = random.Random(seed)
+    wb = openpyxl.Workbook(); ws = wb.active; ws.title = "明细"
+    ws.append(["明细"]); ws.merge_cells("A1:C1"); ws["A1"].font = Font(bold=True, size=14)
+    ws.append(["序号", "区县", "金额"])
+    for c in ws[2]: c.font = Font(bold=True); c.fill = PatternFill("solid", fgColor="D9D9D9")
+    ws.column_dimensions["B"].width = 20; ws.row_dimensions[1].height = 30
+    for i in range(rows): ws.append([] if rnd.random() < 0.1 else [i + 1, rnd.choice("甲乙丙"), round(rnd.random() * 100, 2)])
+    wb.save(path)
+
+
+def test_parallel_read_matches_serial(tmp_path, monkeypatch):
+    monkeypatch.setattr(core, "MERGE_BATCH_ROWS", 7)       # 每个文件分成多批
+    files = []
+    for i, n in enumerate((40, 0, 3, 25, 60, 1)):
+        files.append(str(tmp_path / f"区{i}.xlsx")); make_book(files[-1], n, seed=i)
+    def read(workers):
+        got = [[] for _ in files]
+        for idx, f, rows in core.iter_merge_rows(files, START_ROW, workers):
+            assert f == files[idx] and len(rows) <= 7
+            got[idx] += [tuple(r) for r in rows]
+        return got
+    serial = read(1)
+    assert [len(r) for r in serial][1] == 0 and sum(map(len, serial)) > 100
+    assert read(2) == serial and read(3) == serial
+
+
+def cell_style(c):
+    return c.value, str(c.font), str(c.fill), str(c.alignment), str(c.border), c.number_format
+
+
+@pytest.fixture(scope="module")
+def template(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("merge") / "模板.xlsx")
+    make_book(path, 2000, 9)
+    return path
+
+
+@pytest.mark.parametrize("chunk", [7, 1 << 20])
+def test_header_only_copy(template, tmp_path, chunk):
+    out = str(tmp_path / "head.xlsx")
+    with zipfile.ZipFile(template) as zin, zipfile.ZipFile(out, "w") as zout:
+        for info in zin.infolist():
+            with zin.open(info) as a, zout.open(info, "w") as b:
+                if info.filename.startswith("xl/worksheets/"): core._trim_rows(a, b, START_ROW, chunk)
+                else: b.write(a.read())
+    src, ws = openpyxl.load_workbook(template).active, openpyxl.load_workbook(out).active
+    assert ws.max_row == START_ROW - 1
+    assert ws.merged_cells.ranges == src.merged_cells.ranges
+    for r in range(1, START_ROW):
+        assert [cell_style(c) for c in ws[r]] == [cell_style(c) for c in src[r]]
+
+
+def test_big_template_header_matches_full_load(template, tmp_path, monkeypatch):
+    outs = []
+    for mb in (100, 0):              # 0: 模板都按大文件处理
+        monkeypatch.setattr(core, "MERGE_TEMPLATE_FULL_MB", mb)
+        nb, _ = core._merge_book(template, START_ROW); p = str(tmp_path / f"{mb}.xlsx"); nb.save(p)
+        outs.append(openpyxl.load_workbook(p).active)
+    full, head = outs
+    assert head.max_row == full.max_row == START_ROW - 1
+    assert [str(m) for m in head.merged_cells.ranges] == ["A1:C1"] and head.row_dimensions[1].height == 30
+    assert {k: d.width for k, d in head.column_dimensions.items()} == {k: d.width for k, d in full.column_dimensions.items()}
+    for a, b in zip(full.iter_rows(), head.iter_rows()):
+        assert [cell_style(c) for c in a] == [cell_style(c) for c in b]
+    assert head["A1"].font.b and head[START_ROW - 1][0].fill.fgColor.rgb.endswith("D9D9D9")
+
+
+def data_rows(path):
+    return [r for r in openpyxl.load_workbook(path).active.iter_rows(min_row=START_ROW, values_only=True)]
+
+
+def merge(folder, save_path, reuse, log=core._nolog):
+    files = sorted(core.list_merge_files(str(folder)))     # 模板固定为未改动的 区0
+    return core.incremental_merge(str(folder), files, files[0], str(save_path), START_ROW, reuse=reuse, log=log)
+
+
+@pytest.fixture
+def folder(tmp_path):
+    d = tmp_path / "回收"; d.mkdir()
+    for i in range(3): make_book(str(d / f"区{i}.xlsx"), 60, seed=i + 1)
+    return d
+
+
+def test_plain_merge_leaves_folder_alone(folder, tmp_path):
+    before = sorted(os.listdir(folder))
+    merge(folder, tmp_path / "汇总.xlsx", reuse=False)
+    assert sorted(os.listdir(folder)) == before
+
+
+def test_incremental_after_change_matches_full(folder, tmp_path):
+    merge(folder, folder / "合并汇总表_1.xlsx", reuse=True)
+    assert os.path.exists(folder / core.MERGE_MANIFEST_NAME)
+    time.sleep(0.01)
+    make_book(str(folder / "区1.xlsx"), 61, seed=42)     # 改动中间的文件，且多一行
+    logs = []
+    n = merge(folder, folder / "合并汇总表_2.xlsx", reuse=True, log=lambda m, level="INFO": logs.append(m))
+    assert any("复用 2 个文件" in m for m in logs)
+    full = tmp_path / "完整.xlsx"
+    assert merge(folder, full, reuse=False) == n
+    assert data_rows(folder / "合并汇总表_2.xlsx") == data_rows(full)
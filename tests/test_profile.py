@@ -0,0 +1,66 @@
+"""分阶段计时 (RunProfile): 嵌套阶段记自身耗时，内存峰值按本次任务计，报告写进日志和 JSON。"""
+import json
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import bench_excel as bench
+import excel_core as core
+
+
+def test_nested_phases_record_self_time():
+    prof = core.RunProfile("测试")
+    with prof.phase("外层"):
+        time.sleep(0.05)
+        with prof.phase("内层"): time.sleep(0.1)
+    sq = prof.wrap(lambda x: time.sleep(0.02) or x * x, "调用")
+    assert [sq(i) for i in range(3)] == [0, 1, 4]
+    assert list(prof.timed(iter(range(5)), "迭代")) == list(range(5))
+    r = prof.finish(); ph = {p["name"]: p for p in r["phases"]}
+    assert 0.1 <= ph["内层"]["seconds"] < 0.15 and 0.05 <= ph["外层"]["seconds"] < 0.1
+    assert ph["调用"]["calls"] == 3 and ph["迭代"]["calls"] == 5
+    assert sum(p["seconds"] for p in r["phases"]) + r["other_s"] == pytest.approx(r["seconds"], abs=0.01)
+
+
+def test_phases_from_worker_threads_add_up():
+    prof = core.RunProfile("测试")
+    def work():
+        for _ in range(50):
+            with prof.phase("工作"): prof.count(rows=2)
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    r = prof.finish()
+    assert r["rows"] == 400 and r["phases"][0]["calls"] == 200
+
+
+@pytest.mark.skipif(core.rss_mb() is None, reason="本平台取不到常驻内存")
+def test_peak_memory_is_per_run():
+    heavy = core.RunProfile("重")
+    buf = bytearray(200 << 20); buf[::4096] = b"x" * len(buf[::4096]); time.sleep(0.2)
+    rh = heavy.finish(); del buf
+    light = core.RunProfile("轻"); time.sleep(0.2); rl = light.finish()
+    assert rh["peak_rss_mb"] - rh["rss_start_mb"] > 150
+    assert rl["peak_rss_mb"] - rl["rss_start_mb"] < 20          # 不受前一次任务的峰值影响
+
+
+def test_report_to_log_and_json(tmp_path, monkeypatch):
+    monkeypatch.setattr(core, "PROFILE_DIR", str(tmp_path / "profiles"))
+    master = str(tmp_path / "总表.xlsx"); bench.make_workbook(master, 300, 1)
+    logs = []; out = tmp_path / "out"; out.mkdir()
+    with pytest.raises(core.JobCancelled):
+        with core.RunProfile("split", log=lambda m, level="INFO": logs.append((level, m))) as prof:
+            core.stream_split(master, bench.START_ROW, bench.KEY_COL, str(out), "t", prof=prof)
+            raise core.JobCancelled()
+    r = prof.finish()
+    assert r["status"] == "cancelled" and 280 <= r["rows"] <= 300
+    assert r["bytes_in"] == os.path.getsize(master) and r["bytes_out"] > 0
+    assert {"读取解析"} <= {p["name"] for p in r["phases"]}
+    assert all(level == "STATS" for level, _ in logs) and logs[0][1].startswith("[split] 用时")
+    path = logs[-1][1].split(": ", 1)[1]
+    assert os.path.dirname(path) == str(tmp_path / "profiles")
+    with open(path, encoding="utf-8") as fp: assert json.load(fp)["op"] == "split"
@@ -0,0 +1,80 @@
+"""openpyxl 只读模式与 FastXmlReader 逐行结果一致 (check_reader_parity)。"""
+import datetime
+import os
+import random
+import re
+import sys
+import zipfile
+
+import openpyxl
+import pytest
+from openpyxl.cell.rich_text import CellRichText, TextBlock
+from openpyxl.cell.text import InlineFont
+from openpyxl.utils.datetime import CALENDAR_MAC_1904
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import excel_core as core
+
+
+def assert_parity(path, sheet=None):
+    diff = core.check_reader_parity(path, sheet=sheet)
+    assert diff is None, f"{os.path.basename(path)} [{sheet}] 第 {diff[0]} 行: openpyxl={diff[1]!r} xml={diff[2]!r}"
+
+
+def make_book(path, rows, seed):
+    """合并标题、约 1/10 空行的明细表，openpyxl 普通模式写出 (带 dimension)。"""
+    rnd = random.Random(seed); base = datetime.date(2024, 1, 1)
+    wb = openpyxl.Workbook(); ws = wb.active; ws.append(["明细"]); ws.merge_cells("A1:E1")
+    ws.append(["序号", "姓名", "金额", "日期", "编号"])
+    for i in range(rows):
+        if rnd.random() < 0.1: ws.append([]); continue
+        ws.append([i + 1, f"姓名{i}", round(rnd.random() * 10000, 2), base + datetime.timedelta(days=rnd.randrange(365)), f"NO{i:08d}"])
+    wb.save(path)
+
+
+@pytest.mark.parametrize("rows,seed", [(1, 0), (300, 1), (2000, 7)])
+def test_generated_workbook(tmp_path, rows, seed):
+    path = str(tmp_path / "明细.xlsx")
+    make_book(path, rows, seed)
+    assert_parity(path)
+
+
+def _inline_strings(path, sheet_xml, cells):
+    """把 sheet_xml 里的若干单元格改写成内联字符串 (t="inlineStr")，openpyxl 写文件时不会产生这种单元格。"""
+    with zipfile.ZipFile(path) as z: parts = {n: z.read(n) for n in z.namelist()}
+    xml = parts[sheet_xml].decode("utf-8")
+    for ref, inner in cells.items():
+        xml, n = re.subn(rf'<c r="{ref}"[^>]*?(/>|>.*?</c>)', f'<c r="{ref}" t="inlineStr"><is>{inner}</is></c>', xml)
+        assert n == 1, ref
+    parts[sheet_xml] = xml.encode("utf-8")
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        for n, data in parts.items(): z.writestr(n, data)
+
+
+@pytest.mark.parametrize("epoch1904", [False, True])
+def test_mixed_types(tmp_path, epoch1904):
+    path = str(tmp_path / "mixed.xlsx")
+    wb = openpyxl.Workbook()
+    if epoch1904: wb.epoch = CALENDAR_MAC_1904
+    ws = wb.active; ws.title = "明细"
+    ws.append(["文本", "整数", "小数", "布尔", "日期", "日期时间", "时间", "时长", "公式", "错误"])
+    ws.append(["甲", 1, 1.5, True, datetime.date(2024, 2, 29), datetime.datetime(1999, 12, 31, 23, 59, 59),
+               datetime.time(8, 30), datetime.timedelta(hours=30, minutes=5), "=B2*2", "#N/A"])
+    ws.append([None, -7, 1e-10, False, datetime.date(1904, 1, 2), datetime.datetime(2024, 1, 1), None, None, None, "#DIV/0!"])
+    ws["A4"] = CellRichText("富", TextBlock(InlineFont(b=True), "文本"), " 尾")
+    ws["A5"] = "待改为内联"; ws["B5"] = "待改为内联富文本"
+    ws["A6"] = "  前后空格  "; ws["B6"] = "多\n行"; ws["C6"] = 12345678901234
+    ws["D9"] = "稀疏"; ws["Z9"] = 0; ws["AB40"] = "最右下"        # 中间整行、整列为空
+    other = wb.create_sheet("说明")
+    other["B3"] = "第二个表"; other["C10"] = datetime.date(2020, 1, 1); other["A12"] = True
+    wb.create_sheet("空表")
+    wb.save(path)
+    _inline_strings(path, "xl/worksheets/sheet1.xml",
+                    {"A5": "<t>内联</t>", "B5": "<r><t>内联</t></r><r><rPr><b/></rPr><t>富文本</t></r>"})
+
+    for sheet in (None, "明细", "说明", "空表"): assert_parity(path, sheet)
+    with core.open_reader(path, "xml") as rd: rows = list(rd.iter_rows())
+    assert rows[4][:2] == ("内联", "内联富文本")
+    assert rows[3][0] == "富文本 尾"
+    assert rows[1][4] == datetime.datetime(2024, 2, 29)
+    assert len(rows) == 40 and len(rows[0]) == 28
@@ -0,0 +1,43 @@
+"""扫描统计: 直方图只算要分析的拆分列，取值 0 也计数；索引缓存缺列时补算。"""
+import json
+import os
+import sys
+
+import openpyxl
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import bench_excel as bench
+import excel_core as core
+
+
+def test_folder_scan_keeps_no_histograms(tmp_path):
+    for i in range(3): bench.make_workbook(str(tmp_path / f"区{i}.xlsx"), 300, seed=i)
+    files = core.list_merge_files(str(tmp_path)); index = core.ScanIndex(str(tmp_path))
+    assert core.scan_files(files, index, workers=1)
+    index.save(files)
+    with open(tmp_path / core.SCAN_INDEX_NAME, encoding="utf-8") as fp: entries = json.load(fp)["files"]
+    for e in entries.values():
+        assert e["stats"]["hist"] == {} and e["stats"]["hist_cols"] == []
+        assert e["stats"]["valid"] == core.valid_rows_from(e["stats"], 1)
+
+
+def test_zero_is_counted(tmp_path):
+    wb = openpyxl.Workbook(); ws = wb.active; ws.append(["编号", "分组"])
+    for v in (0, 0, 1, "", None, "甲"): ws.append([1, v])
+    path = str(tmp_path / "表.xlsx"); wb.save(path)
+    hist = core.column_histogram(core.analyze_file(path, hist_cols=[2]), 2, 2)
+    assert hist == {"0": 2, "1": 1, "甲": 1}
+    assert "0 : 2" in core.analysis_report(path, 2, 2)
+
+
+def test_cached_stats_adds_missing_columns(tmp_path):
+    path = str(tmp_path / "总表.xlsx"); bench.make_workbook(path, 500, 2)
+    st = core.cached_stats(path, hist_cols=[bench.KEY_COL])
+    assert st["hist_cols"] == [bench.KEY_COL] and core.column_histogram(st, 4, bench.START_ROW) is None
+    index = core.ScanIndex(str(tmp_path)); index.stats(path, hist_cols=[bench.KEY_COL])
+    assert (index.hits, index.misses) == (1, 0)
+    st = core.cached_stats(path, hist_cols=[4])          # 缓存里没有第 4 列: 重读，连同已算过的列
+    assert st["hist_cols"] == [bench.KEY_COL, 4]
+    fresh = core.analysis_report(path, bench.START_ROW, 4)
+    assert core.analysis_report(path, bench.START_ROW, 4, stats=st) == fresh
+    assert sum(core.column_histogram(st, bench.KEY_COL, bench.START_ROW).values()) == core.valid_rows_from(st, bench.START_ROW)
@@ -0,0 +1,62 @@
+"""单遍完美拆分 (styled_split): 表头样式与布局保留、公式按删行改写、各目标的数据行同极速拆分。"""
+import os
+import sys
+
+import openpyxl
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import bench_excel as bench
+import excel_core as core
+
+
+def values(path, sheet=None):
+    wb = openpyxl.load_workbook(path); ws = wb[sheet] if sheet else wb.active
+    return [list(r) for r in ws.iter_rows(values_only=True)]
+
+
+@pytest.fixture(scope="module")
+def master(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("styled") / "总表.xlsx")
+    bench.make_workbook(path, 300, 5)
+    return path
+
+
+def test_header_layout_survives(master, tmp_path):
+    assert core.styled_split(master, bench.START_ROW, bench.KEY_COL, str(tmp_path)) == len(bench.DISTRICTS)
+    src = openpyxl.load_workbook(master).active
+    for f in os.listdir(tmp_path):
+        ws = openpyxl.load_workbook(tmp_path / f).active
+        assert [str(m) for m in ws.merged_cells.ranges] == ["A1:H1"]
+        assert ws["A1"].value == src["A1"].value and ws["A1"].font.b and ws["A1"].alignment.horizontal == "center"
+        for c in ws[bench.HEADER_ROWS]: assert c.font.b and c.fill.fgColor.rgb.endswith("D9D9D9")
+        for col in "ABCDEFGH": assert ws.column_dimensions[col].width == src.column_dimensions[col].width
+
+
+def test_rows_match_fast_split(master, tmp_path):
+    fast, styled = tmp_path / "fast", tmp_path / "styled"; fast.mkdir(); styled.mkdir()
+    core.stream_split(master, bench.START_ROW, bench.KEY_COL, str(fast), "t")
+    core.styled_split(master, bench.START_ROW, bench.KEY_COL, str(styled))
+    names = sorted(os.listdir(styled))
+    assert len(names) == len(bench.DISTRICTS)
+    assert sorted(f.replace("_极速_t", "") for f in os.listdir(fast)) == names
+    for f in names:
+        assert values(styled / f) == values(fast / f.replace(".xlsx", "_极速_t.xlsx")), f
+
+
+def test_formulas_follow_deleted_rows(tmp_path):
+    wb = openpyxl.Workbook(); ws = wb.active; ws.title = "明细"
+    ws.append(["区", "值", "两倍", "引用"])
+    for i, k in enumerate("甲乙甲乙甲乙", 2): ws.append([k, i, f"=B{i}*2"])
+    ws["D2"] = "=B3"                 # 指向乙的行: 甲的文件里该行被删
+    ws["D4"] = "=SUM(B2:B7)"
+    other = wb.create_sheet("汇总"); other["A1"] = "=明细!B4"; other["A2"] = "=SUM(明细!B2:B7)"
+    src = str(tmp_path / "总表.xlsx"); wb.save(src)
+    out = tmp_path / "out"; out.mkdir(); core.styled_split(src, 2, 1, str(out))
+
+    a = values(out / "甲.xlsx", "明细")
+    assert a[1:] == [["甲", 2, "=B2*2", "=#REF!"], ["甲", 4, "=B3*2", "=SUM(B2:B4)"], ["甲", 6, "=B4*2", None]]
+    assert values(out / "甲.xlsx", "汇总") == [["=明细!B3"], ["=SUM(明细!B2:B4)"]]
+    b = values(out / "乙.xlsx", "明细")
+    assert [r[2] for r in b[1:]] == ["=B2*2", "=B3*2", "=B4*2"]
+    assert values(out / "乙.xlsx", "汇总") == [["=#REF!"], ["=SUM(明细!B2:B4)"]]